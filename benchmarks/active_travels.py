@@ -0,0 +1,133 @@
+"""Compare the JOIN + GROUP BY active-travel query with the `subscriber_count` one.
+
+Usage:
+
+    python benchmarks/active_travels.py --subscriptions 1000000
+    python benchmarks/active_travels.py --database-url postgresql://... --explain
+"""
+
+import argparse
+import datetime
+import os
+import statistics
+import tempfile
+import timeit
+from typing import Optional
+
+from sqlalchemy import insert, text
+
+from rail_bot.bot.service.subscription_service import (
+    Base,
+    DailySubscription,
+    SubscriptionService,
+    Travel,
+)
+
+SUBSCRIPTIONS_PER_TRAVEL = 10
+CHUNK_SIZE = 10_000
+
+
+def populate(
+    service: SubscriptionService,
+    subscriptions: int,
+    inactive_travels: Optional[int] = None,
+) -> None:
+    """Inserts `subscriptions` spread over active travels, plus travels without
+    subscribers (as many as the active ones by default).
+    """
+    active_travels = max(subscriptions // SUBSCRIPTIONS_PER_TRAVEL, 1)
+    if inactive_travels is None:
+        inactive_travels = active_travels
+
+    travels = [
+        {
+            "id": travel_id,
+            "origin": f"{travel_id % 1000:03d}",
+            "destination": f"{travel_id // 1000 % 1000:03d}",
+            "departure_time": datetime.time(travel_id // 60 % 24, travel_id % 60),
+            "subscriber_count": (
+                SUBSCRIPTIONS_PER_TRAVEL if travel_id <= active_travels else 0
+            ),
+        }
+        for travel_id in range(1, active_travels + inactive_travels + 1)
+    ]
+
+    with service.engine.begin() as connection:
+        for start in range(0, len(travels), CHUNK_SIZE):
+            connection.execute(insert(Travel), travels[start : start + CHUNK_SIZE])
+
+        chunk = []
+        for subscription_id in range(subscriptions):
+            chunk.append(
+                {
+                    "chat_id": subscription_id // active_travels,
+                    "travel_id": subscription_id % active_travels + 1,
+                }
+            )
+            if len(chunk) == CHUNK_SIZE:
+                connection.execute(insert(DailySubscription), chunk)
+                chunk = []
+        if chunk:
+            connection.execute(insert(DailySubscription), chunk)
+
+
+def join_group_by_query(service: SubscriptionService):
+    return service.session.query(Travel).join(DailySubscription).group_by(Travel.id)
+
+
+def subscriber_count_query(service: SubscriptionService):
+    return service._travel_query(only_active=True)
+
+
+def explain(service: SubscriptionService, query) -> str:
+    statement = query.statement.compile(
+        service.engine, compile_kwargs={"literal_binds": True}
+    )
+    prefix = (
+        "EXPLAIN QUERY PLAN" if service.engine.dialect.name == "sqlite" else "EXPLAIN"
+    )
+    with service.engine.connect() as connection:
+        rows = connection.execute(text(f"{prefix} {statement}")).all()
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--subscriptions", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--explain", action="store_true")
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+    service = SubscriptionService(database_url)
+    try:
+        populate(service, args.subscriptions)
+        for name, build_query in (
+            ("JOIN + GROUP BY", join_group_by_query),
+            ("subscriber_count > 0", subscriber_count_query),
+        ):
+            query = build_query(service)
+            timings = timeit.repeat(
+                lambda: (query.all(), service.session.expunge_all()),
+                number=1,
+                repeat=args.repeat,
+            )
+            print(
+                f"{name:>22}: {len(query.all())} travels, "
+                f"min {min(timings) * 1000:.1f} ms, "
+                f"median {statistics.median(timings) * 1000:.1f} ms"
+            )
+            if args.explain:
+                print(explain(service, query))
+    finally:
+        service.session.close()
+        Base.metadata.drop_all(service.engine)
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Subscribe/unsubscribe throughput of the SQLite mode and Postgres, with
+concurrent handler threads.
+
+Usage:
+
+    python benchmarks/backend_throughput.py
+    python benchmarks/backend_throughput.py --postgres-url postgresql://... --threads 8
+"""
+
+import argparse
+import datetime
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
+
+from rail_bot.bot.service.subscription_service import Base, SubscriptionService
+
+
+def run_worker(
+    service: SubscriptionService, chat_id: int, operations: int
+) -> Tuple[int, int]:
+    completed = errors = 0
+    for operation in range(operations // 2):
+        departure_time = datetime.time(operation // 60 % 24, operation % 60)
+        try:
+            service.add_subscription(chat_id, "aaa", "bbb", departure_time)
+            service.remove_subscriptions(chat_id, "aaa", "bbb", departure_time)
+            completed += 2
+        except Exception:
+            service.session.rollback()
+            errors += 1
+    service.session.remove()
+    return completed, errors
+
+
+def benchmark(database_url: str, threads: int, operations: int) -> None:
+    service = SubscriptionService(database_url)
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(
+                executor.map(
+                    lambda chat_id: run_worker(service, chat_id, operations),
+                    range(threads),
+                )
+            )
+        elapsed = time.perf_counter() - start
+
+        completed = sum(result[0] for result in results)
+        errors = sum(result[1] for result in results)
+        print(
+            f"{service.engine.dialect.name:>10}: {completed / elapsed:8.0f} ops/s "
+            f"({completed} operations, {errors} errors, {threads} threads)"
+        )
+    finally:
+        service.session.close()
+        Base.metadata.drop_all(service.engine)
+        service.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--postgres-url", default=None)
+    parser.add_argument("--sqlite-path", default=None)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--operations", type=int, default=1000, help="Per thread.")
+    args = parser.parse_args()
+
+    sqlite_path = args.sqlite_path or os.path.join(tempfile.mkdtemp(), "bench.db")
+    database_urls = [f"sqlite:///{sqlite_path}"]
+    if args.postgres_url is not None:
+        database_urls.append(args.postgres_url)
+
+    for database_url in database_urls:
+        benchmark(database_url, args.threads, args.operations)
+
+
+if __name__ == "__main__":
+    main()
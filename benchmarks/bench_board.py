@@ -0,0 +1,51 @@
+"""Departure board parsing and rendering, and ``departure_board`` with the
+board cache cold and warm. LDB is replaced by a prepared response.
+"""
+
+import pytest
+
+from board_render import make_response
+from rail_bot.rail_api import api
+from rail_bot.rail_api.board import BoardCache, parse_board, render_board
+
+ROWS = 10
+
+
+@pytest.fixture
+def response():
+    return make_response(ROWS)
+
+
+def bench_parse_board(benchmark, response) -> None:
+    board = benchmark(parse_board, response)
+    assert len(board.rows) == ROWS
+
+
+def bench_render_board(benchmark, response) -> None:
+    board = parse_board(response)
+    text = benchmark(render_board, board, ROWS)
+    assert text.startswith("Trains at London Kings Cross")
+
+
+@pytest.fixture
+def fake_ldb(monkeypatch, response) -> None:
+    monkeypatch.setattr(
+        api, "fetch_board", lambda origin, destination, rows: parse_board(response)
+    )
+
+
+def bench_departure_board_cold(benchmark, monkeypatch, fake_ldb) -> None:
+    def cold() -> str:
+        monkeypatch.setattr(api, "board_cache", BoardCache(ttl=api.BOARD_CACHE_TTL))
+        return api.departure_board("KGX", None)
+
+    text = benchmark(cold)
+    assert text.startswith("Trains at London Kings Cross")
+
+
+def bench_departure_board_cached(benchmark, monkeypatch, fake_ldb) -> None:
+    monkeypatch.setattr(api, "board_cache", BoardCache(ttl=3600))
+    api.departure_board("KGX", None)
+
+    text = benchmark(api.departure_board, "KGX", None)
+    assert text.startswith("Trains at London Kings Cross")
@@ -0,0 +1,97 @@
+"""Job scheduling: ``JobManager.recover_travel_jobs`` at start-up on databases
+of ``--sizes`` subscriptions, and churn of polling jobs on a live scheduler.
+
+The scheduler is started paused, so that no job runs during the benchmarks.
+"""
+
+import datetime
+import logging
+from queue import Queue
+from typing import Iterator
+
+import pytest
+from telegram import Bot
+from telegram.ext import Dispatcher, JobQueue
+
+from rail_bot.bot.job_manager import JobManager, subscribe_travel_job_name
+from rail_bot.bot.service.subscription_service import SubscriptionService
+
+TOKEN = "123456:fake-token"
+CHURN_JOBS = 1000
+
+
+@pytest.fixture(autouse=True)
+def quiet_logs() -> Iterator[None]:
+    # One log line per job would dominate the measurements
+    logger = logging.getLogger("rail_bot.bot.job_manager")
+    level = logger.level
+    logger.setLevel(logging.WARNING)
+    yield
+    logger.setLevel(level)
+
+
+def start_job_queue() -> JobQueue:
+    job_queue = JobQueue()
+    job_queue.set_dispatcher(Dispatcher(Bot(TOKEN), Queue(), workers=1))
+    job_queue.scheduler.start(paused=True)
+    return job_queue
+
+
+@pytest.fixture
+def job_queue() -> Iterator[JobQueue]:
+    job_queue = start_job_queue()
+    yield job_queue
+    job_queue.scheduler.shutdown(wait=False)
+
+
+def bench_recover_travel_jobs(benchmark, service: SubscriptionService) -> None:
+    job_queues = []
+
+    def setup():
+        job_queue = start_job_queue()
+        job_queues.append(job_queue)
+        return (JobManager(job_queue, service),), {}
+
+    try:
+        benchmark.pedantic(
+            JobManager.recover_travel_jobs, setup=setup, rounds=3, iterations=1
+        )
+        # Plus one-off checks of the travels departing within the hour
+        active = service.count_travels(only_active=True)
+        assert len(job_queues[-1].jobs()) >= active
+    finally:
+        for job_queue in job_queues:
+            job_queue.scheduler.shutdown(wait=False)
+
+
+def bench_polling_job_churn(benchmark, job_queue: JobQueue) -> None:
+    """Schedule and remove the one-off reruns of ``get_travel_status``."""
+    now = datetime.datetime.now()
+
+    def churn() -> None:
+        jobs = [
+            job_queue.run_once(
+                lambda context: None,
+                when=3600,
+                name=f"{subscribe_travel_job_name('kgx', 'cbg', now.time())}-{i}",
+            )
+            for i in range(CHURN_JOBS)
+        ]
+        for job in jobs:
+            job.schedule_removal()
+
+    benchmark(churn)
+    assert not [job for job in job_queue.jobs() if not job.removed]
+
+
+def bench_remove_jobs_by_prefix(benchmark, job_queue: JobQueue) -> None:
+    job_manager = JobManager(job_queue, service=None)
+    for i in range(CHURN_JOBS):
+        job_queue.run_daily(
+            lambda context: None,
+            time=datetime.time(i // 60 % 24, i % 60),
+            name=subscribe_travel_job_name(f"{i:03}", "kgx", datetime.time(8)),
+        )
+
+    removed = benchmark(job_manager.remove_jobs_by_prefix, "999-kgx")
+    assert removed <= 1
@@ -0,0 +1,45 @@
+"""``SubscriptionService`` operations on SQLite databases of ``--sizes``
+subscriptions. See ``active_travels.populate`` for the shape of the data.
+"""
+
+import datetime
+import itertools
+
+from rail_bot.bot.service.subscription_service import SubscriptionService
+
+# The first travel of `populate`
+ORIGIN, DESTINATION, DEPARTURE_TIME = "001", "000", datetime.time(0, 1)
+
+# Chats not used by `populate`
+_chat_ids = itertools.count(10**9)
+
+
+def bench_add_remove_subscription(benchmark, service: SubscriptionService) -> None:
+    def add_remove() -> int:
+        chat_id = next(_chat_ids)
+        service.add_subscription(chat_id, ORIGIN, DESTINATION, DEPARTURE_TIME)
+        return service.remove_subscriptions(
+            chat_id, ORIGIN, DESTINATION, DEPARTURE_TIME
+        )
+
+    assert benchmark(add_remove) == 1
+
+
+def bench_get_travels(benchmark, service: SubscriptionService) -> None:
+    travels = benchmark(
+        service.get_travels,
+        origin=ORIGIN,
+        destination=DESTINATION,
+        departure_time=DEPARTURE_TIME,
+        only_active=True,
+    )
+    assert len(travels) == 1
+
+
+def bench_get_subscriptions_of_travel(benchmark, service: SubscriptionService) -> None:
+    subscriptions = benchmark(service.get_subscriptions, travel_id=1)
+    assert subscriptions
+
+
+def bench_count_active_travels(benchmark, service: SubscriptionService) -> None:
+    assert benchmark(service.count_travels, only_active=True) > 0
@@ -0,0 +1,33 @@
+"""``Travel.from_response`` on the bundled LDB fixtures, and ``parse_time``."""
+
+import json
+
+import pkg_resources
+import pytest
+
+from rail_bot.rail_api.travel import Travel
+from rail_bot.utils import parse_time
+
+FIXTURES = [
+    "response.json",
+    "response_delayed.json",
+    "response_cancelled.json",
+    "response_cancelled_2.json",
+]
+
+
+@pytest.mark.parametrize("fixture", FIXTURES)
+def bench_travel_from_response(benchmark, fixture: str) -> None:
+    path = pkg_resources.resource_filename(
+        "rail_bot.rail_api.tests", f"resources/{fixture}"
+    )
+    with open(path) as file:
+        response = json.load(file)
+
+    travel = benchmark(Travel.from_response, response)
+    assert travel is not None
+
+
+def bench_parse_time(benchmark) -> None:
+    time = benchmark(parse_time, "12:23")
+    assert (time.hour, time.minute) == (12, 23)
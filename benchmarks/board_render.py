@@ -0,0 +1,87 @@
+"""Departure board rendering: string concatenation per request, as before,
+against rendering parsed rows once and sharing the text through `BoardCache`.
+
+Usage:
+
+    python benchmarks/board_render.py --rows 10 --requests 1000
+"""
+
+import argparse
+import statistics
+import timeit
+from types import SimpleNamespace
+
+from rail_bot.rail_api.board import BoardCache, parse_board, render_board
+from rail_bot.rail_api.travel import ON_TIME_LABEL
+
+
+def make_response(rows: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        locationName="London Kings Cross",
+        trainServices=SimpleNamespace(
+            service=[
+                SimpleNamespace(
+                    std=f"{12 + i // 60:02}:{i % 60:02}",
+                    etd=ON_TIME_LABEL if i % 3 else f"{12 + i // 60:02}:{i % 60:02}",
+                    platform=str(i % 11) if i % 4 else None,
+                    destination=SimpleNamespace(
+                        location=[SimpleNamespace(locationName=f"Station {i}")]
+                    ),
+                )
+                for i in range(rows)
+            ]
+        ),
+    )
+
+
+def concatenate(res: SimpleNamespace) -> str:
+    msg = f"Trains at {res.locationName}\n"
+    for service in res.trainServices.service:
+        destination = service.destination.location[0].locationName
+        msg += f"{service.std} {destination}"
+        if service.etd != ON_TIME_LABEL:
+            msg += f" - {service.etd}"
+
+        if service.platform is not None:
+            msg += f" (Platform {service.platform})"
+
+        msg += "\n"
+
+    return msg
+
+
+def report(name: str, timings, requests: int) -> None:
+    per_request = [timing / requests * 1e6 for timing in timings]
+    print(
+        f"{name:>24}: min {min(per_request):.2f} us, "
+        f"median {statistics.median(per_request):.2f} us per request"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    response = make_response(args.rows)
+    board = parse_board(response)
+    assert concatenate(response) == render_board(board, args.rows)
+    cache = BoardCache(ttl=3600)
+
+    def cached():
+        cache.get(("KGX", None), args.rows, lambda rows: board).render(args.rows)
+
+    for name, request in (
+        ("concatenation", lambda: concatenate(response)),
+        ("parse + join", lambda: render_board(parse_board(response), args.rows)),
+        ("join", lambda: render_board(board, args.rows)),
+        ("cached", cached),
+    ):
+        timings = timeit.repeat(request, number=args.requests, repeat=args.repeat)
+        report(name, timings, args.requests)
+
+
+if __name__ == "__main__":
+    main()
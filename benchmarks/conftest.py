@@ -0,0 +1,65 @@
+"""Shared fixtures of the pytest-benchmark suite.
+
+Database benchmarks run against SQLite databases of ``--sizes`` subscriptions
+(10^3 to 10^5 by default, add 1000000 for the full range), populated once per
+session.
+"""
+
+import os
+import tempfile
+from typing import Callable, Dict, Iterator
+
+import pytest
+
+from active_travels import populate
+from rail_bot.bot.service.subscription_service import SubscriptionService
+
+DEFAULT_SIZES = "1000,10000,100000"
+
+
+def pytest_addoption(parser) -> None:
+    parser.addoption(
+        "--sizes",
+        default=DEFAULT_SIZES,
+        help="Comma-separated numbers of subscriptions of the database benchmarks.",
+    )
+
+
+def pytest_generate_tests(metafunc) -> None:
+    if "subscriptions" in metafunc.fixturenames:
+        sizes = [int(size) for size in metafunc.config.getoption("sizes").split(",")]
+        metafunc.parametrize("subscriptions", sizes, scope="session")
+
+
+@pytest.fixture(scope="session")
+def database_directory() -> Iterator[str]:
+    with tempfile.TemporaryDirectory() as directory:
+        yield directory
+
+
+@pytest.fixture(scope="session")
+def populated_service(
+    database_directory: str,
+) -> Iterator[Callable[[int], SubscriptionService]]:
+    """Service over a database of the given number of subscriptions, half of the
+    travels being active.
+    """
+    services: Dict[int, SubscriptionService] = {}
+
+    def get(subscriptions: int) -> SubscriptionService:
+        if subscriptions not in services:
+            path = os.path.join(database_directory, f"{subscriptions}.db")
+            service = SubscriptionService(f"sqlite:///{path}")
+            populate(service, subscriptions)
+            services[subscriptions] = service
+        return services[subscriptions]
+
+    yield get
+
+    for service in services.values():
+        service.shutdown()
+
+
+@pytest.fixture
+def service(populated_service, subscriptions: int) -> SubscriptionService:
+    return populated_service(subscriptions)
@@ -0,0 +1,382 @@
+"""In-process stand-in for the OpenLDBWS SOAP service.
+
+Serves a hand-written WSDL (``fake_ldb.wsdl``) at ``FakeLdbServer.wsdl_url``;
+point the bot at it with ``LDB_WSDL``. ``GetDepBoardWithDetails`` and
+``GetNextDeparturesWithDetails`` are answered with services templated from the
+fixtures in ``rail_bot/rail_api/tests/resources``, departing a few minutes after
+the requested time, on time, delayed or cancelled with the configured
+probabilities. Responses can be slowed down by a latency, and a fraction of
+them replaced by SOAP faults.
+
+Run it on its own with
+
+    python benchmarks/fake_ldb.py --port 8081 --latency 0.2 --delayed 0.3
+    LDB_WSDL=http://127.0.0.1:8081/wsdl python rail_bot
+"""
+
+import argparse
+import base64
+import collections
+import datetime
+import json
+import os
+import random
+import re
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from xml.etree import ElementTree
+
+import pkg_resources
+
+from rail_bot.rail_api.stations import STATIONS_FILE, get_station_index, read_stations
+
+NS = "http://thalesgroup.com/RTTI/2017-10-01/ldb/"
+SOAP_NS = "http://schemas.xmlsoap.org/soap/envelope/"
+WSDL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_ldb.wsdl")
+# Service address in the WSDL file, replaced with the server's when served
+WSDL_ADDRESS = "http://localhost/OpenLDBWS/ldb11.asmx"
+
+ON_TIME = "on time"
+DELAYED = "delayed"
+CANCELLED = "cancelled"
+FIXTURES = {
+    ON_TIME: ["response.json"],
+    DELAYED: ["response_delayed.json"],
+    CANCELLED: ["response_cancelled.json", "response_cancelled_2.json"],
+}
+
+# Fields declared in fake_ldb.wsdl, in order
+SERVICE_FIELDS = (
+    "sta", "eta", "std", "etd", "platform", "operator", "operatorCode",
+    "isCancelled", "serviceType", "length", "cancelReason", "delayReason",
+)  # fmt: skip
+CALLING_POINT_FIELDS = ("locationName", "crs", "st", "et", "at", "length")
+CALLING_POINT_LIST_ATTRIBUTES = ("serviceType", "serviceChangeRequired")
+
+# Minutes between the services of a departure board
+BOARD_HEADWAY = 6
+
+_TIME = re.compile(r"^\d\d:\d\d$")
+
+# A fixture service, and the code of the calling point the fixture asked for
+Template = Tuple[Dict[str, Any], str]
+
+
+def load_templates() -> Dict[str, List[Template]]:
+    templates: Dict[str, List[Template]] = {}
+    for scenario, names in FIXTURES.items():
+        for name in names:
+            path = pkg_resources.resource_filename(
+                "rail_bot.rail_api.tests", f"resources/{name}"
+            )
+            with open(path) as file:
+                (departure,) = json.load(file)["departures"]["destination"]
+            templates.setdefault(scenario, []).append(
+                (departure["service"], departure["crs"])
+            )
+    return templates
+
+
+def _minutes(value: str) -> int:
+    hours, minutes = value.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def _shift(value: Any, minutes: int) -> Any:
+    """Shift a HH:MM time, leaving labels such as "On time" and others unchanged."""
+    if not isinstance(value, str) or not _TIME.match(value):
+        return value
+    shifted = (_minutes(value) + minutes) % (24 * 60)
+    return f"{shifted // 60:02}:{shifted % 60:02}"
+
+
+def _text(value: Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _append(parent: ElementTree.Element, name: str, value: Any) -> None:
+    """Append ``value`` as ``name`` elements: dicts become nested elements (keys
+    starting with "@" are attributes), lists repeated elements, None nothing.
+    """
+    if value is None:
+        return
+    if isinstance(value, list):
+        for item in value:
+            _append(parent, name, item)
+        return
+
+    element = ElementTree.SubElement(parent, f"{{{NS}}}{name}")
+    if not isinstance(value, dict):
+        element.text = _text(value)
+        return
+    for key, child in value.items():
+        if key.startswith("@"):
+            if child is not None:
+                element.set(key[1:], _text(child))
+        else:
+            _append(element, key, child)
+
+
+def envelope(operation: str, result_name: str, result: Dict[str, Any]) -> bytes:
+    root = ElementTree.Element(f"{{{SOAP_NS}}}Envelope")
+    body = ElementTree.SubElement(root, f"{{{SOAP_NS}}}Body")
+    response = ElementTree.SubElement(body, f"{{{NS}}}{operation}Response")
+    _append(response, result_name, result)
+    return ElementTree.tostring(root, encoding="utf-8", xml_declaration=True)
+
+
+def fault(message: str) -> bytes:
+    root = ElementTree.Element(f"{{{SOAP_NS}}}Envelope")
+    body = ElementTree.SubElement(root, f"{{{SOAP_NS}}}Body")
+    soap_fault = ElementTree.SubElement(body, f"{{{SOAP_NS}}}Fault")
+    ElementTree.SubElement(soap_fault, "faultcode").text = "soap:Server"
+    ElementTree.SubElement(soap_fault, "faultstring").text = message
+    return ElementTree.tostring(root, encoding="utf-8", xml_declaration=True)
+
+
+class FakeLdbServer:
+    def __init__(
+        self,
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        delayed: float = 0.1,
+        cancelled: float = 0.05,
+        seed: Optional[int] = None,
+    ) -> None:
+        # Seconds every response waits, plus up to `jitter` more
+        self.latency = latency
+        self.jitter = jitter
+        # Fractions of the requests answered with a fault, and of the services
+        # delayed or cancelled
+        self.error_rate = error_rate
+        self.delayed = delayed
+        self.cancelled = cancelled
+
+        self.requests: Dict[str, int] = collections.Counter()
+        self.errors: Dict[str, int] = collections.Counter()
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._templates = load_templates()
+        self._stations = get_station_index()
+        with open(STATIONS_FILE) as file:
+            stations, _ = read_stations(file)
+        self._station_codes = [station.crs for station in stations]
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        with open(WSDL_FILE) as file:
+            self._wsdl = file.read().replace(WSDL_ADDRESS, self.address).encode()
+
+    @property
+    def address(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/ldb"
+
+    @property
+    def wsdl_url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/wsdl"
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _station_name(self, crs: str) -> str:
+        station = self._stations.get(crs)
+        return crs if station is None else station.name
+
+    def _scenario(self) -> str:
+        with self._lock:
+            draw = self._random.random()
+        if draw < self.cancelled:
+            return CANCELLED
+        if draw < self.cancelled + self.delayed:
+            return DELAYED
+        return ON_TIME
+
+    def service(self, departure: datetime.datetime, destination: str) -> Dict:
+        """A service departing at ``departure`` and calling at ``destination``."""
+        templates = self._templates[self._scenario()]
+        with self._lock:
+            template, arrival_crs = self._random.choice(templates)
+            service_id = base64.b64encode(self._random.randbytes(16)).decode()
+        shift = departure.hour * 60 + departure.minute - _minutes(template["std"])
+
+        service: Dict[str, Any] = {
+            field: _shift(template.get(field), shift) for field in SERVICE_FIELDS
+        }
+        service["serviceID"] = service_id
+
+        # Stop at the calling point the fixture asked for, renamed to `destination`
+        (calling_points,) = template["subsequentCallingPoints"]["callingPointList"]
+        points = []
+        for template_point in calling_points["callingPoint"]:
+            point = {
+                field: _shift(template_point.get(field), shift)
+                for field in CALLING_POINT_FIELDS
+            }
+            if point["crs"] == arrival_crs:
+                point["crs"] = destination
+                point["locationName"] = self._station_name(destination)
+                points.append(point)
+                break
+            if point["crs"] != destination:
+                points.append(point)
+
+        service["origin"] = template["origin"]
+        service["destination"] = {
+            "location": [
+                {"locationName": self._station_name(destination), "crs": destination}
+            ]
+        }
+        calling_point_list: Dict[str, Any] = {
+            f"@{attribute}": calling_points.get(attribute)
+            for attribute in CALLING_POINT_LIST_ATTRIBUTES
+        }
+        calling_point_list["callingPoint"] = points
+        service["subsequentCallingPoints"] = {"callingPointList": [calling_point_list]}
+        return service
+
+    def next_departures(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        origin = params["crs"].upper()
+        now = datetime.datetime.now() + datetime.timedelta(
+            minutes=int(params.get("timeOffset") or 0)
+        )
+        departures = [
+            {
+                "@crs": destination,
+                "service": self.service(
+                    now + datetime.timedelta(minutes=3), destination.upper()
+                ),
+            }
+            for destination in params["filterList"]
+        ]
+        return {
+            "generatedAt": now.isoformat(),
+            "locationName": self._station_name(origin),
+            "crs": origin,
+            "platformAvailable": True,
+            "departures": {"destination": departures},
+        }
+
+    def departure_board(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        origin = params["crs"].upper()
+        filter_crs = params.get("filterCrs")
+        now = datetime.datetime.now() + datetime.timedelta(
+            minutes=int(params.get("timeOffset") or 0)
+        )
+        services = []
+        for row in range(int(params.get("numRows") or 10)):
+            if filter_crs:
+                destination = filter_crs.upper()
+            else:
+                with self._lock:
+                    destination = self._random.choice(self._station_codes)
+            departure = now + datetime.timedelta(minutes=2 + BOARD_HEADWAY * row)
+            services.append(self.service(departure, destination))
+
+        return {
+            "generatedAt": now.isoformat(),
+            "locationName": self._station_name(origin),
+            "crs": origin,
+            "filterLocationName": filter_crs and self._station_name(filter_crs),
+            "filtercrs": filter_crs,
+            "platformAvailable": True,
+            "trainServices": {"service": services},
+        }
+
+    def call(self, body: bytes) -> Tuple[HTTPStatus, bytes]:
+        request = ElementTree.fromstring(body).find(f"{{{SOAP_NS}}}Body")[0]
+        operation = request.tag.split("}", 1)[1].replace("Request", "")
+        params: Dict[str, Any] = {}
+        for element in request:
+            name = element.tag.split("}", 1)[1]
+            if len(element):
+                params[name] = [child.text for child in element]
+            else:
+                params[name] = element.text
+
+        with self._lock:
+            self.requests[operation] += 1
+            failed = self._random.random() < self.error_rate
+            delay = self.latency + self._random.uniform(0, self.jitter)
+        time.sleep(delay)
+
+        if operation == "GetDepBoardWithDetails":
+            result_name, handle = "GetStationBoardResult", self.departure_board
+        elif operation == "GetNextDeparturesWithDetails":
+            result_name, handle = "DeparturesBoard", self.next_departures
+        else:
+            failed = True
+        if failed:
+            with self._lock:
+                self.errors[operation] += 1
+            return HTTPStatus.INTERNAL_SERVER_ERROR, fault(
+                f"Simulated failure of {operation}."
+            )
+        return HTTPStatus.OK, envelope(operation, result_name, handle(params))
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status: HTTPStatus, body: bytes) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", "text/xml; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] != "/wsdl":
+                    self.send_error(HTTPStatus.NOT_FOUND)
+                    return
+                self._reply(HTTPStatus.OK, server._wsdl)
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                self._reply(*server.call(self.rfile.read(length)))
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--delayed", type=float, default=0.1)
+    parser.add_argument("--cancelled", type=float, default=0.05)
+    args = parser.parse_args()
+
+    server = FakeLdbServer(
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        delayed=args.delayed,
+        cancelled=args.cancelled,
+    )
+    print(f"Serving the LDB WSDL at {server.wsdl_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
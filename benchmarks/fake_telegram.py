@@ -0,0 +1,159 @@
+"""Minimal in-process stand-in for the Telegram Bot API.
+
+Point a bot at it with ``Updater(token=..., base_url=server.base_url)``.
+Updates pushed with ``FakeTelegramServer.push_update`` are served through
+``getUpdates``; everything the bot sends is recorded in ``sent``. Bot API calls
+other than ``getUpdates`` can be slowed down by ``latency`` seconds.
+"""
+
+import collections
+import itertools
+import json
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Butler", "username": "butler_bot"}
+
+
+class SentMessage:
+    def __init__(self, method: str, params: Dict[str, Any]) -> None:
+        self.method = method
+        self.params = params
+        self.received_at = time.perf_counter()
+
+
+class FakeTelegramServer:
+    def __init__(self, port: int = 0, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.sent: List[SentMessage] = []
+        self.calls: Dict[str, int] = collections.Counter()
+        self.on_sent: Optional[Callable[[SentMessage], None]] = None
+
+        self._updates: List[Dict[str, Any]] = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._condition = threading.Condition()
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/bot"
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def make_update(self, chat_id: int, text: str) -> Dict[str, Any]:
+        update_id = next(self._update_ids)
+        chat = {"id": chat_id, "type": "private", "first_name": f"user{chat_id}"}
+        message: Dict[str, Any] = {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": chat,
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"},
+            "text": text,
+        }
+        if text.startswith("/"):
+            command_length = len(text.split(" ")[0])
+            message["entities"] = [
+                {"type": "bot_command", "offset": 0, "length": command_length}
+            ]
+        return {"update_id": update_id, "message": message}
+
+    def make_callback_query(
+        self, chat_id: int, data: str, message_id: int = 1
+    ) -> Dict[str, Any]:
+        """Update of a tap on an inline keyboard button of a bot message."""
+        update_id = next(self._update_ids)
+        user = {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"}
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": "",
+        }
+        callback_query = {
+            "id": str(update_id),
+            "from": user,
+            "message": message,
+            "chat_instance": str(chat_id),
+            "data": data,
+        }
+        return {"update_id": update_id, "callback_query": callback_query}
+
+    def push_update(self, update: Dict[str, Any]) -> None:
+        with self._condition:
+            self._updates.append(update)
+            self._condition.notify_all()
+
+    def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        deadline = time.monotonic() + float(params.get("timeout") or 0)
+        with self._condition:
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            while not self._updates and time.monotonic() < deadline:
+                self._condition.wait(deadline - time.monotonic())
+            return list(self._updates)
+
+    def _message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "message_id": int(params.get("message_id") or next(self._message_ids)),
+            "date": int(time.time()),
+            "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+            "text": params.get("text", ""),
+        }
+
+    def call(self, method: str, params: Dict[str, Any]) -> Any:
+        if method == "getMe":
+            return BOT_USER
+        if method == "getUpdates":
+            return self._get_updates(params)
+
+        with self._condition:
+            self.calls[method] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if method in ("sendMessage", "editMessageText"):
+            sent = SentMessage(method, params)
+            self.sent.append(sent)
+            if self.on_sent is not None:
+                self.on_sent(sent)
+            return self._message(params)
+        # setWebhook, deleteWebhook, setMyCommands, answerCallbackQuery, ...
+        return True
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self) -> None:
+                method = self.path.rsplit("/", 1)[-1]
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length) if length else b""
+                params = json.loads(body) if body else {}
+
+                payload = json.dumps(
+                    {"ok": True, "result": server.call(method, params)}
+                )
+                self.send_response(HTTPStatus.OK)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload.encode())
+
+            do_GET = do_POST = _handle
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+        return Handler
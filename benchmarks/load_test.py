@@ -0,0 +1,252 @@
+"""End-to-end load test of the bot against local stand-ins for LDB and the
+Telegram Bot API.
+
+Every simulated chat sends ``/board``, ``/subscribe`` and ``/unsubscribe``
+between two random stations, then taps the button of its subscription in the
+``/unsubscribe`` reply, waiting for each reply before its next step. Reports the
+throughput and the p50/p99 latency from update to reply of every step.
+
+Usage:
+
+    python benchmarks/load_test.py --chats 2000 --concurrency 200
+    python benchmarks/load_test.py --ldb-latency 0.3 --ldb-error-rate 0.05
+"""
+
+import argparse
+import collections
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from fake_ldb import FakeLdbServer
+from fake_telegram import FakeTelegramServer, SentMessage
+from telegram.ext import Updater
+
+from rail_bot.bot.board_handler import board_handler
+from rail_bot.bot.dispatch import ChatOrderedExecutor
+from rail_bot.bot.job_manager import JobManager
+from rail_bot.bot.service.subscription_service import SubscriptionService
+from rail_bot.bot.subscription.subscribe_handler import subscribe_handler
+from rail_bot.bot.subscription.unsubscribe_handler import unsubscribe_handler
+from rail_bot.rail_api import api
+from rail_bot.rail_api.stations import STATIONS_FILE, read_stations
+
+TOKEN = "123456:fake-token"
+STEPS = ("board", "subscribe", "unsubscribe", "unsubscribe button")
+
+
+class Replies:
+    """The first message sent to, or edited in, each chat waiting for a reply."""
+
+    def __init__(self) -> None:
+        self._waiting: Dict[int, Optional[SentMessage]] = {}
+        self._condition = threading.Condition()
+
+    def expect(self, chat_id: int) -> None:
+        with self._condition:
+            self._waiting[chat_id] = None
+
+    def __call__(self, sent: SentMessage) -> None:
+        chat_id = int(sent.params.get("chat_id", 0))
+        with self._condition:
+            if chat_id in self._waiting and self._waiting[chat_id] is None:
+                self._waiting[chat_id] = sent
+                self._condition.notify_all()
+
+    def wait(self, chat_id: int, timeout: float) -> Optional[SentMessage]:
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._waiting[chat_id] is not None, timeout
+            )
+            return self._waiting.pop(chat_id)
+
+
+class Results:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = collections.defaultdict(list)
+        self.timeouts: Dict[str, int] = collections.Counter()
+
+    def add(self, step: str, latency: Optional[float]) -> None:
+        with self._lock:
+            if latency is None:
+                self.timeouts[step] += 1
+            else:
+                self.latencies[step].append(latency)
+
+
+class Chat:
+    def __init__(
+        self,
+        chat_id: int,
+        telegram: FakeTelegramServer,
+        replies: Replies,
+        results: Results,
+        timeout: float,
+    ) -> None:
+        self.chat_id = chat_id
+        self.telegram = telegram
+        self.replies = replies
+        self.results = results
+        self.timeout = timeout
+
+    def send(self, step: str, update: Dict[str, Any]) -> Optional[SentMessage]:
+        self.replies.expect(self.chat_id)
+        start = time.perf_counter()
+        self.telegram.push_update(update)
+        reply = self.replies.wait(self.chat_id, self.timeout)
+        self.results.add(step, None if reply is None else reply.received_at - start)
+        return reply
+
+    def command(self, step: str, text: str) -> Optional[SentMessage]:
+        return self.send(step, self.telegram.make_update(self.chat_id, text))
+
+    def run(self, origin: str, destination: str, departure_time: str) -> None:
+        self.command("board", f"/board {origin} {destination}")
+        self.command("subscribe", f"/subscribe {origin} {destination} {departure_time}")
+        reply = self.command("unsubscribe", "/unsubscribe")
+        if reply is None or "reply_markup" not in reply.params:
+            self.results.add("unsubscribe button", None)
+            return
+
+        markup = reply.params["reply_markup"]
+        if isinstance(markup, str):
+            markup = json.loads(markup)
+        data = markup["inline_keyboard"][0][0]["callback_data"]
+        self.send(
+            "unsubscribe button",
+            self.telegram.make_callback_query(self.chat_id, data),
+        )
+
+
+def start_bot(
+    telegram: FakeTelegramServer,
+    database_url: str,
+    workers: int,
+    handler_concurrency: int,
+):
+    updater = Updater(
+        token=TOKEN,
+        base_url=telegram.base_url,
+        workers=workers,
+        request_kwargs={"con_pool_size": workers + handler_concurrency + 4},
+    )
+    service = SubscriptionService(database_url)
+    job_manager = JobManager(job_queue=updater.job_queue, service=service)
+    executor = ChatOrderedExecutor(max_workers=handler_concurrency)
+
+    dispatcher = updater.dispatcher
+    dispatcher.add_handler(board_handler(executor)[0])
+    dispatcher.add_handler(subscribe_handler(job_manager, executor)[0])
+    for handler, _ in unsubscribe_handler(job_manager, executor):
+        dispatcher.add_handler(handler)
+
+    updater.start_polling(poll_interval=0.0, timeout=10)
+    return updater, executor, service
+
+
+def percentile(latencies: List[float], fraction: float) -> float:
+    return latencies[int(fraction * (len(latencies) - 1))]
+
+
+def report(results: Results, elapsed: float) -> None:
+    total = sum(len(latencies) for latencies in results.latencies.values())
+    print(f"{total} replies in {elapsed:.1f} s: {total / elapsed:.1f} replies/s")
+    for step in STEPS:
+        latencies = sorted(results.latencies.get(step, []))
+        timeouts = results.timeouts.get(step, 0)
+        if not latencies:
+            print(f"{step:>20}: no replies, {timeouts} timeouts")
+            continue
+        print(
+            f"{step:>20}: p50 {percentile(latencies, 0.5) * 1000:.1f} ms, "
+            f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms, "
+            f"max {latencies[-1] * 1000:.1f} ms, {timeouts} timeouts"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--handler-concurrency", type=int, default=8)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--ldb-latency", type=float, default=0.05)
+    parser.add_argument("--ldb-jitter", type=float, default=0.05)
+    parser.add_argument("--ldb-error-rate", type=float, default=0.0)
+    parser.add_argument("--delayed", type=float, default=0.1)
+    parser.add_argument("--cancelled", type=float, default=0.05)
+    parser.add_argument("--telegram-latency", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    ldb = FakeLdbServer(
+        latency=args.ldb_latency,
+        jitter=args.ldb_jitter,
+        error_rate=args.ldb_error_rate,
+        delayed=args.delayed,
+        cancelled=args.cancelled,
+        seed=args.seed,
+    )
+    ldb.start()
+    api.WSDL = ldb.wsdl_url
+
+    telegram = FakeTelegramServer(latency=args.telegram_latency)
+    replies = Replies()
+    telegram.on_sent = replies
+    telegram.start()
+
+    directory = tempfile.TemporaryDirectory()
+    database_url = args.database_url or (
+        f"sqlite:///{os.path.join(directory.name, 'load_test.db')}"
+    )
+    updater, executor, service = start_bot(
+        telegram, database_url, args.workers, args.handler_concurrency
+    )
+
+    with open(STATIONS_FILE) as file:
+        stations, _ = read_stations(file)
+    codes = [station.crs for station in stations]
+    rng = random.Random(args.seed)
+    journeys = [
+        (*rng.sample(codes, 2), f"{rng.randrange(24):02}:{rng.randrange(60):02}")
+        for _ in range(args.chats)
+    ]
+
+    results = Results()
+
+    def run_chat(chat_id: int) -> None:
+        chat = Chat(chat_id + 1, telegram, replies, results, args.timeout)
+        chat.run(*journeys[chat_id])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(run_chat, range(args.chats)))
+    elapsed = time.perf_counter() - start
+
+    report(results, elapsed)
+    print(
+        f"LDB requests {dict(ldb.requests)}, faults {dict(ldb.errors)}; "
+        f"Bot API calls {dict(telegram.calls)}"
+    )
+
+    updater.stop()
+    executor.shutdown(timeout=30)
+    service.shutdown()
+    telegram.stop()
+    ldb.stop()
+    directory.cleanup()
+
+
+if __name__ == "__main__":
+    main()
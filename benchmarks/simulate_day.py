@@ -0,0 +1,219 @@
+"""Replay a day of subscription polling on a virtual clock.
+
+Loads N subscriptions into a fresh database, recovers their polling jobs and
+runs them from midnight to midnight against a scripted disruption timeline, in
+a few seconds. Reports the LDB calls, the notifications, the peak number of
+concurrently running jobs and the scheduling lag, to compare polling policies.
+
+The timeline is a JSON list of disruptions, e.g.
+
+    [{"start": "07:00", "end": "09:30", "delay": 15, "share": 0.3},
+     {"start": "17:30", "end": "18:00", "cancelled": true, "origin": "S01"}]
+
+Usage:
+
+    python benchmarks/simulate_day.py --subscriptions 10000
+    python benchmarks/simulate_day.py --timeline disruptions.json \\
+        --poll-interval 300 --disrupted-poll-interval 60 --ldb-latency 1.0
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from typing import List, Tuple
+
+from sqlalchemy import insert
+
+from rail_bot.bot.job_manager import JobManager, PollingPolicy
+from rail_bot.bot.notifier import Notifier
+from rail_bot.bot.service.subscription_service import (
+    DailySubscription,
+    SubscriptionService,
+    Travel,
+)
+from rail_bot.bot.simulation import (
+    SCHEDULER_WORKERS,
+    CountingBot,
+    Disruption,
+    ScriptedDepartures,
+    SimulatedJobQueue,
+    VirtualClock,
+)
+from rail_bot.utils import parse_time
+
+CHUNK_SIZE = 10_000
+
+# A morning peak with a third of the trains delayed, and an evening cancellation
+DEFAULT_TIMELINE = [
+    Disruption(datetime.time(7), datetime.time(9, 30), delay=15, share=0.3),
+    Disruption(datetime.time(17, 30), datetime.time(18), cancelled=True, share=0.1),
+]
+
+Departure = Tuple[str, str, datetime.time]
+
+
+def load_timeline(path: str) -> List[Disruption]:
+    with open(path) as file:
+        entries = json.load(file)
+    return [
+        Disruption(
+            **{
+                **entry,
+                "start": parse_time(entry["start"]),
+                "end": parse_time(entry["end"]),
+            }
+        )
+        for entry in entries
+    ]
+
+
+def populate(
+    service: SubscriptionService,
+    subscriptions: int,
+    stations: int,
+    subscriptions_per_chat: int,
+    seed: int,
+) -> List[Departure]:
+    """Subscribe chats to random departures between 05:00 and 23:55, every 5
+    minutes. Returns the subscribed departures.
+    """
+    rng = random.Random(seed)
+    codes = [f"S{number:02}" for number in range(stations)]
+    travel_ids = {}
+    rows = []
+    for subscription in range(subscriptions):
+        origin, destination = rng.sample(codes, 2)
+        minutes = rng.randrange(5 * 60, 24 * 60, 5)
+        departure = (origin, destination, datetime.time(*divmod(minutes, 60)))
+        travel_id = travel_ids.setdefault(departure, len(travel_ids) + 1)
+        rows.append(
+            {"chat_id": subscription // subscriptions_per_chat, "travel_id": travel_id}
+        )
+    # A chat subscribes to a travel once
+    rows = list({(row["chat_id"], row["travel_id"]): row for row in rows}.values())
+
+    counts = {travel_id: 0 for travel_id in travel_ids.values()}
+    for row in rows:
+        counts[row["travel_id"]] += 1
+    travels = [
+        {
+            "id": travel_id,
+            "origin": origin,
+            "destination": destination,
+            "departure_time": departure_time,
+            "subscriber_count": counts[travel_id],
+        }
+        for (origin, destination, departure_time), travel_id in travel_ids.items()
+    ]
+
+    with service.engine.begin() as connection:
+        for start in range(0, len(travels), CHUNK_SIZE):
+            connection.execute(insert(Travel), travels[start : start + CHUNK_SIZE])
+        for start in range(0, len(rows), CHUNK_SIZE):
+            connection.execute(
+                insert(DailySubscription), rows[start : start + CHUNK_SIZE]
+            )
+    return list(travel_ids)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    return values[int(fraction * (len(values) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscriptions", type=int, default=10_000)
+    parser.add_argument("--stations", type=int, default=100)
+    parser.add_argument("--subscriptions-per-chat", type=int, default=2)
+    parser.add_argument("--timeline", default=None, help="JSON disruption timeline")
+    parser.add_argument("--date", default="2024-01-08", help="simulated day")
+    parser.add_argument("--workers", type=int, default=SCHEDULER_WORKERS)
+    parser.add_argument("--ldb-latency", type=float, default=0.5)
+    parser.add_argument(
+        "--first-check-before", type=int, default=PollingPolicy().first_check_before
+    )
+    parser.add_argument("--poll-interval", type=int, default=PollingPolicy().interval)
+    parser.add_argument(
+        "--disrupted-poll-interval",
+        type=int,
+        default=PollingPolicy().disrupted_interval,
+    )
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    directory = tempfile.TemporaryDirectory()
+    database_url = args.database_url or (
+        f"sqlite:///{os.path.join(directory.name, 'simulation.db')}"
+    )
+    service = SubscriptionService(database_url)
+    departures = populate(
+        service,
+        args.subscriptions,
+        args.stations,
+        args.subscriptions_per_chat,
+        args.seed,
+    )
+    timeline = (
+        DEFAULT_TIMELINE if args.timeline is None else load_timeline(args.timeline)
+    )
+
+    start = datetime.datetime.combine(
+        datetime.date.fromisoformat(args.date), datetime.time()
+    )
+    clock = VirtualClock(start)
+    bot = CountingBot()
+    queue = SimulatedJobQueue(clock, bot, workers=args.workers)
+    notifier = Notifier(queue, clock=clock.monotonic)
+    ldb = ScriptedDepartures(clock, departures, timeline, latency=args.ldb_latency)
+    policy = PollingPolicy(
+        first_check_before=args.first_check_before,
+        interval=args.poll_interval,
+        disrupted_interval=args.disrupted_poll_interval,
+    )
+    job_manager = JobManager(
+        queue,
+        service,
+        notifier=notifier,
+        policy=policy,
+        departure_status=ldb,
+        now=clock.now,
+    )
+
+    wall_start = time.perf_counter()
+    job_manager.recover_travel_jobs()
+    queue.run_until(start + datetime.timedelta(days=1))
+    elapsed = time.perf_counter() - wall_start
+
+    lags = sorted(queue.lags)
+    print(
+        f"Simulated {len(departures)} travels of {args.subscriptions} subscriptions "
+        f"with {policy} in {elapsed:.1f} s."
+    )
+    print(f"Jobs run: {dict(queue.runs)}, {queue.errors} failed")
+    print(f"LDB calls: {ldb.calls}")
+    print(
+        f"Notifications: {notifier.sent} sent, {notifier.edited} edited, "
+        f"{notifier.coalesced} coalesced; Bot API calls: {bot.sent} sendMessage, "
+        f"{bot.edited} editMessageText"
+    )
+    print(f"Peak concurrency: {queue.peak_concurrency} of {args.workers} workers")
+    if lags:
+        print(
+            f"Scheduling lag: p50 {percentile(lags, 0.5):.1f} s, "
+            f"p99 {percentile(lags, 0.99):.1f} s, max {lags[-1]:.1f} s"
+        )
+
+    service.shutdown()
+    directory.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Travel query latency on a table bloated with orphaned travels, before and
+after `SubscriptionService.remove_orphaned_travels`.
+
+Usage:
+
+    python benchmarks/travel_compaction.py --subscriptions 100000 --dead-travels 1000000
+"""
+
+import argparse
+import datetime
+import os
+import statistics
+import tempfile
+import time
+import timeit
+
+from active_travels import populate
+
+from rail_bot.bot.service.subscription_service import Base, SubscriptionService
+
+
+def measure(service: SubscriptionService, repeat: int) -> None:
+    queries = {
+        "get_travels(only_active=True)": lambda: service.get_travels(only_active=True),
+        "get_travels(origin=...)": lambda: service.get_travels(origin="001"),
+        "add_travel (existing)": lambda: service.add_travel(
+            "001", "000", datetime.time(0, 1)
+        ),
+    }
+    for name, query in queries.items():
+        timings = timeit.repeat(
+            lambda: (query(), service.session.rollback()), number=1, repeat=repeat
+        )
+        print(
+            f"{name:>32}: min {min(timings) * 1000:.2f} ms, "
+            f"median {statistics.median(timings) * 1000:.2f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--subscriptions", type=int, default=100_000)
+    parser.add_argument("--dead-travels", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+    service = SubscriptionService(database_url)
+    try:
+        populate(service, args.subscriptions, inactive_travels=args.dead_travels)
+        print(f"Before compaction ({len(service.get_travels())} travels):")
+        measure(service, args.repeat)
+
+        start = time.perf_counter()
+        removed = service.remove_orphaned_travels(batch_size=args.batch_size)
+        elapsed = time.perf_counter() - start
+        print(f"Compaction reclaimed {len(removed)} travel rows in {elapsed:.2f} s")
+
+        print(f"After compaction ({len(service.get_travels())} travels):")
+        measure(service, args.repeat)
+    finally:
+        service.session.close()
+        Base.metadata.drop_all(service.engine)
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
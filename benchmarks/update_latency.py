@@ -0,0 +1,125 @@
+"""Update-to-reply latency of the webhook mode compared with long polling,
+against a local fake Telegram Bot API.
+
+Usage:
+
+    python benchmarks/update_latency.py --updates 500
+"""
+
+import argparse
+import http.client
+import json
+import statistics
+import threading
+import time
+from typing import Callable, Dict, List
+
+from fake_telegram import FakeTelegramServer, SentMessage
+from telegram import Update
+from telegram.ext import CallbackContext, Filters, MessageHandler, Updater
+
+from rail_bot.bot.webhook import SECRET_TOKEN_HEADER, start_webhook
+
+TOKEN = "123456:fake-token"
+SECRET = "benchmark-secret"
+WEBHOOK_PATH = "/telegram"
+
+
+def reply(update: Update, context: CallbackContext) -> None:
+    context.bot.send_message(update.effective_chat.id, text=str(update.update_id))
+
+
+class Replies:
+    """Wakes up the sender when the reply to an update has been received."""
+
+    def __init__(self) -> None:
+        self.received: Dict[str, float] = {}
+        self.condition = threading.Condition()
+
+    def __call__(self, sent: SentMessage) -> None:
+        with self.condition:
+            self.received[sent.params["text"]] = sent.received_at
+            self.condition.notify_all()
+
+    def wait(self, update_id: int) -> float:
+        with self.condition:
+            self.condition.wait_for(lambda: str(update_id) in self.received, 10)
+            return self.received[str(update_id)]
+
+
+def measure(
+    fake: FakeTelegramServer, send: Callable[[dict], None], updates: int
+) -> List[float]:
+    replies = Replies()
+    fake.on_sent = replies
+    latencies = []
+    for chat_id in range(updates):
+        update = fake.make_update(chat_id, "ping")
+        start = time.perf_counter()
+        send(update)
+        latencies.append(replies.wait(update["update_id"]) - start)
+    return latencies
+
+
+def report(mode: str, latencies: List[float]) -> None:
+    latencies = sorted(latencies)
+    p99 = latencies[int(0.99 * (len(latencies) - 1))]
+    print(
+        f"{mode:>8}: p50 {statistics.median(latencies) * 1000:.2f} ms, "
+        f"p99 {p99 * 1000:.2f} ms, max {latencies[-1] * 1000:.2f} ms"
+    )
+
+
+def make_updater(fake: FakeTelegramServer, workers: int) -> Updater:
+    updater = Updater(token=TOKEN, base_url=fake.base_url, workers=workers)
+    updater.dispatcher.add_handler(MessageHandler(Filters.text, reply))
+    return updater
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    fake = FakeTelegramServer()
+    fake.start()
+
+    updater = make_updater(fake, args.workers)
+    updater.start_polling(poll_interval=0.0, timeout=10)
+    report("polling", measure(fake, fake.push_update, args.updates))
+    updater.stop()
+
+    updater = make_updater(fake, args.workers)
+    webhook = start_webhook(
+        updater,
+        webhook_url="http://127.0.0.1",
+        listen="127.0.0.1",
+        port=0,
+        url_path=WEBHOOK_PATH,
+        secret_token=SECRET,
+        workers=args.workers,
+    )
+    connection = http.client.HTTPConnection("127.0.0.1", webhook.port)
+
+    def post(update: dict) -> None:
+        connection.request(
+            "POST",
+            WEBHOOK_PATH,
+            body=json.dumps(update),
+            headers={
+                "Content-Type": "application/json",
+                SECRET_TOKEN_HEADER: SECRET,
+            },
+        )
+        connection.getresponse().read()
+
+    report("webhook", measure(fake, post, args.updates))
+    connection.close()
+    webhook.stop()
+    updater.stop()
+    fake.stop()
+
+
+if __name__ == "__main__":
+    main()
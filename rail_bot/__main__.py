@@ -1,74 +1,143 @@
 import logging
 import os
-from typing import List
+import secrets
+import signal
+import threading
 
-from telegram import Bot, BotCommand
-from telegram.ext import Dispatcher, Updater
+from telegram import Update
+from telegram.ext import TypeHandler, Updater
 
-from rail_bot.bot.board_handler import board_handler
-from rail_bot.bot.help_handler import help_handler
-from rail_bot.bot.job_manager import JobManager
 from rail_bot.bot.service.subscription_service import create_subscription_service
-from rail_bot.bot.start_handler import start_handler
-from rail_bot.bot.subscription.subscribe_handler import subscribe_handler
-from rail_bot.bot.subscription.unsubscribe_handler import unsubscribe_handler
-from rail_bot.bot.unknown_handler import unknown_command_handler
-
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+from rail_bot.bot.webhook import start_webhook
+from rail_bot.metrics import start_metrics_server
+from rail_bot.prefork import Master
+from rail_bot.rail_api.api import get_client
+from rail_bot.rail_api.stations import get_station_index
+from rail_bot.rail_api.timetable import get_timetable
+from rail_bot.worker import (
+    BOT_PROCESSES,
+    BOT_WORKERS,
+    HANDLER_CONCURRENCY,
+    LOG_FORMAT,
+    METRICS_LISTEN,
+    METRICS_PORT,
+    create_updater,
+    run_worker,
+    setup_bot,
 )
 
+logging.basicConfig(format=LOG_FORMAT, level=logging.INFO)
+
 logger = logging.getLogger(__name__)
 
 PORT = int(os.environ.get("PORT", 8443))
-TELEGRAM_TOKEN = os.environ.get("TELEGRAM_TOKEN", "")
+
+# "polling" or "webhook"
+BOT_MODE = os.environ.get("BOT_MODE", "polling")
+# Public HTTPS URL Telegram sends updates to, without the path
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/telegram")
+WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "0.0.0.0")
+# A fresh secret is registered with Telegram on every start unless set
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", 8))
+# Seconds before restarting a worker process that exited soon after starting
+WORKER_RESTART_DELAY = float(os.environ.get("WORKER_RESTART_DELAY", 10))
 
 
 def main():
-    updater = Updater(token=TELEGRAM_TOKEN)
-    dispatcher: Dispatcher = updater.dispatcher
-    bot: Bot = dispatcher.bot
-    bot_commands: List[BotCommand] = []
+    if BOT_PROCESSES > 1:
+        run_prefork()
+        return
 
+    # Dispatcher workers, handler workers, the job queue and the updater share it
+    updater = create_updater(BOT_WORKERS + HANDLER_CONCURRENCY + 4)
     logger.info("Created Updater.")
-
-    service = create_subscription_service()
-    job_manager = JobManager(job_queue=updater.job_queue, service=service)
-
-    job_manager.recover_travel_jobs()
-
-    # Add /start handler
-    dispatcher.add_handler(start_handler())
-
-    # Add /board handler and bot commands
-    board_handler_, board_bot_command = board_handler()
-    dispatcher.add_handler(board_handler_)
-    bot_commands.append(board_bot_command)
-
-    # Add /subscribe handler and bot commands
-    subscribe_handler_, subscribe_bot_command = subscribe_handler(job_manager)
-    dispatcher.add_handler(subscribe_handler_)
-    bot_commands.append(subscribe_bot_command)
-
-    # Add /unsubscribe handler and bot commands
-    for handler, bot_command in unsubscribe_handler(job_manager):
-        dispatcher.add_handler(handler)
-        if bot_command is not None:
-            bot_commands.append(bot_command)
-
-    # Add /help handler and bot commands
-    help_handler_, bot_help_command = help_handler()
-    dispatcher.add_handler(help_handler_)
-    bot_commands.append(bot_help_command)
-
-    # Must go very last
-    dispatcher.add_handler(unknown_command_handler())
-
-    # Set the bot commands
-    bot.set_my_commands(bot_commands)
-
-    updater.start_polling()
-    updater.idle()
+    executor = setup_bot(updater)
+
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT, listen=METRICS_LISTEN)
+
+    if BOT_MODE == "webhook":
+        run_webhook(updater)
+    else:
+        updater.start_polling()
+        updater.idle()
+
+    executor.shutdown(timeout=30)
+
+
+def preload() -> None:
+    """Loads the shared read-only state in the master, before forking."""
+    try:
+        # Close the connection used for the WSDL: workers must not share it
+        get_client().transport.session.close()
+    except Exception as e:
+        logger.warning(f"Could not load the LDB WSDL, workers will: {e!r}")
+    get_station_index()
+    get_timetable()
+    create_subscription_service().shutdown()
+
+
+def run_prefork() -> None:
+    preload()
+    master = Master(BOT_PROCESSES, run_worker, restart_delay=WORKER_RESTART_DELAY)
+    master.start()
+
+    # The master only routes updates, from a single dispatcher thread in order
+    updater = create_updater(8)
+    updater.dispatcher.add_handler(TypeHandler(Update, master.route))
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT, listen=METRICS_LISTEN)
+
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: stop.set())
+
+    webhook = None
+    if BOT_MODE == "webhook":
+        webhook = start_webhook(
+            updater,
+            webhook_url=WEBHOOK_URL,
+            listen=WEBHOOK_LISTEN,
+            port=PORT,
+            url_path=WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            workers=WEBHOOK_WORKERS,
+        )
+    else:
+        updater.start_polling()
+    logger.info(f"Routing updates to {BOT_PROCESSES} worker processes.")
+
+    master.supervise(stop)
+
+    logger.info("Stopping the workers.")
+    if webhook is not None:
+        webhook.stop()
+    updater.stop()
+    master.stop()
+
+
+def run_webhook(updater: Updater) -> None:
+    webhook = start_webhook(
+        updater,
+        webhook_url=WEBHOOK_URL,
+        listen=WEBHOOK_LISTEN,
+        port=PORT,
+        url_path=WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        workers=WEBHOOK_WORKERS,
+    )
+    logger.info(f"Receiving updates through the webhook at {WEBHOOK_URL}.")
+
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: stop.set())
+    stop.wait()
+
+    logger.info("Stopping the webhook server.")
+    webhook.stop()
+    updater.stop()
 
 
 if __name__ == "__main__":
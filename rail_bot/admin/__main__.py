@@ -0,0 +1,148 @@
+"""Administration commands run against the subscription database.
+
+    python -m rail_bot.admin export subscriptions.csv
+    python -m rail_bot.admin import subscriptions.ndjson
+    python -m rail_bot.admin stations RailReferences.csv
+    python -m rail_bot.admin timetable toc-full.CIF --output timetable.bin
+
+The database is configured with the same environment variables as the bot.
+Use ``-`` as the path to read from stdin or write to stdout.
+
+``stations`` rebuilds the bundled station table from a NaPTAN
+``RailReferences.csv`` export and marks it as complete, so that unknown
+station codes are rejected without asking LDB.
+
+``timetable`` builds the timetable index of ``TIMETABLE_FILE`` from a CIF or
+JSON extract of the SCHEDULE feed, for the week from today by default.
+"""
+
+import argparse
+import datetime
+import logging
+import sys
+
+from rail_bot.admin.transfer import (
+    FORMATS,
+    export_subscriptions,
+    format_from_path,
+    import_subscriptions,
+)
+from rail_bot.admin import timetable
+from rail_bot.bot.service.subscription_service import create_subscription_service
+from rail_bot.rail_api.stations import (
+    STATIONS_FILE,
+    get_station_index,
+    stations_from_naptan,
+    write_stations,
+)
+from rail_bot.rail_api.timetable import TIMETABLE_FILE, write_timetable
+
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+
+logger = logging.getLogger(__name__)
+
+
+def import_stations(naptan_path: str, output_path: str) -> None:
+    with open(naptan_path, newline="", encoding="utf-8-sig") as file:
+        stations = stations_from_naptan(file)
+    with open(output_path, "w", newline="") as file:
+        write_stations(file, stations, complete=True)
+    logger.info(f"Wrote {len(stations)} stations to {output_path}.")
+
+
+def import_timetable(
+    extract_path: str,
+    output_path: str,
+    file_format: str,
+    start: datetime.date,
+    days: int,
+) -> None:
+    read = timetable.read_json if file_format == timetable.JSON else timetable.read_cif
+    with open(extract_path, encoding="latin-1") as file:
+        schedules, tiplocs = read(file)
+
+    stations = get_station_index()
+
+    def crs_of(tiploc: str):
+        if tiploc in tiplocs:
+            return tiplocs[tiploc]
+        station = stations.by_tiploc(tiploc)
+        return None if station is None else station.crs
+
+    departures = timetable.build_departures(schedules, crs_of, start, days)
+    count = write_timetable(output_path, departures, start, days)
+    logger.info(
+        f"Wrote {count} departures between {len(departures)} pairs of stations "
+        f"from {len(schedules)} schedules to {output_path}."
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m rail_bot.admin")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for command in ("export", "import"):
+        command_parser = commands.add_parser(command)
+        command_parser.add_argument("path")
+        command_parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            default=None,
+            help="Defaults to ndjson for .ndjson/.jsonl paths, csv otherwise.",
+        )
+    stations_parser = commands.add_parser("stations")
+    stations_parser.add_argument("path", help="NaPTAN RailReferences.csv")
+    stations_parser.add_argument("--output", default=STATIONS_FILE)
+    timetable_parser = commands.add_parser("timetable")
+    timetable_parser.add_argument("path", help="CIF or JSON SCHEDULE extract")
+    timetable_parser.add_argument(
+        "--format",
+        choices=timetable.FORMATS,
+        default=None,
+        help="Defaults to json for .json/.jsonl/.ndjson paths, cif otherwise.",
+    )
+    timetable_parser.add_argument("--output", default=TIMETABLE_FILE or None)
+    timetable_parser.add_argument(
+        "--start", type=datetime.date.fromisoformat, default=datetime.date.today()
+    )
+    timetable_parser.add_argument("--days", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.command == "stations":
+        import_stations(args.path, args.output)
+        return
+    if args.command == "timetable":
+        if args.output is None:
+            parser.error("Set TIMETABLE_FILE or --output.")
+        import_timetable(
+            args.path,
+            args.output,
+            args.format or timetable.format_from_path(args.path),
+            args.start,
+            args.days,
+        )
+        return
+
+    file_format = args.format or format_from_path(args.path)
+    service = create_subscription_service()
+    try:
+        if args.command == "export":
+            file = sys.stdout if args.path == "-" else open(args.path, "w", newline="")
+            with file:
+                count = export_subscriptions(service.engine, file, file_format)
+            logger.info(f"Exported {count} subscriptions.")
+        else:
+            file = sys.stdin if args.path == "-" else open(args.path, newline="")
+            with file:
+                count = import_subscriptions(service.engine, file, file_format)
+            logger.info(
+                f"Imported {count} subscriptions. Restart the bot to schedule "
+                "travels that were not active before."
+            )
+    finally:
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
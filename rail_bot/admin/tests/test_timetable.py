@@ -0,0 +1,149 @@
+import datetime
+import io
+import json
+import unittest
+
+from rail_bot.admin.timetable import build_departures, read_cif, read_json
+
+MONDAY = datetime.date(2024, 1, 8)
+
+MON_TUE_FRI = 0b10011
+WEDNESDAY = 0b100
+SATURDAY = 0b100000
+SUNDAY = 0b1000000
+
+
+def ti(tiploc: str, crs: str) -> str:
+    return ("TI" + tiploc.ljust(7)).ljust(53) + crs
+
+
+def bs(uid: str, start: str, end: str, days: str, stp: str) -> str:
+    return ("BSN" + uid + start + end + days).ljust(79) + stp
+
+
+def lo(tiploc: str, departure: str) -> str:
+    return "LO" + tiploc.ljust(8) + departure + " " + departure
+
+
+def li(tiploc: str, arrival: str, departure: str) -> str:
+    return (
+        "LI"
+        + tiploc.ljust(8)
+        + arrival
+        + " "
+        + departure
+        + " " * 6
+        + arrival
+        + departure
+    )
+
+
+def pass_(tiploc: str, time: str) -> str:
+    return "LI" + tiploc.ljust(8) + " " * 10 + time + "H" + "0000" + "0000"
+
+
+def lt(tiploc: str, arrival: str) -> str:
+    return "LT" + tiploc.ljust(8) + arrival + " " + arrival
+
+
+CIF_EXTRACT = "\n".join(
+    [
+        "HDTPS.UDFROC1.PD2401070701241234DFROC1A       FA070124060125",
+        ti("KNGX", "KGX"),
+        ti("CAMBDGE", "CBG"),
+        # Weekdays, Stevenage mapped through the station table
+        bs("C10000", "240101", "241231", "1111100", "P"),
+        lo("KNGX", "0800"),
+        pass_("FNPK", "0804"),
+        li("STEVNGE", "0822", "0823"),
+        lt("CAMBDGE", "0850"),
+        # Runs later on Wednesday, not on Thursday
+        bs("C10000", "240110", "240110", "0010000", "O"),
+        lo("KNGX", "0805"),
+        lt("CAMBDGE", "0855"),
+        bs("C10000", "240111", "240111", "0001000", "C"),
+        # Saturday nights, after midnight from Stevenage
+        bs("C20000", "240101", "999999", "0000010", "P"),
+        lo("KNGX", "2340"),
+        li("STEVNGE", "0005", "0006"),
+        lt("CAMBDGE", "0030"),
+        "ZZ",
+    ]
+)
+
+JSON_EXTRACT = "\n".join(
+    json.dumps(record)
+    for record in [
+        {"TiplocV1": {"tiploc_code": "KNGX", "crs_code": "KGX"}},
+        {"TiplocV1": {"tiploc_code": "FNPK", "crs_code": None}},
+        {
+            "JsonScheduleV1": {
+                "CIF_train_uid": "C10000",
+                "CIF_stp_indicator": "P",
+                "transaction_type": "Create",
+                "schedule_start_date": "2024-01-01",
+                "schedule_end_date": "2024-12-31",
+                "schedule_days_runs": "1111100",
+                "schedule_segment": {
+                    "schedule_location": [
+                        {
+                            "location_type": "LO",
+                            "tiploc_code": "KNGX",
+                            "public_departure": "0800",
+                        },
+                        {
+                            "location_type": "LI",
+                            "tiploc_code": "FNPK",
+                            "public_arrival": None,
+                            "public_departure": None,
+                        },
+                        {
+                            "location_type": "LT",
+                            "tiploc_code": "CAMBDGE",
+                            "public_arrival": "0850",
+                        },
+                    ]
+                },
+            }
+        },
+    ]
+)
+
+
+def crs_of(tiplocs):
+    return lambda tiploc: tiplocs.get(tiploc, {"STEVNGE": "SVG"}.get(tiploc))
+
+
+class TestTimetableImport(unittest.TestCase):
+    def test_cif(self):
+        schedules, tiplocs = read_cif(io.StringIO(CIF_EXTRACT))
+        self.assertEqual(len(schedules), 4)
+        self.assertEqual(tiplocs, {"KNGX": "KGX", "CAMBDGE": "CBG"})
+
+        departures = build_departures(schedules, crs_of(tiplocs), MONDAY, 7)
+
+        self.assertEqual(
+            departures[("KGX", "CBG")],
+            {8 * 60: MON_TUE_FRI, 8 * 60 + 5: WEDNESDAY, 23 * 60 + 40: SATURDAY},
+        )
+        self.assertEqual(
+            departures[("SVG", "CBG")], {8 * 60 + 23: MON_TUE_FRI, 6: SUNDAY}
+        )
+        self.assertEqual(
+            departures[("KGX", "SVG")], {8 * 60: MON_TUE_FRI, 23 * 60 + 40: SATURDAY}
+        )
+        self.assertEqual(len(departures), 3)
+
+    def test_json(self):
+        schedules, tiplocs = read_json(io.StringIO(JSON_EXTRACT))
+        self.assertEqual(tiplocs, {"KNGX": "KGX"})
+
+        departures = build_departures(
+            schedules, crs_of({**tiplocs, "CAMBDGE": "CBG"}), MONDAY, 14
+        )
+
+        self.assertEqual(dict(departures), {("KGX", "CBG"): {8 * 60: 0b11111}})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import datetime
+import io
+import os
+import tempfile
+import unittest
+
+from rail_bot.admin.transfer import (
+    CSV,
+    NDJSON,
+    export_subscriptions,
+    import_subscriptions,
+)
+from rail_bot.bot.service.subscription_service import (
+    Base,
+    DailySubscription,
+    SubscriptionService,
+    Travel,
+)
+from rail_bot.bot.service.tests.test_subscription_service import (
+    TEST_DB_NAME,
+    TEST_DB_URL,
+)
+
+# COPY goes through psycopg2, whichever driver SQLAlchemy defaults to
+TEST_DB_COPY_URL = TEST_DB_URL.replace("postgresql://", "postgresql+psycopg2://")
+
+
+class TestTransfer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.source = self._service("source.db")
+        self.target = self._service("target.db")
+
+        self.source.add_subscription(1, "aaa", "bbb", datetime.time(11, 12))
+        self.source.add_subscription(2, "aaa", "bbb", datetime.time(11, 12))
+        self.source.add_subscription(2, "ccc", "ddd", datetime.time(22, 24, 56))
+
+    def tearDown(self) -> None:
+        for service in (self.source, self.target):
+            service.session.close()
+            service.shutdown()
+        self.directory.cleanup()
+
+    def _service(self, name: str) -> SubscriptionService:
+        path = os.path.join(self.directory.name, name)
+        return SubscriptionService(database_url=f"sqlite:///{path}")
+
+    def _clear_target(self) -> None:
+        pass
+
+    def _round_trip(self, file_format: str) -> str:
+        file = io.StringIO()
+        exported = export_subscriptions(self.source.engine, file, file_format)
+        self.assertEqual(exported, 3)
+
+        self._clear_target()
+        file.seek(0)
+        imported = import_subscriptions(self.target.engine, file, file_format)
+        self.assertEqual(imported, 3)
+        return file.getvalue()
+
+    def _assert_imported(self):
+        travels = sorted(
+            self.target.get_travels(only_active=True),
+            key=lambda travel: travel.origin,
+        )
+        self.assertEqual(
+            [
+                (t.origin, t.destination, t.departure_time, t.subscriber_count)
+                for t in travels
+            ],
+            [
+                ("aaa", "bbb", datetime.time(11, 12), 2),
+                ("ccc", "ddd", datetime.time(22, 24, 56), 1),
+            ],
+        )
+        self.assertEqual(len(self.target.get_subscriptions()), 3)
+
+    def test_csv_round_trip(self):
+        content = self._round_trip(CSV)
+
+        self.assertEqual(
+            content.splitlines()[:2],
+            ["chat_id,origin,destination,departure_time", "1,aaa,bbb,11:12:00"],
+        )
+        self._assert_imported()
+
+    def test_ndjson_round_trip(self):
+        content = self._round_trip(NDJSON)
+
+        self.assertEqual(
+            content.splitlines()[0],
+            '{"chat_id": 1, "origin": "aaa", "destination": "bbb", '
+            '"departure_time": "11:12:00"}',
+        )
+        self._assert_imported()
+
+    def test_import_skips_existing_subscriptions(self):
+        content = self._round_trip(CSV)
+
+        imported = import_subscriptions(self.target.engine, io.StringIO(content), CSV)
+        self.assertEqual(imported, 3)
+        self._assert_imported()
+
+
+class TestPostgresTransfer(TestTransfer):
+    """Same round trips through COPY and the staging table. Source and target
+    are the same test database, emptied between the export and the import.
+    """
+
+    def tearDown(self) -> None:
+        Base.metadata.drop_all(self.source.engine)
+        super().tearDown()
+
+    def _service(self, name: str) -> SubscriptionService:
+        return SubscriptionService(database_url=f"{TEST_DB_COPY_URL}/{TEST_DB_NAME}")
+
+    def _clear_target(self) -> None:
+        with self.target.engine.begin() as connection:
+            connection.execute(DailySubscription.__table__.delete())
+            connection.execute(Travel.__table__.delete())
+
+
+if __name__ == "__main__":
+    unittest.main()
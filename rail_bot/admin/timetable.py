@@ -0,0 +1,226 @@
+"""Import of timetable extracts into the timetable index.
+
+Reads the CIF extract of Network Rail's SCHEDULE feed (fixed-width records) or
+its JSON counterpart (one object per line). TIPLOCs are mapped to CRS codes
+with the extract's own TIPLOC records, falling back to the station table.
+
+For every day of the indexed period, the schedule of each train UID is chosen by
+STP precedence (cancellation, overlay, new, then permanent), so that planned
+changes and cancellations are taken into account. Only full extracts are
+supported: delete records of update extracts are ignored.
+"""
+
+import datetime
+import json
+import logging
+from collections import defaultdict
+from typing import IO, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from rail_bot.rail_api.timetable import ALL_DAYS, Departures
+
+logger = logging.getLogger(__name__)
+
+CIF = "cif"
+JSON = "json"
+FORMATS = (CIF, JSON)
+
+# Lower wins when several schedules of a train UID apply to a day
+STP_PRECEDENCE = {"C": 0, "O": 1, "N": 2, "P": 3}
+# CIF "date runs to" of schedules without an end
+_OPEN_END = "999999"
+
+
+class Location(NamedTuple):
+    tiploc: str
+    # Public times in minutes of the day, None where passengers cannot board or
+    # alight
+    arrival: Optional[int]
+    departure: Optional[int]
+
+
+class Schedule(NamedTuple):
+    uid: str
+    start: datetime.date
+    end: datetime.date
+    # "1111100" runs on weekdays
+    days_run: str
+    stp: str
+    locations: Tuple[Location, ...]
+
+
+def format_from_path(path: str) -> str:
+    return JSON if path.endswith((".json", ".jsonl", ".ndjson")) else CIF
+
+
+def _minutes(value: Optional[str]) -> Optional[int]:
+    """``HHMM``, possibly followed by ``H`` for a half minute."""
+    if not value or not value[:4].strip().isdigit():
+        return None
+    return int(value[:2]) * 60 + int(value[2:4])
+
+
+def _cif_date(value: str) -> datetime.date:
+    if value == _OPEN_END:
+        return datetime.date.max
+    return datetime.date(2000 + int(value[:2]), int(value[2:4]), int(value[4:6]))
+
+
+def read_cif(file: IO[str]) -> Tuple[List[Schedule], Dict[str, str]]:
+    """Schedules and CRS codes by TIPLOC of a CIF extract."""
+    schedules: List[Schedule] = []
+    tiplocs: Dict[str, str] = {}
+    current: Optional[Schedule] = None
+    locations: List[Location] = []
+
+    for line in file:
+        record = line[:2]
+        if record == "TI":
+            crs = line[53:56].strip()
+            if crs:
+                tiplocs[line[2:9].strip()] = crs
+        elif record == "BS":
+            current = None
+            if line[2] == "D":
+                continue
+            current = Schedule(
+                uid=line[3:9],
+                start=_cif_date(line[9:15]),
+                end=_cif_date(line[15:21]),
+                days_run=line[21:28],
+                stp=line[79:80],
+                locations=(),
+            )
+            locations = []
+            if current.stp == "C":
+                schedules.append(current)
+                current = None
+        elif current is None:
+            continue
+        elif record == "LO":
+            locations.append(Location(line[2:9].strip(), None, _minutes(line[15:19])))
+        elif record == "LI":
+            # 0000 public times are passing or operational calls
+            arrival, departure = line[25:29], line[29:33]
+            locations.append(
+                Location(
+                    line[2:9].strip(),
+                    None if arrival == "0000" else _minutes(arrival),
+                    None if departure == "0000" else _minutes(departure),
+                )
+            )
+        elif record == "LT":
+            locations.append(Location(line[2:9].strip(), _minutes(line[15:19]), None))
+            schedules.append(current._replace(locations=tuple(locations)))
+            current = None
+    return schedules, tiplocs
+
+
+def read_json(file: IO[str]) -> Tuple[List[Schedule], Dict[str, str]]:
+    """Schedules and CRS codes by TIPLOC of a JSON extract."""
+    schedules: List[Schedule] = []
+    tiplocs: Dict[str, str] = {}
+    for line in file:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if "TiplocV1" in record:
+            tiploc = record["TiplocV1"]
+            if tiploc.get("crs_code"):
+                tiplocs[tiploc["tiploc_code"]] = tiploc["crs_code"]
+        elif "JsonScheduleV1" in record:
+            schedule = record["JsonScheduleV1"]
+            if schedule.get("transaction_type") == "Delete":
+                continue
+            segment = schedule.get("schedule_segment") or {}
+            schedules.append(
+                Schedule(
+                    uid=schedule["CIF_train_uid"],
+                    start=datetime.date.fromisoformat(schedule["schedule_start_date"]),
+                    end=datetime.date.fromisoformat(schedule["schedule_end_date"]),
+                    days_run=schedule["schedule_days_runs"],
+                    stp=schedule["CIF_stp_indicator"],
+                    locations=tuple(
+                        Location(
+                            location["tiploc_code"],
+                            _minutes(location.get("public_arrival")),
+                            _minutes(location.get("public_departure")),
+                        )
+                        for location in segment.get("schedule_location") or []
+                    ),
+                )
+            )
+    return schedules, tiplocs
+
+
+def _runs_on(schedule: Schedule, date: datetime.date) -> bool:
+    return (
+        schedule.start <= date <= schedule.end
+        and schedule.days_run[date.weekday()] == "1"
+    )
+
+
+def build_departures(
+    schedules: Iterable[Schedule],
+    crs_of: Callable[[str], Optional[str]],
+    start: datetime.date,
+    days: int,
+) -> Departures:
+    """Departures between every pair of stations called at by the same train,
+    for the ``days`` days from ``start``.
+    """
+    by_uid: Dict[str, List[Schedule]] = defaultdict(list)
+    for schedule in schedules:
+        by_uid[schedule.uid].append(schedule)
+
+    departures: Departures = defaultdict(dict)
+    for uid_schedules in by_uid.values():
+        uid_schedules.sort(key=lambda schedule: STP_PRECEDENCE.get(schedule.stp, 4))
+        # Weekdays each schedule of the train applies to in the period
+        weekdays = [0] * len(uid_schedules)
+        for day in range(days):
+            date = start + datetime.timedelta(days=day)
+            for index, schedule in enumerate(uid_schedules):
+                if _runs_on(schedule, date):
+                    weekdays[index] |= 1 << date.weekday()
+                    break
+        for schedule, mask in zip(uid_schedules, weekdays):
+            if mask and schedule.stp != "C":
+                _add_schedule(departures, schedule, crs_of, mask)
+    return departures
+
+
+def _rotate(mask: int, days: int) -> int:
+    """Weekday mask shifted ``days`` days later."""
+    days %= 7
+    return ((mask << days) | (mask >> (7 - days))) & ALL_DAYS
+
+
+def _add_schedule(
+    departures: Departures,
+    schedule: Schedule,
+    crs_of: Callable[[str], Optional[str]],
+    weekdays: int,
+) -> None:
+    # (CRS, location, days after the start day) of every public call
+    calls: List[Tuple[Optional[str], Location, int]] = []
+    offset, previous = 0, None
+    for location in schedule.locations:
+        time = (
+            location.departure if location.departure is not None else location.arrival
+        )
+        if time is None:
+            continue
+        if previous is not None and time < previous:
+            offset += 1
+        previous = time
+        calls.append((crs_of(location.tiploc), location, offset))
+
+    for index, (origin, departure, offset) in enumerate(calls):
+        if origin is None or departure.departure is None:
+            continue
+        mask = _rotate(weekdays, offset)
+        for destination, arrival, _ in calls[index + 1 :]:
+            if destination is None or arrival.arrival is None or destination == origin:
+                continue
+            times = departures[(origin, destination)]
+            times[departure.departure] = times.get(departure.departure, 0) | mask
@@ -0,0 +1,296 @@
+"""Bulk export and import of subscriptions.
+
+Subscriptions are exchanged as (chat_id, origin, destination, departure_time)
+rows, either as CSV with a header line or as newline-delimited JSON. On
+Postgres both directions stream through ``COPY``; other backends fall back to
+chunked ``executemany``. Files are processed line by line, so memory use does
+not depend on the file size.
+"""
+
+import csv
+import datetime
+import io
+import json
+import logging
+from collections import OrderedDict
+from typing import IO, Dict, Iterable, Iterator, List, Set, Tuple
+
+from sqlalchemy import func, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine
+
+from rail_bot.bot.service.subscription_service import DailySubscription, Travel
+
+logger = logging.getLogger(__name__)
+
+CSV = "csv"
+NDJSON = "ndjson"
+FORMATS = (CSV, NDJSON)
+
+COLUMNS = ("chat_id", "origin", "destination", "departure_time")
+
+CHUNK_SIZE = 5000
+# Upper bound on the (origin, destination, departure_time) -> travel id cache
+TRAVEL_CACHE_SIZE = 100_000
+
+Row = Tuple[int, str, str, datetime.time]
+TravelKey = Tuple[str, str, datetime.time]
+
+_EXPORT_QUERY = (
+    "SELECT s.chat_id, t.origin, t.destination, t.departure_time "
+    "FROM daily_subscription s JOIN travel t ON t.id = s.travel_id "
+    "ORDER BY s.id"
+)
+
+
+def format_from_path(path: str) -> str:
+    return NDJSON if path.endswith((".ndjson", ".jsonl")) else CSV
+
+
+def _parse_row(values: Dict[str, str]) -> Row:
+    return (
+        int(values["chat_id"]),
+        values["origin"],
+        values["destination"],
+        datetime.time.fromisoformat(values["departure_time"]),
+    )
+
+
+def read_rows(file: IO[str], file_format: str) -> Iterator[Row]:
+    if file_format == CSV:
+        for values in csv.DictReader(file):
+            yield _parse_row(values)
+    else:
+        for line in file:
+            if line.strip():
+                yield _parse_row(json.loads(line))
+
+
+def _ndjson_line(row: Iterable) -> str:
+    chat_id, origin, destination, departure_time = row
+    return (
+        json.dumps(
+            {
+                "chat_id": int(chat_id),
+                "origin": origin,
+                "destination": destination,
+                "departure_time": str(departure_time),
+            }
+        )
+        + "\n"
+    )
+
+
+class _CsvToNdjsonWriter:
+    """File-like sink for ``COPY ... TO STDOUT`` that re-encodes CSV as NDJSON."""
+
+    def __init__(self, file: IO[str]) -> None:
+        self.file = file
+        self._pending = ""
+
+    def write(self, data) -> None:
+        if isinstance(data, bytes):
+            data = data.decode()
+        *lines, self._pending = (self._pending + data).split("\n")
+        for row in csv.reader(lines):
+            self.file.write(_ndjson_line(row))
+
+
+class _RowsAsCsvReader:
+    """File-like source for ``COPY ... FROM STDIN`` serving parsed rows as CSV."""
+
+    def __init__(self, rows: Iterator[Row]) -> None:
+        self.rows = rows
+        self._buffer = ""
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            output = io.StringIO()
+            csv.writer(output).writerow(row)
+            self._buffer += output.getvalue()
+
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def export_subscriptions(engine: Engine, file: IO[str], file_format: str) -> int:
+    """Write all subscriptions to ``file``. Returns the number of rows written."""
+    with engine.connect() as connection:
+        if engine.dialect.name == "postgresql":
+            return _copy_export(connection, file, file_format)
+        return _stream_export(connection, file, file_format)
+
+
+def _copy_export(connection: Connection, file: IO[str], file_format: str) -> int:
+    sink = file if file_format == CSV else _CsvToNdjsonWriter(file)
+    header = "HEADER" if file_format == CSV else ""
+    cursor = connection.connection.cursor()
+    cursor.copy_expert(f"COPY ({_EXPORT_QUERY}) TO STDOUT WITH CSV {header}", sink)
+    return cursor.rowcount
+
+
+def _stream_export(connection: Connection, file: IO[str], file_format: str) -> int:
+    query = (
+        select(
+            DailySubscription.chat_id,
+            Travel.origin,
+            Travel.destination,
+            Travel.departure_time,
+        )
+        .join(Travel, Travel.id == DailySubscription.travel_id)
+        .order_by(DailySubscription.id)
+    )
+    result = connection.execution_options(
+        stream_results=True, yield_per=CHUNK_SIZE
+    ).execute(query)
+
+    writer = csv.writer(file)
+    if file_format == CSV:
+        writer.writerow(COLUMNS)
+
+    exported = 0
+    for row in result:
+        if file_format == CSV:
+            writer.writerow(row)
+        else:
+            file.write(_ndjson_line(row))
+        exported += 1
+    return exported
+
+
+def import_subscriptions(engine: Engine, file: IO[str], file_format: str) -> int:
+    """Add the subscriptions in ``file``, skipping the ones that already exist.
+    Returns the number of rows read.
+    """
+    rows = read_rows(file, file_format)
+    with engine.begin() as connection:
+        if engine.dialect.name == "postgresql":
+            return _copy_import(connection, rows)
+        return _executemany_import(connection, rows)
+
+
+def _refresh_subscriber_count(connection: Connection, travels_filter) -> None:
+    count = (
+        select(func.count())
+        .where(DailySubscription.travel_id == Travel.id)
+        .scalar_subquery()
+    )
+    connection.execute(
+        update(Travel).where(travels_filter).values(subscriber_count=count)
+    )
+
+
+def _copy_import(connection: Connection, rows: Iterator[Row]) -> int:
+    cursor = connection.connection.cursor()
+    cursor.execute(
+        "CREATE TEMPORARY TABLE subscription_import ("
+        "chat_id BIGINT, origin TEXT, destination TEXT, departure_time TIME"
+        ") ON COMMIT DROP"
+    )
+    cursor.copy_expert(
+        "COPY subscription_import FROM STDIN WITH CSV", _RowsAsCsvReader(rows)
+    )
+    imported = cursor.rowcount
+
+    # Travels are deduplicated against the staging table, not in Python
+    cursor.execute(
+        "INSERT INTO travel (origin, destination, departure_time) "
+        "SELECT DISTINCT origin, destination, departure_time FROM subscription_import "
+        "ON CONFLICT (origin, destination, departure_time) DO NOTHING"
+    )
+    cursor.execute(
+        "INSERT INTO daily_subscription (chat_id, travel_id) "
+        "SELECT DISTINCT i.chat_id, t.id FROM subscription_import i "
+        "JOIN travel t USING (origin, destination, departure_time) "
+        "ON CONFLICT (chat_id, travel_id) DO NOTHING"
+    )
+    cursor.execute(
+        "UPDATE travel SET subscriber_count = ("
+        "SELECT COUNT(*) FROM daily_subscription s WHERE s.travel_id = travel.id"
+        ") WHERE (origin, destination, departure_time) IN ("
+        "SELECT origin, destination, departure_time FROM subscription_import)"
+    )
+    return imported
+
+
+def _chunks(rows: Iterator[Row], size: int) -> Iterator[List[Row]]:
+    chunk: List[Row] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _insert_ignore(connection: Connection):
+    return (
+        postgresql.insert if connection.dialect.name == "postgresql" else sqlite.insert
+    )
+
+
+def _resolve_travel_ids(
+    connection: Connection,
+    keys: Set[TravelKey],
+    cache: "OrderedDict[TravelKey, int]",
+) -> Dict[TravelKey, int]:
+    travel_ids: Dict[TravelKey, int] = {}
+    for key in keys:
+        if key in cache:
+            cache.move_to_end(key)
+            travel_ids[key] = cache[key]
+
+    missing = [key for key in keys if key not in travel_ids]
+    if missing:
+        connection.execute(
+            _insert_ignore(connection)(Travel).on_conflict_do_nothing(),
+            [
+                {"origin": origin, "destination": destination, "departure_time": time}
+                for origin, destination, time in missing
+            ],
+        )
+        travel_key = tuple_(Travel.origin, Travel.destination, Travel.departure_time)
+        for travel_id, *key in connection.execute(
+            select(
+                Travel.id, Travel.origin, Travel.destination, Travel.departure_time
+            ).where(travel_key.in_(missing))
+        ):
+            travel_ids[tuple(key)] = travel_id
+            cache[tuple(key)] = travel_id
+
+    while len(cache) > TRAVEL_CACHE_SIZE:
+        cache.popitem(last=False)
+    return travel_ids
+
+
+def _executemany_import(connection: Connection, rows: Iterator[Row]) -> int:
+    cache: "OrderedDict[TravelKey, int]" = OrderedDict()
+    imported = 0
+    for chunk in _chunks(rows, CHUNK_SIZE):
+        travel_ids = _resolve_travel_ids(
+            connection, {(origin, dest, time) for _, origin, dest, time in chunk}, cache
+        )
+        subscriptions = {
+            (chat_id, travel_ids[(origin, dest, time)])
+            for chat_id, origin, dest, time in chunk
+        }
+        connection.execute(
+            _insert_ignore(connection)(DailySubscription).on_conflict_do_nothing(),
+            [
+                {"chat_id": chat_id, "travel_id": travel_id}
+                for chat_id, travel_id in subscriptions
+            ],
+        )
+        _refresh_subscriber_count(
+            connection, Travel.id.in_({travel_id for _, travel_id in subscriptions})
+        )
+        imported += len(chunk)
+        logger.info(f"Imported {imported} subscriptions.")
+
+    return imported
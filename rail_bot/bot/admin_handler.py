@@ -0,0 +1,117 @@
+"""Commands only available to the chats in ``ADMIN_CHAT_IDS``.
+
+These commands are not advertised in the bot's command list. Updates from
+other chats fall through to the unknown command handler.
+"""
+
+import datetime
+import logging
+import os
+
+from telegram import Update
+from telegram.ext import CallbackContext, CommandHandler, Filters
+
+from rail_bot.profiling import CPROFILE, PROFILE_DIR, PROFILE_MODES, profiler
+from rail_bot.rail_api.capture import LDB_CAPTURE_DIR, LDB_CAPTURE_SIZE, capture
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated chat ids allowed to run admin commands
+ADMIN_CHAT_IDS = [
+    int(chat_id)
+    for chat_id in os.environ.get("ADMIN_CHAT_IDS", "").split(",")
+    if chat_id.strip()
+]
+
+CAPTURE = "capture"
+PROFILE = "profile"
+
+# Longest profile, in seconds
+MAX_PROFILE_DURATION = 600
+
+
+def admin_filter():
+    return Filters.chat(chat_id=ADMIN_CHAT_IDS)
+
+
+def capture_command(update: Update, context: CallbackContext) -> None:
+    """``/capture [on [SIZE [RATE]] | off | dump]``"""
+    args = context.args or []
+    action = args[0] if args else "status"
+
+    if action == "on":
+        try:
+            size = int(args[1]) if len(args) > 1 else LDB_CAPTURE_SIZE or 100
+            sample_rate = float(args[2]) if len(args) > 2 else 1.0
+            if size <= 0 or not 0 < sample_rate <= 1:
+                raise ValueError("SIZE must be positive and RATE in (0, 1].")
+        except ValueError as e:
+            text = f"Usage: /{CAPTURE} [on [SIZE [RATE]] | off | dump]. {e}"
+        else:
+            capture.start(size, sample_rate)
+            text = f"Capturing LDB exchanges: {capture.buffer!r}."
+    elif action == "off":
+        text = f"Stopped capturing LDB exchanges: {capture.stop()!r}."
+    elif action == "dump":
+        buffer = capture.buffer
+        if buffer is None:
+            text = "LDB capture is off."
+        else:
+            directory = os.path.join(
+                LDB_CAPTURE_DIR, f"{datetime.datetime.now():%Y%m%dT%H%M%S}"
+            )
+            paths = buffer.dump(directory)
+            text = f"Wrote {len(paths)} fixtures to {os.path.abspath(directory)}."
+    else:
+        text = f"LDB capture: {capture.buffer!r}."
+
+    logger.info(f"/{CAPTURE} {' '.join(args)} in {update.message.chat_id}: {text}")
+    update.message.reply_text(text)
+
+
+def capture_handler() -> CommandHandler:
+    return CommandHandler(CAPTURE, capture_command, filters=admin_filter())
+
+
+def profile_command(update: Update, context: CallbackContext) -> None:
+    """``/profile [SECONDS [cprofile|stack [RATE]] | stop]``"""
+    args = context.args or []
+    chat_id = update.message.chat_id
+
+    if args and args[0] == "stop":
+        profiler.stop()
+        text = "Stopping the profile." if profiler.running else "No profile running."
+    elif args:
+        try:
+            duration = min(float(args[0]), MAX_PROFILE_DURATION)
+            mode = args[1] if len(args) > 1 else CPROFILE
+            sample_rate = float(args[2]) if len(args) > 2 else 1.0
+            if mode not in PROFILE_MODES:
+                raise ValueError(f"Mode must be one of {', '.join(PROFILE_MODES)}.")
+            if duration <= 0 or not 0 < sample_rate <= 1:
+                raise ValueError("SECONDS must be positive and RATE in (0, 1].")
+        except ValueError as e:
+            text = f"Usage: /{PROFILE} SECONDS [cprofile|stack [RATE]]. {e}"
+        else:
+
+            def on_done(path: str) -> None:
+                context.bot.send_message(
+                    chat_id, f"Wrote the {mode} profile to {os.path.abspath(path)}."
+                )
+
+            try:
+                profiler.start(
+                    mode, duration, PROFILE_DIR, sample_rate, on_done=on_done
+                )
+                text = f"Recording a {mode} profile for {duration:g} s."
+            except RuntimeError as e:
+                text = str(e)
+    else:
+        text = f"Profiler: {profiler.mode or 'idle'}."
+
+    logger.info(f"/{PROFILE} {' '.join(args)} in {chat_id}: {text}")
+    update.message.reply_text(text)
+
+
+def profile_handler() -> CommandHandler:
+    return CommandHandler(PROFILE, profile_command, filters=admin_filter())
@@ -0,0 +1,109 @@
+"""Admission control for the handlers run by ``ChatOrderedExecutor``.
+
+When LDB slows down, handlers block and updates queue behind them, until users
+get answers minutes late. Two mechanisms keep the bot answering in time:
+
+- updates asking for live boards have a deadline: one older than
+  ``HANDLER_DEADLINE`` seconds when its turn comes is shed, answered with a
+  cheap reply (a cached board, or "busy, try again") instead of running its
+  handler. Commands changing subscriptions are never shed: they are not urgent,
+  and the age of a message also counts the time the bot was down;
+- ``AdaptiveLimit`` bounds the handlers running at once, additive increase
+  while they finish within ``HANDLER_TARGET_SECONDS``, multiplicative decrease
+  when they do not, so a slow LDB gets fewer concurrent requests and the
+  updates wait in the queue, where the deadline applies.
+"""
+
+import datetime
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from telegram import Update
+from telegram.ext import CallbackContext
+
+from rail_bot.metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+# Seconds after which an update waiting for a handler is shed; disabled if 0
+HANDLER_DEADLINE = float(os.environ.get("HANDLER_DEADLINE", 30))
+# Handler latency above which fewer handlers run at once; fixed limit if 0
+HANDLER_TARGET_SECONDS = float(os.environ.get("HANDLER_TARGET_SECONDS", 0))
+# Handlers that can always run at once
+HANDLER_MIN_CONCURRENCY = int(os.environ.get("HANDLER_MIN_CONCURRENCY", 2))
+
+HANDLER_CONCURRENCY_LIMIT = Gauge(
+    "handler_concurrency_limit", "Handlers allowed to run at once."
+)
+
+BUSY_TEXT = "The bot is busy right now, please try again in a minute."
+
+
+def update_age(update: Update) -> float:
+    """Seconds since a new message was sent, 0 for other updates: the date of
+    a callback query's message is when the bot sent it.
+    """
+    message = update.message
+    if message is None or not isinstance(message.date, datetime.datetime):
+        return 0.0
+    return max(time.time() - message.date.timestamp(), 0.0)
+
+
+def reply_busy(update: Update, context: CallbackContext) -> None:
+    """Default reply to shed updates."""
+    if update.callback_query is not None:
+        update.callback_query.answer(BUSY_TEXT)
+    elif update.effective_chat is not None:
+        context.bot.send_message(chat_id=update.effective_chat.id, text=BUSY_TEXT)
+
+
+class AdaptiveLimit:
+    """AIMD limit of the handlers running at once."""
+
+    def __init__(
+        self,
+        max_limit: int,
+        target_seconds: float,
+        min_limit: int = HANDLER_MIN_CONCURRENCY,
+        backoff: float = 0.75,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.target_seconds = target_seconds
+        self.backoff = backoff
+        self.clock = clock
+        self._limit = float(max_limit)
+        # Handlers started before the last decrease do not decrease it again
+        self._decreased_at = float("-inf")
+        self._lock = threading.Lock()
+        HANDLER_CONCURRENCY_LIMIT.set_function(lambda: self.limit)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def on_done(self, started_at: float, running: int) -> None:
+        """Adapts the limit to a handler started at ``started_at`` that just
+        finished, with ``running`` handlers still running.
+        """
+        now = self.clock()
+        with self._lock:
+            if now - started_at > self.target_seconds:
+                if started_at < self._decreased_at:
+                    return
+                self._limit = max(self._limit * self.backoff, self.min_limit)
+                self._decreased_at = now
+                logger.info(f"Handler concurrency limit lowered to {self.limit}.")
+            # Raised only when it was reached, or it would grow without bound
+            elif running + 1 >= self.limit:
+                self._limit = min(self._limit + 1 / self._limit, self.max_limit)
+
+
+def create_adaptive_limit(max_limit: int) -> Optional[AdaptiveLimit]:
+    if HANDLER_TARGET_SECONDS <= 0:
+        return None
+    return AdaptiveLimit(max_limit, HANDLER_TARGET_SECONDS)
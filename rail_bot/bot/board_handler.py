@@ -1,13 +1,52 @@
+import datetime
 import logging
+from typing import List, Optional, Tuple
 
 from telegram import BotCommand, Update
 from telegram.ext import CallbackContext, CommandHandler
 
-from rail_bot.rail_api.api import departure_board
+from rail_bot.bot.admission import reply_busy
+from rail_bot.bot.dispatch import ChatOrderedExecutor
+from rail_bot.bot.prefetch import board_demand
+from rail_bot.bot.stations import resolve_stations
+from rail_bot.rail_api.api import cached_departure_board, departure_board
 
 logger = logging.getLogger(__name__)
 
 
+USAGE_TEXT = (
+    "To see all live departures from a station, use <code>/board ABC</code>"
+    ", where ABC is the station code.\n"
+    "To see live departures from one station to another station, use "
+    "<code>/board ABC DEF</code>, where ABC and DEF are the origin and "
+    "destination station codes."
+)
+
+
+def _board_args(args: List[str]) -> Optional[Tuple[str, Optional[str], int]]:
+    """Origin, destination and rows of a ``/board`` command, None if invalid."""
+    if len(args) == 1:
+        return args[0], None, 10
+    if len(args) == 2:
+        return args[0], args[1], 10
+    if len(args) != 3:
+        return None
+    try:
+        rows = int(args[2])
+    except ValueError:
+        return None
+    return (args[0], args[1], rows) if rows > 0 else None
+
+
+def _resolve_board_stations(
+    update: Update, origin: str, destination: Optional[str]
+) -> Optional[Tuple[str, Optional[str]]]:
+    stations = resolve_stations(update, origin, destination or origin)
+    if stations is None:
+        return None
+    return stations[0], stations[1] if destination is not None else None
+
+
 def send_departure_board(update: Update, context: CallbackContext):
     if context.args is None:
         logger.info(
@@ -23,34 +62,55 @@ def send_departure_board(update: Update, context: CallbackContext):
         )
         return
 
-    destination = None
-    rows = 10
-    if len(context.args) == 1:
-        origin = context.args[0]
-    elif len(context.args) == 2:
-        origin, destination = context.args
-    elif len(context.args) == 3:
-        origin, destination, rows = context.args
-    else:
-        text = (
-            "To see all live departures from a station, use <code>/board ABC</code>"
-            ", where ABC is the station code.\n"
-            "To see live departures from one station to another station, use "
-            "<code>/board ABC DEF</code>, where ABC and DEF are the origin and "
-            "destination station codes."
-        )
-        update.message.reply_html(text)
+    board_args = _board_args(context.args)
+    if board_args is None:
+        update.message.reply_html(USAGE_TEXT)
+        return
+    origin, destination, rows = board_args
+
+    stations = _resolve_board_stations(update, origin, destination)
+    if stations is None:
+        return
+    origin, destination = stations
+    board_demand.record_request(
+        (origin.upper(), destination and destination.upper()),
+        datetime.datetime.now(),
+    )
+
+    context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text=departure_board(origin, destination, rows),
+    )
+
+
+def send_cached_board(update: Update, context: CallbackContext):
+    """Answers a ``/board`` past its deadline with the last board fetched."""
+    if context.args is None or update.effective_chat is None:
+        reply_busy(update, context)
+        return
+    board_args = _board_args(context.args)
+    if board_args is None:
+        update.message.reply_html(USAGE_TEXT)
+        return
+    origin, destination, rows = board_args
+
+    stations = _resolve_board_stations(update, origin, destination)
+    if stations is None:
+        return
+    text = cached_departure_board(*stations, rows)
+    if text is None:
+        reply_busy(update, context)
         return
 
     context.bot.send_message(
         chat_id=update.effective_chat.id,
-        text=departure_board(origin, destination, int(rows)),
+        text=f"The bot is busy, here is the last board fetched.\n\n{text}",
     )
 
 
-def board_handler():
+def board_handler(executor: ChatOrderedExecutor):
     command = "board"
     description = "Live departures board."
-    return CommandHandler(command, send_departure_board), BotCommand(
-        command, description
-    )
+    return CommandHandler(
+        command, executor.wrap(send_departure_board, shed=send_cached_board)
+    ), BotCommand(command, description)
@@ -0,0 +1,203 @@
+"""Concurrent execution of slow handlers.
+
+The dispatcher calls handlers one update at a time, so a single ``/board``
+waiting on LDB delays every other chat. Handlers wrapped with
+``ChatOrderedExecutor.wrap`` return immediately and run on a bounded thread
+pool instead. Updates from the same chat still run one after another, in the
+order they arrived.
+
+Updates of handlers with a ``shed`` callback are answered by it instead, once
+they waited past the executor's ``deadline``; other updates, such as those
+changing subscriptions, are always handled. An ``AdaptiveLimit`` can bound the
+handlers running at once below ``max_workers`` (see ``rail_bot.bot.admission``).
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, NamedTuple, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import CallbackContext
+
+from rail_bot.bot.admission import AdaptiveLimit, update_age
+from rail_bot.metrics import Counter, Gauge, Histogram
+from rail_bot.profiling import traced
+
+logger = logging.getLogger(__name__)
+
+Callback = Callable[[Update, CallbackContext], Any]
+
+
+class Task(NamedTuple):
+    enqueued_at: float
+    # Age of the update when it was submitted
+    age: float
+    callback: Callback
+    shed: Optional[Callback]
+    update: Update
+    context: CallbackContext
+
+
+HANDLER_QUEUE_DEPTH = Gauge(
+    "handler_queue_depth", "Updates waiting for a handler worker or their chat."
+)
+HANDLER_QUEUE_SECONDS = Histogram(
+    "handler_queue_seconds", "Time updates waited for a handler worker."
+)
+HANDLER_SHED = Counter(
+    "handler_shed_total", "Updates answered without their handler, past deadline."
+)
+
+
+class QueueTimeStats:
+    """Time updates spent waiting for a worker, since the last reset."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.shed = 0
+
+    def add(self, queue_time: float) -> None:
+        self.count += 1
+        self.total += queue_time
+        self.max = max(self.max, queue_time)
+
+    def __repr__(self) -> str:
+        mean = self.total / self.count if self.count else 0.0
+        return (
+            f"{self.count} updates, mean queue time {mean * 1000:.1f} ms, "
+            f"max {self.max * 1000:.1f} ms, {self.shed} shed"
+        )
+
+
+class ChatOrderedExecutor:
+    def __init__(
+        self,
+        max_workers: int,
+        slow_queue_time: float = 1.0,
+        deadline: float = 0.0,
+        limit: Optional[AdaptiveLimit] = None,
+    ) -> None:
+        self.max_workers = max_workers
+        # Queue times above this many seconds are logged as warnings
+        self.slow_queue_time = slow_queue_time
+        # Updates older than this many seconds are shed; never if 0
+        self.deadline = deadline
+        self.limit = limit
+
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="handler")
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        # Chats with a task submitted to the pool, and their tasks waiting behind it
+        self._chats: Dict[Optional[int], Deque[Task]] = {}
+        # Tasks whose chat's turn it is, waiting for the limit
+        self._ready: Deque[Tuple[Optional[int], Task]] = deque()
+        self._running = 0
+        self._pending = 0
+        self.stats = QueueTimeStats()
+        HANDLER_QUEUE_DEPTH.set_function(lambda: self.pending)
+
+    @property
+    def pending(self) -> int:
+        """Number of updates waiting for a worker or for their chat's turn."""
+        return self._pending
+
+    def wrap(self, callback: Callback, shed: Optional[Callback] = None) -> Callback:
+        """Handler running ``callback`` on the pool, or ``shed`` if given and the
+        update waited past the deadline.
+        """
+        name = getattr(callback, "__name__", type(callback).__name__)
+        callback = traced(f"handler.{name}")(callback)
+
+        def submit(update: Update, context: CallbackContext) -> None:
+            chat_id = update.effective_chat.id if update.effective_chat else None
+            self.submit(chat_id, callback, update, context, shed)
+
+        return submit
+
+    def submit(
+        self,
+        chat_id: Optional[int],
+        callback: Callback,
+        update: Update,
+        context: CallbackContext,
+        shed: Optional[Callback] = None,
+    ) -> None:
+        task = Task(
+            time.perf_counter(), update_age(update), callback, shed, update, context
+        )
+        with self._lock:
+            self._pending += 1
+            if chat_id in self._chats:
+                self._chats[chat_id].append(task)
+                return
+            self._chats[chat_id] = deque()
+            self._ready.append((chat_id, task))
+        self._start_ready()
+
+    def _start_ready(self) -> None:
+        """Submits the ready tasks to the pool, up to the limit."""
+        with self._lock:
+            limit = self.max_workers if self.limit is None else self.limit.limit
+            started = []
+            while self._ready and self._running < limit:
+                self._running += 1
+                started.append(self._ready.popleft())
+        for chat_id, task in started:
+            self._executor.submit(self._run, chat_id, task)
+
+    def _run(self, chat_id: Optional[int], task: Task) -> None:
+        started_at = time.perf_counter()
+        queue_time = started_at - task.enqueued_at
+        update = task.update
+        with self._lock:
+            self._pending -= 1
+            self.stats.add(queue_time)
+        HANDLER_QUEUE_SECONDS.observe(queue_time)
+        if queue_time > self.slow_queue_time:
+            logger.warning(
+                f"Update {update.update_id} waited {queue_time:.2f} s for a worker."
+            )
+
+        shed = task.shed is not None and 0 < self.deadline < task.age + queue_time
+        try:
+            if shed:
+                HANDLER_SHED.inc()
+                task.shed(update, task.context)
+            else:
+                task.callback(update, task.context)
+        except Exception as e:
+            task.context.dispatcher.dispatch_error(update, e)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self.stats.shed += shed
+                if self.limit is not None and not shed:
+                    self.limit.on_done(started_at, self._running)
+                waiting = self._chats[chat_id]
+                next_task = waiting.popleft() if waiting else None
+                if next_task is None:
+                    del self._chats[chat_id]
+                    if not self._chats:
+                        self._idle.notify_all()
+                else:
+                    # Go to the back of the queue, so a busy chat cannot hog a worker
+                    self._ready.append((chat_id, next_task))
+            self._start_ready()
+
+    def log_stats(self, context: Optional[CallbackContext] = None) -> None:
+        with self._lock:
+            stats, self.stats = self.stats, QueueTimeStats()
+            pending = self._pending
+        limit = "" if self.limit is None else f", limit {self.limit.limit}"
+        logger.info(f"Handler queue: {stats!r}, {pending} pending{limit}.")
+
+    def shutdown(self, timeout: Optional[float] = None) -> None:
+        """Wait for the queued updates to be handled, then stop the workers."""
+        with self._lock:
+            self._idle.wait_for(lambda: not self._chats, timeout)
+        self._executor.shutdown(wait=True)
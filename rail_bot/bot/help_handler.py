@@ -10,7 +10,9 @@ def help(update: Update, context: CallbackContext):
         "Hey there! I am your personal rail butler. I can:\n"
         "- Tell you about live departures from a particular station:"
         "    <code>/board KGX</code>\n"
-        "  or between two stations:     <code>/board KGX CBG</code>\n\n"
+        "  or between two stations:     <code>/board KGX CBG</code>\n"
+        "  To keep a board up to date in one message, use "
+        "<code>/watch KGX</code>, and <code>/unwatch</code> to stop.\n\n"
         "- Notify you about service disruptions.\n"
         "  If you tell me which travels you would like to follow, I will "
         "notify you in case anything goes wrong with the train.\n"
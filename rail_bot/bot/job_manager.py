@@ -1,17 +1,54 @@
 import datetime
 import logging
-from typing import Optional
-
+import os
+import threading
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from apscheduler.events import (
+    EVENT_JOB_ERROR,
+    EVENT_JOB_MISSED,
+    EVENT_JOB_SUBMITTED,
+    JobEvent,
+)
 from telegram.ext import JobQueue
 from telegram.ext.callbackcontext import CallbackContext
 
+from rail_bot.bot.notifier import Notifier
+from rail_bot.darwin.store import TravelIndex
+from rail_bot.history.stats import TravelHistory
+from rail_bot.metrics import Counter, Gauge, Histogram
+from rail_bot.profiling import traced
 from rail_bot.bot.service.subscription_service import SubscriptionService
 from rail_bot.utils import shift_time
 from rail_bot.rail_api.api import next_departure_status
+from rail_bot.rail_api.timetable import Timetable
 from rail_bot.rail_api.travel import Travel
 
 logger = logging.getLogger(__name__)
 
+# How often travels without subscribers are deleted, and how many per transaction
+TRAVEL_COMPACTION_INTERVAL = int(
+    os.environ.get("TRAVEL_COMPACTION_INTERVAL", 6 * 60 * 60)
+)
+TRAVEL_COMPACTION_BATCH_SIZE = int(os.environ.get("TRAVEL_COMPACTION_BATCH_SIZE", 1000))
+# Seconds before the departure when polling of a travel starts
+FIRST_CHECK_BEFORE = int(os.environ.get("FIRST_CHECK_BEFORE", 60 * 60))
+# Seconds between polls of a travel, and of a delayed or cancelled one
+POLL_INTERVAL = int(os.environ.get("POLL_INTERVAL", 10 * 60))
+DISRUPTED_POLL_INTERVAL = int(os.environ.get("DISRUPTED_POLL_INTERVAL", 2 * 60))
+# Time of the daily refresh of the travel reliability statistics
+HISTORY_REFRESH_TIME = datetime.time(3)
+
+ACTIVE_TRAVELS = Gauge("active_travels", "Travels with at least one subscriber.")
+SCHEDULER_LAG_SECONDS = Histogram(
+    "scheduler_lag_seconds",
+    "Delay between the time a job was due and the time it was submitted.",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+SCHEDULER_JOB_EVENTS = Counter(
+    "scheduler_job_events_total", "Jobs that failed or missed their time.", ["event"]
+)
+
 
 def subscribe_travel_job_name(
     origin: str, destination: str, departure_time: datetime.time
@@ -19,10 +56,110 @@ def subscribe_travel_job_name(
     return f"{origin.lower()}-{destination.lower()}-{departure_time}"
 
 
+class PollingPolicy(NamedTuple):
+    first_check_before: int = FIRST_CHECK_BEFORE
+    interval: int = POLL_INTERVAL
+    disrupted_interval: int = DISRUPTED_POLL_INTERVAL
+
+
+# Status of the next departure from origin to destination
+DepartureStatus = Callable[[str, str], Optional[Travel]]
+# Whether this process polls the travel from origin to destination at a time
+TravelOwner = Callable[[str, str, datetime.time], bool]
+TravelKey = Tuple[str, str, datetime.time]
+
+
 class JobManager:
-    def __init__(self, job_queue: JobQueue, service: SubscriptionService):
+    def __init__(
+        self,
+        job_queue: JobQueue,
+        service: SubscriptionService,
+        notifier: Optional[Notifier] = None,
+        policy: PollingPolicy = PollingPolicy(),
+        departure_status: DepartureStatus = next_departure_status,
+        now: Callable[[], datetime.datetime] = datetime.datetime.now,
+        push_travels: Optional[TravelIndex] = None,
+        timetable: Optional[Timetable] = None,
+        history: Optional[TravelHistory] = None,
+        owns: Optional[TravelOwner] = None,
+    ):
         self.job_queue = job_queue
         self.service = service
+        self.notifier = notifier or Notifier(job_queue)
+        self.policy = policy
+        self.departure_status = departure_status
+        self.now = now
+        # Travels updated by a push feed instead of being polled
+        self.push_travels = push_travels
+        self.timetable = timetable
+        # Observed statuses are recorded, and polling adapts to their statistics
+        self.history = history
+        # Travels polled by other processes are left to them
+        self.owns = owns
+        # Travels with polling jobs, or followed through the push feed, by job name
+        self._polled: Dict[str, TravelKey] = {}
+        # Held while deciding to start or stop polling a travel, so compaction
+        # cannot stop the polling of a travel subscribed to again meanwhile
+        self._travels_lock = threading.Lock()
+
+        job_queue.scheduler.add_listener(
+            self._record_job_event,
+            EVENT_JOB_SUBMITTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED,
+        )
+
+    def _record_job_event(self, event: JobEvent) -> None:
+        if event.code == EVENT_JOB_SUBMITTED:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            for scheduled_run_time in event.scheduled_run_times:
+                lag = (now - scheduled_run_time).total_seconds()
+                SCHEDULER_LAG_SECONDS.observe(max(lag, 0.0))
+        elif event.code == EVENT_JOB_ERROR:
+            SCHEDULER_JOB_EVENTS.labels("error").inc()
+        else:
+            SCHEDULER_JOB_EVENTS.labels("missed").inc()
+
+    def schedule_metrics_refresh(self, interval: float = 60) -> None:
+        self.job_queue.run_repeating(
+            self.refresh_metrics, interval=interval, first=0, name="metrics-refresh"
+        )
+
+    def refresh_metrics(self, context: Optional[CallbackContext] = None) -> None:
+        ACTIVE_TRAVELS.set(self.service.count_travels(only_active=True))
+
+    def schedule_history_refresh(self, prune: bool = True) -> None:
+        """Refreshes the travel history every day; with several processes
+        sharing its directory, only one of them should ``prune`` it.
+        """
+        if self.history is not None:
+            history = self.history
+            self.job_queue.run_daily(
+                lambda context: history.refresh(context, prune=prune),
+                time=HISTORY_REFRESH_TIME,
+                name="history-refresh",
+            )
+
+    def policy_for(
+        self, origin: str, destination: str, departure_time: datetime.time
+    ) -> PollingPolicy:
+        """Polling of a travel, less frequent if its train is reliable, earlier
+        and more frequent if not.
+        """
+        if self.history is None:
+            return self.policy
+        reliability = self.history.reliability(origin, destination, departure_time)
+        if reliability is None:
+            return self.policy
+        if reliability.is_reliable:
+            return self.policy._replace(
+                first_check_before=self.policy.first_check_before // 2,
+                interval=self.policy.interval * 2,
+            )
+        if reliability.is_unreliable:
+            return self.policy._replace(
+                first_check_before=self.policy.first_check_before * 2,
+                interval=max(self.policy.interval // 2, self.policy.disrupted_interval),
+            )
+        return self.policy
 
     def remove_subscriptions(
         self,
@@ -48,6 +185,9 @@ class JobManager:
 
         return removed
 
+    def remove_subscription(self, chat_id: int, travel_id: int) -> int:
+        return self.service.remove_subscription(chat_id=chat_id, travel_id=travel_id)
+
     def remove_jobs_by_prefix(self, prefix: str) -> int:
         """Remove jobs with given name prefix.
         Returns the number of job that were removed.
@@ -74,6 +214,95 @@ class JobManager:
                 travel.origin, travel.destination, travel.departure_time
             )
 
+        if self.push_travels is not None:
+            polled = [
+                travel
+                for travel in travels
+                if not self.push_travels.can_follow(travel.origin, travel.destination)
+            ]
+            if polled:
+                logger.warning(
+                    f"{len(polled)} of {len(travels)} active travels are at stations "
+                    f"without a known TIPLOC, and are polled instead of followed "
+                    f"through the push feed."
+                )
+
+    def schedule_travel_compaction(self) -> None:
+        self.job_queue.run_repeating(
+            self.compact_travels,
+            interval=TRAVEL_COMPACTION_INTERVAL,
+            first=60,
+            name="travel-compaction",
+        )
+
+    def compact_travels(self, context: Optional[CallbackContext] = None) -> int:
+        """Delete travels nobody is subscribed to, together with their polling jobs.
+        Returns the number of travel rows reclaimed.
+        """
+        removed_travels = self.service.remove_orphaned_travels(
+            batch_size=TRAVEL_COMPACTION_BATCH_SIZE
+        )
+        removed_jobs = 0
+        for origin, destination, departure_time in removed_travels:
+            with self._travels_lock:
+                # Subscribed to again since it was deleted: keep polling it
+                if self.service.get_travels(
+                    origin=origin,
+                    destination=destination,
+                    departure_time=departure_time,
+                    only_active=True,
+                ):
+                    continue
+                removed_jobs += self._stop_travel(origin, destination, departure_time)
+
+        logger.info(
+            f"Travel compaction reclaimed {len(removed_travels)} travel rows "
+            f"and removed {removed_jobs} jobs."
+        )
+        return len(removed_travels)
+
+    def _stop_travel(
+        self, origin: str, destination: str, departure_time: datetime.time
+    ) -> int:
+        """Stops polling a travel. Returns the number of jobs removed."""
+        job_name = subscribe_travel_job_name(origin, destination, departure_time)
+        self._polled.pop(job_name, None)
+        if self.push_travels is not None:
+            self.push_travels.remove(origin, destination, departure_time)
+        return self.remove_jobs_by_prefix(job_name)
+
+    def schedule_travel_sync(self, interval: float) -> None:
+        self.job_queue.run_repeating(
+            self.sync_travel_jobs, interval=interval, first=interval, name="travel-sync"
+        )
+
+    def sync_travel_jobs(self, context: Optional[CallbackContext] = None) -> int:
+        """Starts polling the travels subscribed to through other processes, and
+        stops polling those without subscribers. Returns the number of changes.
+        """
+        travels = {
+            subscribe_travel_job_name(*key): key
+            for key in (
+                (travel.origin, travel.destination, travel.departure_time)
+                for travel in self.service.get_travels(only_active=True)
+            )
+            if self.owns is None or self.owns(*key)
+        }
+        with self._travels_lock:
+            started = [name for name in travels if name not in self._polled]
+            stopped = [name for name in self._polled if name not in travels]
+            for name in stopped:
+                self._stop_travel(*self._polled[name])
+            for name in started:
+                self._submit_travel_job(*travels[name])
+
+        if started or stopped:
+            logger.info(
+                f"Travel sync started polling {len(started)} travels and stopped "
+                f"{len(stopped)}."
+            )
+        return len(started) + len(stopped)
+
     def add_subscription(
         self,
         chat_id: int,
@@ -81,26 +310,29 @@ class JobManager:
         destination: str,
         departure_time: datetime.time,
     ) -> str:
-        active_travel = self.service.get_travels(
-            origin=origin,
-            destination=destination,
-            departure_time=departure_time,
-            only_active=True,
-        )
-        self.service.add_subscription(
-            chat_id=chat_id,
-            origin=origin,
-            destination=destination,
-            departure_time=departure_time,
-        )
-
-        if len(active_travel) == 0:
-            self._submit_travel_job(
+        job_name = subscribe_travel_job_name(origin, destination, departure_time)
+        with self._travels_lock:
+            active_travel = self.service.get_travels(
+                origin=origin,
+                destination=destination,
+                departure_time=departure_time,
+                only_active=True,
+            )
+            self.service.add_subscription(
+                chat_id=chat_id,
                 origin=origin,
                 destination=destination,
                 departure_time=departure_time,
             )
 
+            # Still polled if it lost its subscribers and was not compacted yet
+            if len(active_travel) == 0 and job_name not in self._polled:
+                self._submit_travel_job(
+                    origin=origin,
+                    destination=destination,
+                    departure_time=departure_time,
+                )
+
         response = (
             f"Subscribed to updates between {origin.upper()} and {destination.upper()}"
             f" at {departure_time}."
@@ -113,14 +345,37 @@ class JobManager:
         destination: str,
         departure_time: datetime.time,
     ) -> None:
-        datetime_now = datetime.datetime.now()
+        if self.owns is not None and not self.owns(origin, destination, departure_time):
+            return
+
         job_name = subscribe_travel_job_name(origin, destination, departure_time)
+        self._polled[job_name] = (origin, destination, departure_time)
+        if self.push_travels is not None and self.push_travels.can_follow(
+            origin, destination
+        ):
+            self.push_travels.add(origin, destination, departure_time)
+            logger.info(
+                f"Following {origin.upper()} - {destination.upper()} at "
+                f"{departure_time} through the push feed."
+            )
+            return
+
+        datetime_now = self.now()
 
         # The scheduled departure check is initiated some time before the departure
-        first_check_time = shift_time(departure_time, delta_hour=-1, delta_minute=0)
+        policy = self.policy_for(origin, destination, departure_time)
+        first_check_time = shift_time(
+            departure_time, delta_minute=-policy.first_check_before // 60
+        )
 
-        # only on weekdays
-        days = tuple(range(7))
+        # Only on the days the train runs, if it is in the timetable
+        days = self._running_days(origin, destination, departure_time)
+        if not days:
+            logger.info(
+                f"No train between {origin.upper()} and {destination.upper()} at "
+                f"{departure_time} runs in {self.timetable!r}, not polling it."
+            )
+            return
 
         context = (origin, destination, departure_time, None)
         self.job_queue.run_daily(
@@ -135,7 +390,10 @@ class JobManager:
             f"{destination.upper()} at {departure_time}."
         )
 
-        if first_check_time < datetime_now.time() < departure_time:
+        if (
+            first_check_time < datetime_now.time() < departure_time
+            and datetime_now.weekday() in days
+        ):
             name = job_name + f"-{datetime_now}"
             context = (origin, destination, departure_time, None)
             self.job_queue.run_once(
@@ -146,6 +404,18 @@ class JobManager:
             )
             logger.info(f"Started run once job {name} with {context!r}")
 
+    def _running_days(
+        self, origin: str, destination: str, departure_time: datetime.time
+    ) -> Tuple[int, ...]:
+        if self.timetable is not None:
+            departure = self.timetable.nearest(
+                origin, destination, departure_time, within=0
+            )
+            if departure is not None:
+                return departure.weekdays
+        return tuple(range(7))
+
+    @traced("get_travel_status")
     def get_travel_status(self, context: CallbackContext):
         """TODO: this is super awkward it depends on a ``CallbackContext``."""
         if context.job is None:
@@ -156,11 +426,11 @@ class JobManager:
 
         origin, destination, departure_time, travel_obj = context.job.context
 
-        response, rerun_in, current_travel_obj = _get_travel_status(
+        response, rerun_in, current_travel_obj = self._check_travel(
             origin, destination, departure_time, travel_obj
         )
         if rerun_in is not None:
-            current_time = datetime.datetime.now()
+            current_time = self.now()
             job_name = (
                 subscribe_travel_job_name(origin, destination, departure_time)
                 + f"-{current_time}"
@@ -175,40 +445,57 @@ class JobManager:
             logger.info(f"Started run once job {job_name} with {_context!r}")
 
         if response is not None:
-            (travel,) = self.service.get_travels(
-                origin=origin,
-                destination=destination,
-                departure_time=departure_time,
-                only_active=True,
-            )
-            subscribers = self.service.get_subscriptions(travel_id=travel.id)
-            for subscriber in subscribers:
-                context.bot.send_message(subscriber.chat_id, text=response)
-
+            self.notify_subscribers(origin, destination, departure_time, response)
 
-def _get_travel_status(
-    origin: str, destination: str, time: datetime.time, travel_obj: Travel
-):
-    response: Optional[str] = None
-    rerun_in: Optional[int] = None
-
-    current_time = datetime.datetime.now()
-    if current_time > datetime.datetime.combine(datetime.date.today(), time):
-        # Already too late
-        return None, None, None
-
-    current_travel_obj = next_departure_status(origin, destination)
+    def notify_subscribers(
+        self, origin: str, destination: str, departure_time: datetime.time, text: str
+    ) -> None:
+        travels = self.service.get_travels(
+            origin=origin,
+            destination=destination,
+            departure_time=departure_time,
+            only_active=True,
+        )
+        travel_key = subscribe_travel_job_name(origin, destination, departure_time)
+        for travel in travels:
+            for subscriber in self.service.get_subscriptions(travel_id=travel.id):
+                self.notifier.notify(subscriber.chat_id, travel_key, text)
 
-    if current_travel_obj is None:
-        response = "❗ It seems that your travel has been cancelled. ❗\n"
-        response += "I am sorry I could not find any additional information."
-    else:
-        if current_travel_obj.is_delayed or current_travel_obj.is_cancelled:
-            if current_travel_obj != travel_obj:
-                response = f"{current_travel_obj!r}"
+    def _check_travel(
+        self,
+        origin: str,
+        destination: str,
+        time: datetime.time,
+        travel_obj: Optional[Travel],
+    ) -> Tuple[Optional[str], Optional[int], Optional[Travel]]:
+        """Returns the notification to send, if any, the seconds until the next
+        check, or None to stop checking, and the current status of the travel.
+        """
+        response: Optional[str] = None
+        rerun_in: Optional[int] = None
+
+        current_time = self.now()
+        if current_time > datetime.datetime.combine(current_time.date(), time):
+            # Already too late
+            return None, None, None
+
+        current_travel_obj = self.departure_status(origin, destination)
+        if self.history is not None:
+            self.history.record(
+                origin, destination, time, current_time, current_travel_obj
+            )
 
-            rerun_in = 2 * 60  # seconds
+        policy = self.policy_for(origin, destination, time)
+        if current_travel_obj is None:
+            response = "❗ It seems that your travel has been cancelled. ❗\n"
+            response += "I am sorry I could not find any additional information."
         else:
-            rerun_in = 10 * 60  # seconds
+            if current_travel_obj.is_delayed or current_travel_obj.is_cancelled:
+                if current_travel_obj != travel_obj:
+                    response = f"{current_travel_obj!r}"
+
+                rerun_in = policy.disrupted_interval
+            else:
+                rerun_in = policy.interval
 
-    return response, rerun_in, current_travel_obj
+        return response, rerun_in, current_travel_obj
@@ -0,0 +1,173 @@
+"""Outbound travel notifications, coalesced per chat.
+
+Notifications for a chat are held for ``NOTIFICATION_WINDOW`` seconds and
+sent as one digest message, with only the latest status of every travel.
+If all travels of a digest were in the chat's previous digest, sent less than
+``DIGEST_EDIT_WINDOW`` seconds ago, that message is edited instead.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from telegram.error import BadRequest, RetryAfter, TelegramError
+from telegram.ext import CallbackContext, JobQueue
+
+from rail_bot.metrics import Counter
+from rail_bot.profiling import traced
+
+logger = logging.getLogger(__name__)
+
+# Seconds notifications for a chat are held to be sent together
+NOTIFICATION_WINDOW = float(os.environ.get("NOTIFICATION_WINDOW", 10))
+# Seconds during which a digest is edited rather than followed by a new one
+DIGEST_EDIT_WINDOW = float(os.environ.get("DIGEST_EDIT_WINDOW", 30 * 60))
+
+DIGEST_SEPARATOR = "\n\n"
+
+NOTIFICATIONS = Counter(
+    "notifications_total",
+    "Travel notifications by outcome: digests sent or edited, notifications "
+    "merged into a pending digest, and digests that failed or were retried.",
+    ["outcome"],
+)
+
+
+class Digest:
+    def __init__(self, message_id: int, texts: Dict[str, str], sent_at: float):
+        self.message_id = message_id
+        # Latest notification text of every travel in the message
+        self.texts = texts
+        self.sent_at = sent_at
+
+
+class Notifier:
+    def __init__(
+        self,
+        job_queue: JobQueue,
+        window: float = NOTIFICATION_WINDOW,
+        edit_window: float = DIGEST_EDIT_WINDOW,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.job_queue = job_queue
+        self.window = window
+        self.edit_window = edit_window
+        self.clock = clock
+
+        self.sent = 0
+        self.edited = 0
+        self.coalesced = 0
+
+        self._lock = threading.Lock()
+        # Notifications waiting for their chat's digest, by travel
+        self._pending: Dict[int, Dict[str, str]] = {}
+        self._digests: Dict[int, Digest] = {}
+
+    def notify(self, chat_id: int, travel_key: str, text: str) -> None:
+        with self._lock:
+            pending = self._pending.get(chat_id)
+            if pending is not None:
+                self.coalesced += 1
+                NOTIFICATIONS.labels("coalesced").inc()
+                pending[travel_key] = text
+                return
+            self._pending[chat_id] = {travel_key: text}
+
+        self.job_queue.run_once(
+            self.flush, when=self.window, context=chat_id, name=f"digest-{chat_id}"
+        )
+
+    @traced("notifier.flush")
+    def flush(self, context: CallbackContext) -> None:
+        chat_id: int = context.job.context
+        with self._lock:
+            texts = self._pending.pop(chat_id, {})
+            digest = self._digests.get(chat_id)
+        if not texts:
+            return
+
+        if (
+            digest is not None
+            and self.clock() - digest.sent_at < self.edit_window
+            and texts.keys() <= digest.texts.keys()
+        ):
+            if self._edit(context, chat_id, digest, texts):
+                return
+
+        try:
+            message = context.bot.send_message(
+                chat_id, text=DIGEST_SEPARATOR.join(texts.values())
+            )
+        except RetryAfter as e:
+            logger.warning(
+                f"Flood limit reached, retrying {chat_id} in {e.retry_after} s."
+            )
+            NOTIFICATIONS.labels("retried").inc()
+            self._retry(chat_id, texts, e.retry_after)
+            return
+        except TelegramError as e:
+            logger.warning(f"Could not send notifications to {chat_id}: {e!r}")
+            NOTIFICATIONS.labels("failed").inc()
+            return
+        self.sent += 1
+        NOTIFICATIONS.labels("sent").inc()
+        with self._lock:
+            self._digests[chat_id] = Digest(message.message_id, texts, self.clock())
+
+    def _retry(self, chat_id: int, texts: Dict[str, str], delay: float) -> None:
+        with self._lock:
+            pending = self._pending.get(chat_id)
+            # Notifications that came in meanwhile are newer
+            self._pending[chat_id] = {**texts, **(pending or {})}
+        if pending is None:
+            self.job_queue.run_once(
+                self.flush, when=delay, context=chat_id, name=f"digest-{chat_id}"
+            )
+
+    def _edit(
+        self,
+        context: CallbackContext,
+        chat_id: int,
+        digest: Digest,
+        texts: Dict[str, str],
+    ) -> bool:
+        """Edits ``digest`` with the new ``texts``. Returns False if a new
+        message should be sent instead.
+        """
+        merged = {**digest.texts, **texts}
+        try:
+            context.bot.edit_message_text(
+                text=DIGEST_SEPARATOR.join(merged.values()),
+                chat_id=chat_id,
+                message_id=digest.message_id,
+            )
+        except BadRequest as e:
+            if "not modified" in e.message:
+                return True
+            # Deleted or too old: send a new message instead
+            logger.info(f"Cannot edit digest in {chat_id}: {e.message}")
+            return False
+        except RetryAfter as e:
+            logger.warning(
+                f"Flood limit reached, retrying {chat_id} in {e.retry_after} s."
+            )
+            NOTIFICATIONS.labels("retried").inc()
+            self._retry(chat_id, texts, e.retry_after)
+            return True
+        except TelegramError as e:
+            logger.warning(f"Could not edit notifications in {chat_id}: {e!r}")
+            NOTIFICATIONS.labels("failed").inc()
+            return True
+
+        self.edited += 1
+        NOTIFICATIONS.labels("edited").inc()
+        digest.texts = merged
+        return True
+
+    def log_stats(self, context: Optional[CallbackContext] = None) -> None:
+        logger.info(
+            f"Notifications: {self.sent} digests sent, {self.edited} edited, "
+            f"{self.coalesced} notifications coalesced."
+        )
@@ -0,0 +1,228 @@
+"""Prefetch of the departure boards about to be in demand.
+
+Subscriptions and ``/board`` requests cluster at a few stations and times, and
+the first request for a board in a while always waits for LDB. ``DemandModel``
+learns the demand for each board by time slot of the day, separately for
+weekdays and weekends: from the ``/board`` requests, decayed every day, and
+from the active travels, each counting its subscribers for the board of its
+journey shortly before it leaves.
+
+``Prefetcher`` keeps the hottest boards of the current slot in the board
+cache, fetching them from ``PREFETCH_LEAD`` seconds before the slot starts, and
+again whenever they are about to expire, within a budget of ``PREFETCH_RATE``
+LDB requests per minute on average. Each board kept fresh costs a request every
+``BOARD_CACHE_TTL``, so the budget decides how many boards are. A prefetched
+board is counted as used if a request was served from it before it expired.
+
+In the pre-fork mode, only the first worker prefetches, and it only sees the
+``/board`` requests of its own chats: each of them stands for one request per
+worker, which assumes chats are spread evenly between the workers.
+"""
+
+import datetime
+import logging
+import os
+import threading
+from collections import Counter as CounterDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from telegram.ext import CallbackContext, JobQueue
+
+from rail_bot.bot.service.subscription_service import SubscriptionService
+from rail_bot.metrics import Counter
+from rail_bot.rail_api.api import BOARD_FETCH_ROWS, board_cache, fetch_board
+from rail_bot.rail_api.board import BoardCache, BoardKey, CachedBoard
+
+logger = logging.getLogger(__name__)
+
+# Average LDB requests per minute spent on prefetching; disabled if 0
+PREFETCH_RATE = float(os.environ.get("PREFETCH_RATE", 0))
+# Length of the time slots demand is learnt for, in minutes
+PREFETCH_SLOT_MINUTES = int(os.environ.get("PREFETCH_SLOT_MINUTES", 15))
+# Seconds before a slot, or before their expiry, boards are fetched, and between
+# prefetches; below the board cache TTL
+PREFETCH_LEAD = float(os.environ.get("PREFETCH_LEAD", 15))
+# Requests in a slot, or subscribers, for a board to be prefetched
+PREFETCH_MIN_DEMAND = float(os.environ.get("PREFETCH_MIN_DEMAND", 2))
+# Weight of the /board requests of the previous day, decayed every day
+DEMAND_DECAY = 0.8
+# Subscribers check the board of their travel in the slot before it leaves
+SUBSCRIBER_LOOKAHEAD = datetime.timedelta(minutes=15)
+
+PREFETCHED_BOARDS = Counter(
+    "prefetched_boards_total",
+    "Prefetched boards, by whether a request was served from them.",
+    ["result"],
+)
+
+# (weekend, index of the slot in the day)
+Slot = Tuple[bool, int]
+
+
+class DemandModel:
+    def __init__(
+        self, slot_minutes: int = PREFETCH_SLOT_MINUTES, request_weight: float = 1.0
+    ) -> None:
+        self.slot_minutes = slot_minutes
+        # Requests each recorded request stands for, as when a worker process
+        # only sees the requests of its share of the chats
+        self.request_weight = request_weight
+        self._requests: Dict[Slot, "CounterDict[BoardKey]"] = {}
+        self._subscribers: Dict[Slot, "CounterDict[BoardKey]"] = {}
+        self._lock = threading.Lock()
+
+    def slot(self, when: datetime.datetime) -> Slot:
+        minute = when.hour * 60 + when.minute
+        return when.weekday() >= 5, minute // self.slot_minutes
+
+    def record_request(self, key: BoardKey, when: datetime.datetime) -> None:
+        with self._lock:
+            requests = self._requests.setdefault(self.slot(when), CounterDict())
+            requests[key] += self.request_weight
+
+    def set_travels(
+        self, travels: Iterable[Tuple[str, str, datetime.time, int]]
+    ) -> None:
+        """Demand of the active travels, as (origin, destination, departure
+        time, subscribers), replacing the previous travels.
+        """
+        subscribers: Dict[Slot, "CounterDict[BoardKey]"] = {}
+        any_date = datetime.date(2000, 1, 1)
+        for origin, destination, departure_time, count in travels:
+            checked = datetime.datetime.combine(any_date, departure_time)
+            _, index = self.slot(checked - SUBSCRIBER_LOOKAHEAD)
+            key = (origin.upper(), destination.upper())
+            # Subscriptions are daily
+            for weekend in (False, True):
+                subscribers.setdefault((weekend, index), CounterDict())[key] += count
+        with self._lock:
+            self._subscribers = subscribers
+
+    def decay(self, factor: float = DEMAND_DECAY) -> None:
+        with self._lock:
+            for requests in self._requests.values():
+                for key in list(requests):
+                    requests[key] *= factor
+                    if requests[key] < 0.1:
+                        del requests[key]
+
+    def hottest(
+        self, slot: Slot, count: int, min_demand: float = PREFETCH_MIN_DEMAND
+    ) -> List[Tuple[BoardKey, float]]:
+        with self._lock:
+            demand = CounterDict(self._requests.get(slot, {}))
+            demand.update(self._subscribers.get(slot, {}))
+        return [
+            (key, value)
+            for key, value in demand.most_common(count)
+            if value >= min_demand
+        ]
+
+
+board_demand = DemandModel()
+
+
+class Prefetcher:
+    def __init__(
+        self,
+        service: SubscriptionService,
+        demand: DemandModel = board_demand,
+        cache: BoardCache = board_cache,
+        fetch: Callable[[str, Optional[str], int], object] = fetch_board,
+        rate: float = PREFETCH_RATE,
+        lead: float = PREFETCH_LEAD,
+        now: Callable[[], datetime.datetime] = datetime.datetime.now,
+    ) -> None:
+        self.service = service
+        self.demand = demand
+        self.cache = cache
+        self.fetch = fetch
+        self.rate = rate
+        self.lead = lead
+        self.now = now
+        # Boards kept fresh at once, each fetched again every cache TTL
+        self.boards = max(int(rate * cache.ttl / 60), 1)
+        # Fetches allowed by every prefetch, run every ``lead`` seconds
+        self.allowance = rate * lead / 60
+        self._tokens = float(self.boards)
+        self.prefetched = 0
+        self.used = 0
+        self._boards: List[CachedBoard] = []
+
+    def schedule(self, job_queue: JobQueue) -> None:
+        """Prefetches every ``lead`` seconds, and learns the demand of the
+        travels every day.
+        """
+        job_queue.run_repeating(
+            self.prefetch, interval=self.lead, first=self.lead, name="prefetch"
+        )
+        job_queue.run_daily(self.learn, time=datetime.time(2), name="prefetch-learn")
+        self.learn()
+
+    def learn(self, context: Optional[CallbackContext] = None) -> None:
+        self.demand.decay()
+        self.demand.set_travels(
+            (
+                travel.origin,
+                travel.destination,
+                travel.departure_time,
+                travel.subscriber_count,
+            )
+            for travel in self.service.get_travels(only_active=True)
+        )
+
+    def prefetch(self, context: Optional[CallbackContext] = None) -> int:
+        """Fetches the hottest boards of the slot in ``lead`` seconds that are
+        not cached, or expire within ``lead`` seconds, hottest first, as far as
+        the budget allows. Returns the number of boards fetched.
+        """
+        self._count_used()
+        self._tokens = min(self._tokens + self.allowance, self.boards)
+        slot = self.demand.slot(self.now() + datetime.timedelta(seconds=self.lead))
+        fetched = 0
+        for key, _ in self.demand.hottest(slot, count=self.boards):
+            if self._tokens < 1:
+                break
+            origin, destination = key
+            try:
+                cached = self.cache.prefetch(
+                    key,
+                    BOARD_FETCH_ROWS,
+                    lambda rows: self.fetch(origin, destination, rows),
+                    min_ttl=self.lead,
+                )
+            except Exception as e:
+                logger.warning(f"Could not prefetch the board {key}: {e!r}")
+                self._tokens -= 1
+                fetched += 1
+                continue
+            if cached is not None:
+                self._boards.append(cached)
+                self._tokens -= 1
+                fetched += 1
+        self.prefetched += fetched
+        if fetched:
+            logger.debug(f"Prefetched {fetched} boards for slot {slot}.")
+        return fetched
+
+    def _count_used(self) -> None:
+        """Counts the prefetched boards that expired, by whether they were used."""
+        now = self.cache.clock()
+        boards = []
+        for board in self._boards:
+            if board.expires_at > now:
+                boards.append(board)
+                continue
+            used = board.hits > 0
+            self.used += used
+            PREFETCHED_BOARDS.labels("used" if used else "unused").inc()
+        self._boards = boards
+
+    def log_stats(self, context: Optional[CallbackContext] = None) -> None:
+        self._count_used()
+        counted = self.prefetched - len(self._boards)
+        hit_rate = self.used / counted if counted else 0.0
+        logger.info(
+            f"Prefetch: {self.prefetched} boards fetched, {self.used} used "
+            f"({hit_rate:.0%} of the {counted} expired)."
+        )
@@ -0,0 +1,15 @@
+"""Bot API requests counted as spans of the callback sending them."""
+
+from typing import Any, Dict, Union
+
+from telegram.utils.request import Request
+
+from rail_bot.profiling import span
+
+
+class TracedRequest(Request):
+    def post(
+        self, url: str, data: Dict[str, Any], timeout: float = None
+    ) -> Union[Dict[str, Any], bool]:
+        with span(f"telegram.{url.rsplit('/', 1)[-1]}"):
+            return super().post(url, data, timeout=timeout)
@@ -0,0 +1,42 @@
+"""Latency and error metrics of the statements run by the subscription service."""
+
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from rail_bot.metrics import Counter, Histogram
+from rail_bot.profiling import add_span
+
+STATEMENTS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds", "Database statement latency.", ["statement"]
+)
+DB_ERRORS = Counter("db_errors_total", "Failed database statements.")
+
+
+def _statement_type(statement: str) -> str:
+    verb = statement.lstrip().split(" ", 1)[0].upper()
+    return verb if verb in STATEMENTS else "OTHER"
+
+
+def instrument_engine(engine: Engine) -> None:
+    # Statements on a connection may nest (e.g. PRAGMAs on connect)
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(connection, cursor, statement, *args) -> None:
+        connection.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(connection, cursor, statement, *args) -> None:
+        duration = time.perf_counter() - connection.info["query_start"].pop()
+        DB_QUERY_SECONDS.labels(_statement_type(statement)).observe(duration)
+        add_span("db", duration)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context) -> None:
+        DB_ERRORS.inc()
+        if context.connection is not None:
+            starts = context.connection.info.get("query_start")
+            if starts:
+                starts.pop()
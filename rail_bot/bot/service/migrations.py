@@ -0,0 +1,125 @@
+"""Schema migrations for databases created by earlier versions of the bot.
+
+``Base.metadata.create_all`` only creates missing tables, so columns and
+indexes added to existing tables are brought in here. Every migration checks
+the live schema before changing it, and all of them run on each start-up.
+"""
+
+import logging
+from typing import Callable, List
+
+from sqlalchemy import MetaData, delete, func, inspect, or_, select, text, update
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+
+def add_travel_subscriber_count(connection: Connection, metadata: MetaData) -> None:
+    columns = {column["name"] for column in inspect(connection).get_columns("travel")}
+    if "subscriber_count" in columns:
+        return
+
+    connection.execute(
+        text(
+            "ALTER TABLE travel "
+            "ADD COLUMN subscriber_count INTEGER NOT NULL DEFAULT 0"
+        )
+    )
+    connection.execute(
+        text(
+            "UPDATE travel SET subscriber_count = ("
+            "SELECT COUNT(*) FROM daily_subscription "
+            "WHERE daily_subscription.travel_id = travel.id)"
+        )
+    )
+    logger.info("Added and backfilled `travel.subscriber_count`.")
+
+
+def upper_case_station_codes(connection: Connection, metadata: MetaData) -> None:
+    """Station codes used to be stored as typed. Upper-case them, merging
+    travels that only differed in case.
+    """
+    travel = metadata.tables["travel"]
+    subscription = metadata.tables["daily_subscription"]
+    mixed_case = connection.execute(
+        select(
+            travel.c.id, travel.c.origin, travel.c.destination, travel.c.departure_time
+        )
+        .where(
+            or_(
+                travel.c.origin != func.upper(travel.c.origin),
+                travel.c.destination != func.upper(travel.c.destination),
+            )
+        )
+        .order_by(travel.c.id)
+    ).all()
+
+    for travel_id, origin, destination, departure_time in mixed_case:
+        origin, destination = origin.upper(), destination.upper()
+        canonical_id = connection.scalar(
+            select(travel.c.id).where(
+                travel.c.origin == origin,
+                travel.c.destination == destination,
+                travel.c.departure_time == departure_time,
+            )
+        )
+        if canonical_id is None:
+            connection.execute(
+                update(travel)
+                .where(travel.c.id == travel_id)
+                .values(origin=origin, destination=destination)
+            )
+            continue
+
+        # Move subscriptions over, dropping those the chat already has
+        already_subscribed = select(subscription.c.chat_id).where(
+            subscription.c.travel_id == canonical_id
+        )
+        connection.execute(
+            update(subscription)
+            .where(
+                subscription.c.travel_id == travel_id,
+                subscription.c.chat_id.not_in(already_subscribed),
+            )
+            .values(travel_id=canonical_id)
+        )
+        connection.execute(
+            delete(subscription).where(subscription.c.travel_id == travel_id)
+        )
+        connection.execute(delete(travel).where(travel.c.id == travel_id))
+        connection.execute(
+            update(travel)
+            .where(travel.c.id == canonical_id)
+            .values(
+                subscriber_count=select(func.count())
+                .select_from(subscription)
+                .where(subscription.c.travel_id == canonical_id)
+                .scalar_subquery()
+            )
+        )
+
+    if mixed_case:
+        logger.info(f"Upper-cased station codes of {len(mixed_case)} travels.")
+
+
+def create_missing_indexes(connection: Connection, metadata: MetaData) -> None:
+    inspector = inspect(connection)
+    for table in metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(connection)
+                logger.info(f"Created index {index.name} on {table.name}.")
+
+
+MIGRATIONS: List[Callable[[Connection, MetaData], None]] = [
+    add_travel_subscriber_count,
+    upper_case_station_codes,
+    create_missing_indexes,
+]
+
+
+def run_migrations(engine: Engine, metadata: MetaData) -> None:
+    with engine.begin() as connection:
+        for migration in MIGRATIONS:
+            migration(connection, metadata)
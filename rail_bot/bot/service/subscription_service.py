@@ -1,12 +1,32 @@
+import functools
 import os
 from datetime import time
-from typing import List, Optional
-
-from sqlalchemy import Column, ForeignKey, Integer, String, Time, create_engine
-from sqlalchemy.orm import sessionmaker
+from typing import List, Optional, Tuple
+
+from sqlalchemy import (
+    Column,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Time,
+    create_engine,
+    exists,
+)
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.orm.decl_api import declarative_base
 from sqlalchemy.sql.schema import UniqueConstraint
 
+from rail_bot.bot.service.metrics import instrument_engine
+from rail_bot.bot.service.migrations import run_migrations
+from rail_bot.bot.service.sqlite import (
+    SingleWriterQueue,
+    configure_sqlite,
+    is_sqlite,
+    sqlite_engine_options,
+)
+
 Base = declarative_base()
 
 
@@ -17,14 +37,28 @@ class Travel(Base):
     origin = Column(String(3))
     destination = Column(String(3))
     departure_time = Column(Time)
-
-    __table_args__ = (UniqueConstraint("origin", "destination", "departure_time"),)
+    # Denormalised number of `DailySubscription` rows pointing at this travel.
+    # Maintained in the same transaction as the subscriptions themselves, so
+    # "active" travels can be found without joining `daily_subscription`.
+    subscriber_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        UniqueConstraint("origin", "destination", "departure_time"),
+        # Partial index: only active travels are indexed
+        Index(
+            "ix_travel_active",
+            "subscriber_count",
+            postgresql_where=subscriber_count > 0,
+            sqlite_where=subscriber_count > 0,
+        ),
+    )
 
     def __repr__(self):
         return (
             f"Travel(id={self.id}, "
             f"origin={self.origin!r}, destination={self.destination!r}, "
-            f"departure_time={self.departure_time!r})"
+            f"departure_time={self.departure_time!r}, "
+            f"subscriber_count={self.subscriber_count})"
         )
 
 
@@ -33,7 +67,7 @@ class DailySubscription(Base):
 
     id = Column(Integer, primary_key=True)
     chat_id = Column(Integer, index=True)
-    travel_id = Column(Integer, ForeignKey("travel.id"), nullable=False)
+    travel_id = Column(Integer, ForeignKey("travel.id"), nullable=False, index=True)
 
     __table_args__ = (UniqueConstraint("chat_id", "travel_id"),)
 
@@ -44,21 +78,72 @@ class DailySubscription(Base):
         )
 
 
-class SubscriptionService:
-    def __init__(self, database_url):
-        self.engine = create_engine(database_url)
-        Base.metadata.create_all(self.engine)
+def serialized_write(method):
+    """Run the decorated service method on the single writer, if there is one."""
+
+    @functools.wraps(method)
+    def wrapper(self: "SubscriptionService", *args, **kwargs):
+        if self.writer is None:
+            return method(self, *args, **kwargs)
+        return self.writer.run(method, self, *args, **kwargs)
+
+    return wrapper
+
+
+def in_transaction(method):
+    """Run the decorated service method in a transaction of its own, committed
+    if it returns, and give the thread's connection back to the pool after it.
+    """
 
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
+    @functools.wraps(method)
+    def wrapper(self: "SubscriptionService", *args, **kwargs):
+        try:
+            result = method(self, *args, **kwargs)
+            self.session.commit()
+            return result
+        except BaseException:
+            self.session.rollback()
+            raise
+        finally:
+            self.session.remove()
+
+    return wrapper
+
+
+class SubscriptionService:
+    def __init__(self, database_url, migrate: bool = True):
+        url = make_url(database_url)
+        self.writer: Optional[SingleWriterQueue] = None
+        if is_sqlite(url):
+            self.engine = create_engine(url, **sqlite_engine_options(url))
+            configure_sqlite(self.engine)
+            self.writer = SingleWriterQueue()
+        else:
+            self.engine = create_engine(url)
+        instrument_engine(self.engine)
+
+        # Skipped by the processes forked after the schema was brought up to date
+        if migrate:
+            Base.metadata.create_all(self.engine)
+            run_migrations(self.engine, Base.metadata)
+
+        # One session per thread: handlers and jobs run on different threads.
+        # Every method ends it, so the objects returned outlive it, detached
+        self.session = scoped_session(
+            sessionmaker(bind=self.engine, expire_on_commit=False)
+        )
 
     def shutdown(self):
+        if self.writer is not None:
+            self.writer.shutdown()
+        self.session.remove()
         self.engine.dispose()
 
     def _daily_subscription_query(
         self, chat_id: Optional[int] = None, travel_id: Optional[int] = None
     ):
-        subscriptions = self.session.query(DailySubscription)
+        # Rows may have been changed by another thread's session
+        subscriptions = self.session.query(DailySubscription).populate_existing()
 
         if chat_id is not None:
             subscriptions = subscriptions.filter_by(chat_id=chat_id)
@@ -67,10 +152,12 @@ class SubscriptionService:
 
         return subscriptions
 
+    @serialized_write
+    @in_transaction
     def add_subscription(
         self, chat_id: int, origin: str, destination: str, departure_time: time
     ):
-        travel = self.add_travel(origin, destination, departure_time)
+        travel = self._add_travel(origin, destination, departure_time)
 
         subscriptions = DailySubscription(chat_id=chat_id, travel_id=travel.id)
         existing_subscriptions = self._daily_subscription_query(
@@ -78,9 +165,12 @@ class SubscriptionService:
         ).first()
         if not existing_subscriptions:
             self.session.add(subscriptions)
+            self._update_subscriber_count([travel.id], 1)
 
         self.session.commit()
 
+    @serialized_write
+    @in_transaction
     def remove_subscriptions(
         self,
         chat_id: int,
@@ -97,11 +187,50 @@ class SubscriptionService:
         # Cannot use JOIN here because of SQLAlchemy restrictions. Use in_ instead
         delete_query = delete_query.filter(DailySubscription.travel_id.in_(query))
 
-        deleted = delete_query.delete(synchronize_session=False)
+        # Lock the rows first, so that the subscriber counts are decremented for
+        # exactly the subscriptions this transaction deletes
+        rows = (
+            delete_query.with_entities(
+                DailySubscription.id, DailySubscription.travel_id
+            )
+            .with_for_update()
+            .all()
+        )
+        if len(rows) == 0:
+            self.session.commit()
+            return 0
+
+        deleted = (
+            self._daily_subscription_query()
+            .filter(DailySubscription.id.in_([row.id for row in rows]))
+            .delete(synchronize_session=False)
+        )
+        # A chat has at most one subscription per travel
+        self._update_subscriber_count([row.travel_id for row in rows], -1)
+        self.session.commit()
+
+        return deleted
+
+    @serialized_write
+    @in_transaction
+    def remove_subscription(self, chat_id: int, travel_id: int) -> int:
+        """Remove the subscription of a chat to a travel given by its id."""
+        deleted = self._daily_subscription_query(
+            chat_id=chat_id, travel_id=travel_id
+        ).delete(synchronize_session=False)
+        if deleted:
+            self._update_subscriber_count([travel_id], -1)
         self.session.commit()
 
         return deleted
 
+    def _update_subscriber_count(self, travel_ids: List[int], delta: int) -> None:
+        self.session.query(Travel).filter(Travel.id.in_(travel_ids)).update(
+            {Travel.subscriber_count: Travel.subscriber_count + delta},
+            synchronize_session=False,
+        )
+
+    @in_transaction
     def get_subscriptions(
         self, chat_id: Optional[int] = None, travel_id: Optional[int] = None
     ) -> List[DailySubscription]:
@@ -119,7 +248,7 @@ class SubscriptionService:
         departure_time: Optional[time] = None,
         only_active: bool = False,
     ):
-        travel_query = self.session.query(Travel)
+        travel_query = self.session.query(Travel).populate_existing()
 
         for filter_key, filter_value in {
             "id": travel_id,
@@ -131,14 +260,27 @@ class SubscriptionService:
                 travel_query = travel_query.filter_by(**{filter_key: filter_value})
 
         if only_active:
-            travel_query = travel_query.join(DailySubscription).group_by(Travel.id)
+            travel_query = travel_query.filter(Travel.subscriber_count > 0)
 
         return travel_query
 
+    @serialized_write
+    @in_transaction
     def add_travel(self, origin: str, destination: str, departure_time: time) -> Travel:
-        travel = self._travel_query(
-            origin=origin, destination=destination, departure_time=departure_time
-        ).first()
+        return self._add_travel(origin, destination, departure_time)
+
+    def _add_travel(
+        self, origin: str, destination: str, departure_time: time
+    ) -> Travel:
+        # Lock the travel until the subscription is committed, so that
+        # `remove_orphaned_travels` cannot delete it in the meantime
+        travel = (
+            self._travel_query(
+                origin=origin, destination=destination, departure_time=departure_time
+            )
+            .with_for_update()
+            .first()
+        )
 
         if not travel:
             travel = Travel(
@@ -151,6 +293,7 @@ class SubscriptionService:
 
         return travel
 
+    @in_transaction
     def get_travels(
         self,
         *,
@@ -171,10 +314,71 @@ class SubscriptionService:
         travels = travels.all()
         return travels
 
+    @in_transaction
+    def count_travels(self, only_active: bool = False) -> int:
+        return self._travel_query(only_active=only_active).count()
+
+    @serialized_write
+    @in_transaction
+    def remove_orphaned_travels(
+        self, batch_size: int = 1000
+    ) -> List[Tuple[str, str, time]]:
+        """Delete travels without subscribers, ``batch_size`` rows per transaction.
+        Returns the (origin, destination, departure_time) of the deleted travels.
+        """
+        removed: List[Tuple[str, str, time]] = []
+        while True:
+            # Travels locked by a concurrent `add_travel` are being re-subscribed
+            orphans = (
+                self.session.query(
+                    Travel.id, Travel.origin, Travel.destination, Travel.departure_time
+                )
+                .filter(Travel.subscriber_count == 0)
+                .order_by(Travel.id)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            if len(orphans) == 0:
+                self.session.commit()
+                break
+
+            deleted = (
+                self.session.query(Travel)
+                .filter(
+                    Travel.id.in_([orphan.id for orphan in orphans]),
+                    Travel.subscriber_count == 0,
+                    ~exists().where(DailySubscription.travel_id == Travel.id),
+                )
+                .delete(synchronize_session=False)
+            )
+            survivors = set()
+            if deleted != len(orphans):
+                survivors = {
+                    travel_id
+                    for (travel_id,) in self.session.query(Travel.id).filter(
+                        Travel.id.in_([orphan.id for orphan in orphans])
+                    )
+                }
+            self.session.commit()
+
+            removed.extend(
+                (orphan.origin, orphan.destination, orphan.departure_time)
+                for orphan in orphans
+                if orphan.id not in survivors
+            )
+            if deleted == 0 or len(orphans) < batch_size:
+                break
+
+        return removed
+
 
 def get_db_url() -> str:
     url = os.environ.get("DATABASE_URL", None)
-    if url is None:
+    sqlite_path = os.environ.get("SQLITE_PATH", None)
+    if url is None and sqlite_path is not None:
+        url = f"sqlite:///{sqlite_path}"
+    elif url is None:
         db_user = os.environ["DB_USER"]
         db_password = os.environ["DB_PASSWORD"]
         db_host = os.environ["DB_HOST"]
@@ -187,7 +391,7 @@ def get_db_url() -> str:
     return url
 
 
-def create_subscription_service() -> SubscriptionService:
+def create_subscription_service(migrate: bool = True) -> SubscriptionService:
     url = get_db_url()
-    service = SubscriptionService(url)
+    service = SubscriptionService(url, migrate=migrate)
     return service
@@ -0,0 +1,100 @@
+import datetime
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+
+from rail_bot.bot.service.migrations import upper_case_station_codes
+from rail_bot.bot.service.subscription_service import Base, SubscriptionService
+
+
+class TestSQLiteSubscriptionService(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, "subscriptions.db")
+        self.service = SubscriptionService(database_url=f"sqlite:///{path}")
+
+    def tearDown(self) -> None:
+        self.service.shutdown()
+        self.directory.cleanup()
+
+    def test_pragmas(self):
+        with self.service.engine.connect() as connection:
+            journal_mode = connection.execute(text("PRAGMA journal_mode")).scalar()
+            synchronous = connection.execute(text("PRAGMA synchronous")).scalar()
+
+        self.assertEqual(journal_mode, "wal")
+        # NORMAL
+        self.assertEqual(synchronous, 1)
+
+    def test_concurrent_writes(self):
+        def subscribe_unsubscribe(chat_id: int):
+            for minute in range(20):
+                departure_time = datetime.time(12, minute)
+                self.service.add_subscription(chat_id, "aaa", "bbb", departure_time)
+                self.service.get_travels(only_active=True)
+                if minute % 2 == 0:
+                    self.service.remove_subscriptions(
+                        chat_id, "aaa", "bbb", departure_time
+                    )
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            # Re-raises any `database is locked` error
+            list(executor.map(subscribe_unsubscribe, range(16)))
+
+        travels = self.service.get_travels(only_active=True)
+        self.assertEqual(len(travels), 10)
+        self.assertTrue(all(travel.subscriber_count == 16 for travel in travels))
+        self.assertEqual(len(self.service.get_subscriptions()), 160)
+
+    def test_connections_are_returned_to_the_pool(self):
+        self.service.add_subscription(1, "aaa", "bbb", datetime.time(12, 0))
+        pool = self.service.engine.pool
+
+        # More threads than the pool has connections, each keeping its session
+        with ThreadPoolExecutor(max_workers=18) as executor:
+            reads = [
+                executor.submit(self.service.get_travels, only_active=True)
+                for _ in range(18)
+            ]
+            reads += [executor.submit(self.service.get_subscriptions, chat_id=1)]
+            reads += [executor.submit(self.service.count_travels)]
+            results = [read.result(timeout=10) for read in reads]
+            checked_out = pool.checkedout()
+
+        self.assertEqual(checked_out, 0)
+        self.assertEqual(results[0][0].origin, "aaa")
+        self.assertEqual(results[-1], 1)
+
+    def test_in_memory_database_is_shared_between_threads(self):
+        service = SubscriptionService(database_url="sqlite://")
+        service.add_subscription(1, "aaa", "bbb", datetime.time(12, 0))
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            travels = executor.submit(service.get_travels).result()
+
+        self.assertEqual(len(travels), 1)
+        service.shutdown()
+
+    def test_upper_case_station_codes(self):
+        departure_time = datetime.time(12, 0)
+        self.service.add_subscription(1, "KGX", "CBG", departure_time)
+        self.service.add_subscription(1, "kgx", "cbg", departure_time)
+        self.service.add_subscription(2, "kgx", "cbg", departure_time)
+        self.service.add_subscription(3, "ely", "cbg", departure_time)
+
+        with self.service.engine.begin() as connection:
+            upper_case_station_codes(connection, Base.metadata)
+
+        travels = {
+            (travel.origin, travel.destination): travel.subscriber_count
+            for travel in self.service.get_travels()
+        }
+        self.assertEqual(travels, {("KGX", "CBG"): 2, ("ELY", "CBG"): 1})
+        self.assertEqual(len(self.service.get_subscriptions()), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -228,6 +228,90 @@ class TestSubscriptionService(unittest.TestCase):
         travels = self.service.get_travels(only_active=True)
         self.assertEqual(len(travels), 0)
 
+    def test_subscriber_count(self):
+        # Given
+        for chat_id in (1, 2):
+            self.service.add_subscription(
+                chat_id=chat_id,
+                origin="aaa",
+                destination="bbb",
+                departure_time=datetime.time(11, 12, 28),
+            )
+        # Same subscription added twice
+        self.service.add_subscription(
+            chat_id=2,
+            origin="aaa",
+            destination="bbb",
+            departure_time=datetime.time(11, 12, 28),
+        )
+
+        # Then
+        (travel,) = self.service.get_travels(only_active=True)
+        self.assertEqual(travel.subscriber_count, 2)
+
+        # When
+        removed = self.service.remove_subscriptions(chat_id=1)
+
+        # Then
+        self.assertEqual(removed, 1)
+        (travel,) = self.service.get_travels(only_active=True)
+        self.assertEqual(travel.subscriber_count, 1)
+
+        # When
+        self.service.remove_subscriptions(chat_id=2)
+
+        # Then
+        self.assertEqual(len(self.service.get_travels(only_active=True)), 0)
+        (travel,) = self.service.get_travels()
+        self.assertEqual(travel.subscriber_count, 0)
+
+    def test_remove_orphaned_travels(self):
+        # Given
+        for chat_id, origin in ((1, "aaa"), (1, "ccc"), (2, "eee")):
+            self.service.add_subscription(
+                chat_id=chat_id,
+                origin=origin,
+                destination="bbb",
+                departure_time=datetime.time(11, 12, 28),
+            )
+        self.service.remove_subscriptions(chat_id=1)
+
+        # When
+        removed = self.service.remove_orphaned_travels(batch_size=1)
+
+        # Then
+        self.assertEqual(
+            sorted(removed),
+            [
+                ("aaa", "bbb", datetime.time(11, 12, 28)),
+                ("ccc", "bbb", datetime.time(11, 12, 28)),
+            ],
+        )
+        (travel,) = self.service.get_travels()
+        self.assertEqual(travel.origin, "eee")
+        self.assertEqual(self.service.remove_orphaned_travels(), [])
+
+    def test_remove_subscription_by_travel_id(self):
+        # Given
+        for chat_id in (1, 2):
+            self.service.add_subscription(
+                chat_id=chat_id,
+                origin="aaa",
+                destination="bbb",
+                departure_time=datetime.time(11, 12, 28),
+            )
+        (travel,) = self.service.get_travels()
+
+        # When
+        removed = self.service.remove_subscription(chat_id=1, travel_id=travel.id)
+
+        # Then
+        self.assertEqual(removed, 1)
+        self.assertEqual(self.service.remove_subscription(1, travel.id), 0)
+        self.assertEqual(len(self.service.get_subscriptions(chat_id=1)), 0)
+        (travel,) = self.service.get_travels()
+        self.assertEqual(travel.subscriber_count, 1)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,321 @@
+"""Discrete-event simulation of the bot's scheduled jobs on a virtual clock.
+
+``SimulatedJobQueue`` stands in for the ``JobQueue``: jobs run in the order
+they are due on ``workers`` modeled worker threads, and the ``VirtualClock``
+jumps from one job to the next, so a day of polling replays in seconds. A job
+keeps its worker busy for the virtual seconds it ``spend``s (e.g. the LDB
+latency), which delays the jobs behind it while all workers are busy.
+
+``ScriptedDepartures`` replaces the LDB call of ``JobManager``: it reports the
+next subscribed departure of a pair, delayed or cancelled by the scripted
+``Disruption``s it falls in.
+"""
+
+import bisect
+import datetime
+import heapq
+import itertools
+import logging
+import zlib
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from rail_bot.rail_api.travel import CANCELLED_LABEL, Travel, TravelDisruptionInfo
+from rail_bot.utils import shift_time
+
+logger = logging.getLogger(__name__)
+
+# Default number of worker threads of the job queue's scheduler
+SCHEDULER_WORKERS = 10
+
+
+class VirtualClock:
+    def __init__(self, start: datetime.datetime) -> None:
+        self.start = start
+        self._now = start
+        # Virtual seconds spent by the running job
+        self.spent = 0.0
+
+    def now(self) -> datetime.datetime:
+        return self._now
+
+    def monotonic(self) -> float:
+        return (self._now - self.start).total_seconds()
+
+    def set(self, now: datetime.datetime) -> None:
+        self._now = now
+
+    def spend(self, seconds: float) -> None:
+        self.spent += seconds
+
+
+class SimulatedJob:
+    def __init__(
+        self,
+        callback: Callable,
+        name: Optional[str],
+        context: Any,
+        interval: Optional[datetime.timedelta] = None,
+        daily: Optional[Tuple[datetime.time, Sequence[int]]] = None,
+    ) -> None:
+        self.callback = callback
+        self.name = name
+        self.context = context
+        self.interval = interval
+        # (time, weekdays) of daily jobs
+        self.daily = daily
+        self.removed = False
+        self.enabled = True
+        self.next_t: Optional[datetime.datetime] = None
+
+    def schedule_removal(self) -> None:
+        self.removed = True
+
+    def __repr__(self) -> str:
+        return f"SimulatedJob(name={self.name!r}, next_t={self.next_t})"
+
+
+def _next_daily(
+    after: datetime.datetime, time: datetime.time, days: Sequence[int]
+) -> Optional[datetime.datetime]:
+    for day in range(8):
+        candidate = datetime.datetime.combine(
+            after.date() + datetime.timedelta(days=day), time
+        )
+        if candidate > after and candidate.weekday() in days:
+            return candidate
+    return None
+
+
+class CountingBot:
+    """Accepts the messages of the notifier and counts them."""
+
+    def __init__(self) -> None:
+        self.sent = 0
+        self.edited = 0
+        self._message_ids = itertools.count(1)
+
+    def send_message(self, chat_id: int, text: str, **kwargs) -> SimpleNamespace:
+        self.sent += 1
+        return SimpleNamespace(message_id=next(self._message_ids), chat_id=chat_id)
+
+    def edit_message_text(self, text: str, chat_id: int, message_id: int, **kwargs):
+        self.edited += 1
+        return SimpleNamespace(message_id=message_id, chat_id=chat_id)
+
+
+class SimulatedJobQueue:
+    """The subset of ``JobQueue`` used by ``JobManager`` and ``Notifier``."""
+
+    def __init__(
+        self, clock: VirtualClock, bot: Any, workers: int = SCHEDULER_WORKERS
+    ) -> None:
+        self.clock = clock
+        self.bot = bot
+        self.workers = workers
+        # Stands in for the APScheduler scheduler, whose events are not simulated
+        self.scheduler = self
+
+        self.runs: Dict[str, int] = Counter()
+        self.errors = 0
+        # Seconds between the time a job was due and the time it started
+        self.lags: List[float] = []
+        self.peak_concurrency = 0
+
+        self._queue: List[Tuple[datetime.datetime, int, SimulatedJob]] = []
+        self._sequence = itertools.count()
+        # Virtual time at which each worker finishes its job
+        self._free_at = [clock.now()] * workers
+
+    def add_listener(self, callback: Callable, mask: int = 0) -> None:
+        pass
+
+    def _schedule(self, job: SimulatedJob, due: datetime.datetime) -> SimulatedJob:
+        job.next_t = due
+        heapq.heappush(self._queue, (due, next(self._sequence), job))
+        return job
+
+    def _when(self, when: Any) -> datetime.datetime:
+        now = self.clock.now()
+        if isinstance(when, (int, float)):
+            return now + datetime.timedelta(seconds=when)
+        if isinstance(when, datetime.timedelta):
+            return now + when
+        # A datetime
+        return when
+
+    def run_once(
+        self, callback: Callable, when: Any, context: Any = None, name: str = None
+    ) -> SimulatedJob:
+        job = SimulatedJob(callback, name, context)
+        return self._schedule(job, self._when(when))
+
+    def run_repeating(
+        self,
+        callback: Callable,
+        interval: Any,
+        first: Any = None,
+        context: Any = None,
+        name: str = None,
+    ) -> SimulatedJob:
+        if not isinstance(interval, datetime.timedelta):
+            interval = datetime.timedelta(seconds=interval)
+        job = SimulatedJob(callback, name, context, interval=interval)
+        return self._schedule(job, self._when(interval if first is None else first))
+
+    def run_daily(
+        self,
+        callback: Callable,
+        time: datetime.time,
+        days: Sequence[int] = tuple(range(7)),
+        context: Any = None,
+        name: str = None,
+    ) -> SimulatedJob:
+        job = SimulatedJob(callback, name, context, daily=(time, days))
+        return self._schedule(job, _next_daily(self.clock.now(), time, days))
+
+    def jobs(self) -> Tuple[SimulatedJob, ...]:
+        return tuple(job for _, _, job in sorted(self._queue) if not job.removed)
+
+    def get_jobs_by_name(self, name: str) -> Tuple[SimulatedJob, ...]:
+        return tuple(job for job in self.jobs() if job.name == name)
+
+    def run_until(self, end: datetime.datetime) -> None:
+        """Run the jobs due before ``end``, then leave the clock at ``end``."""
+        while self._queue and self._queue[0][0] <= end:
+            due, _, job = heapq.heappop(self._queue)
+            if job.removed:
+                continue
+
+            free_at = heapq.heappop(self._free_at)
+            start = max(due, free_at)
+            running = 1 + sum(1 for busy_until in self._free_at if busy_until > start)
+            self.peak_concurrency = max(self.peak_concurrency, running)
+            self.lags.append((start - due).total_seconds())
+
+            self.clock.set(start)
+            self.clock.spent = 0.0
+            self._run(job)
+            heapq.heappush(
+                self._free_at, start + datetime.timedelta(seconds=self.clock.spent)
+            )
+
+            if job.removed:
+                continue
+            if job.interval is not None:
+                self._schedule(job, due + job.interval)
+            elif job.daily is not None:
+                self._schedule(job, _next_daily(due, *job.daily))
+
+        self.clock.set(max(end, self.clock.now()))
+
+    def _run(self, job: SimulatedJob) -> None:
+        name = getattr(job.callback, "__name__", repr(job.callback))
+        self.runs[name] += 1
+        context = SimpleNamespace(job=job, bot=self.bot, job_queue=self)
+        try:
+            job.callback(context)
+        except Exception as e:
+            self.errors += 1
+            logger.exception(f"Job {job.name} failed: {e!r}")
+
+
+class Disruption(NamedTuple):
+    """Departures between ``start`` and ``end`` are delayed by ``delay`` minutes,
+    or cancelled. ``share`` is the fraction of the matching departures affected.
+    """
+
+    start: datetime.time
+    end: datetime.time
+    delay: int = 0
+    cancelled: bool = False
+    origin: Optional[str] = None
+    destination: Optional[str] = None
+    share: float = 1.0
+    reason: str = "This train has been delayed by a signalling problem"
+
+    def affects(self, origin: str, destination: str, departure: datetime.time) -> bool:
+        if self.origin is not None and self.origin.lower() != origin.lower():
+            return False
+        if (
+            self.destination is not None
+            and self.destination.lower() != destination.lower()
+        ):
+            return False
+        if not self.start <= departure < self.end:
+            return False
+        if self.share >= 1.0:
+            return True
+        key = f"{origin}-{destination}-{departure}".lower().encode()
+        return zlib.crc32(key) / 2**32 < self.share
+
+
+class ScriptedDepartures:
+    """A ``DepartureStatus`` replaying ``timeline``, spending ``latency`` virtual
+    seconds per call.
+    """
+
+    def __init__(
+        self,
+        clock: VirtualClock,
+        departures: Sequence[Tuple[str, str, datetime.time]],
+        timeline: Sequence[Disruption] = (),
+        latency: float = 0.0,
+        journey_minutes: int = 45,
+    ) -> None:
+        self.clock = clock
+        self.timeline = timeline
+        self.latency = latency
+        self.journey_minutes = journey_minutes
+        self.calls = 0
+
+        self._departures: Dict[Tuple[str, str], List[datetime.time]] = {}
+        for origin, destination, departure in departures:
+            key = (origin.lower(), destination.lower())
+            self._departures.setdefault(key, []).append(departure)
+        for times in self._departures.values():
+            times.sort()
+
+    def __call__(
+        self, origin: str, destination: str, timeOffset: int = 0
+    ) -> Optional[Travel]:
+        self.calls += 1
+        self.clock.spend(self.latency)
+
+        times = self._departures.get((origin.lower(), destination.lower()))
+        if not times:
+            return None
+        index = bisect.bisect_left(times, self.clock.now().time())
+        scheduled = times[index % len(times)]
+
+        disruption = next(
+            (d for d in self.timeline if d.affects(origin, destination, scheduled)),
+            None,
+        )
+        delayed = disruption is not None and not disruption.cancelled
+        cancelled = disruption is not None and disruption.cancelled
+        reason = None if disruption is None else disruption.reason
+
+        scheduled_arrival = shift_time(scheduled, delta_minute=self.journey_minutes)
+        if cancelled:
+            estimated_departure = estimated_arrival = CANCELLED_LABEL
+        elif delayed:
+            estimated_departure = shift_time(scheduled, delta_minute=disruption.delay)
+            estimated_arrival = shift_time(
+                scheduled_arrival, delta_minute=disruption.delay
+            )
+        else:
+            estimated_departure, estimated_arrival = scheduled, scheduled_arrival
+
+        return Travel(
+            origin=origin.upper(),
+            destination=destination.upper(),
+            scheduled_departure=scheduled,
+            estimated_departure=estimated_departure,
+            scheduled_arrival=scheduled_arrival,
+            estimated_arrival=estimated_arrival,
+            service_type="train",
+            delay_info=TravelDisruptionInfo("DELAY", reason, delayed),
+            cancel_info=TravelDisruptionInfo("CANCEL", reason, cancelled),
+        )
@@ -0,0 +1,52 @@
+import html
+import logging
+from typing import List, Optional
+
+from telegram import Update
+
+from rail_bot.rail_api.api import station_exists
+from rail_bot.rail_api.stations import UnknownStationError, get_station_index
+
+logger = logging.getLogger(__name__)
+
+
+def unknown_station_text(error: UnknownStationError) -> str:
+    text = f"I do not know the station <code>{html.escape(error.query)}</code>."
+    if error.suggestions:
+        text += " Did you mean:" + "".join(
+            f"\n- <code>{station.crs}</code> {html.escape(station.name)}"
+            for station in error.suggestions
+        )
+    return text
+
+
+def resolve_stations(
+    update: Update, *queries: str, verify: bool = False
+) -> Optional[List[str]]:
+    """CRS codes of the stations in ``queries``, given as codes or names.
+    Replies with suggestions and returns None if one of them is unknown.
+
+    With ``verify``, codes missing from an incomplete station table are checked
+    with LDB, so that they are not stored before they are known to exist.
+    """
+    index = get_station_index()
+    try:
+        stations = [index.resolve(query) for query in queries]
+        for query, crs in zip(queries, stations):
+            if not verify or index.get(crs) is not None:
+                continue
+            try:
+                exists = station_exists(crs)
+            except Exception as e:
+                logger.warning(f"Could not check the station {crs} with LDB: {e!r}")
+                update.message.reply_html(
+                    f"I could not check the station <code>{html.escape(crs)}</code>"
+                    f" right now, please try again in a minute."
+                )
+                return None
+            if not exists:
+                raise UnknownStationError(query, index.search(query))
+        return stations
+    except UnknownStationError as e:
+        update.message.reply_html(unknown_station_text(e))
+        return None
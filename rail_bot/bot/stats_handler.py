@@ -0,0 +1,75 @@
+import logging
+import math
+
+from telegram import BotCommand, Update
+from telegram.ext import CallbackContext, CommandHandler
+
+from rail_bot.bot.dispatch import ChatOrderedExecutor
+from rail_bot.bot.stations import resolve_stations
+from rail_bot.bot.subscription.common import SUBSCRIBE
+from rail_bot.history.stats import Reliability, TravelHistory
+from rail_bot.utils import format_time, parse_time
+
+logger = logging.getLogger(__name__)
+
+STATS = "stats"
+
+
+def _minutes(value: float) -> str:
+    return "unknown" if math.isnan(value) else f"{max(value, 0):.0f} min"
+
+
+def reliability_text(title: str, reliability: Reliability) -> str:
+    return (
+        f"<b>{title}</b>, over the last {reliability.days} days it ran:\n"
+        f"- On time: {reliability.on_time_rate:.0%}\n"
+        f"- Cancelled: {reliability.cancelled_rate:.0%}\n"
+        f"- Delay: {_minutes(reliability.median_delay)} on a typical day, "
+        f"{_minutes(reliability.p90_delay)} on 9 days out of 10, "
+        f"{_minutes(reliability.max_delay)} at worst"
+    )
+
+
+class StatsController:
+    def __init__(self, history: TravelHistory) -> None:
+        self.history = history
+
+    def send_stats(self, update: Update, context: CallbackContext) -> None:
+        if context.args is None:
+            logger.info(f"Got `None` as context.args in {update.message.chat_id}.")
+            return
+
+        try:
+            origin, destination, departure_time = context.args
+            departure_time = parse_time(departure_time)
+        except ValueError:
+            update.message.reply_html(
+                "To see how reliable a train is, use "
+                f"<code>/{STATS} KGX CBG 12:23</code> with the origin and "
+                "destination station codes and the departure time."
+            )
+            return
+
+        stations = resolve_stations(update, origin, destination)
+        if stations is None:
+            return
+        origin, destination = stations
+
+        title = f"{origin} - {destination} at {format_time(departure_time)}"
+        reliability = self.history.reliability(origin, destination, departure_time)
+        if reliability is None:
+            update.message.reply_html(
+                f"I have no statistics of the {format_time(departure_time)} from "
+                f"{origin} to {destination} yet. They are kept for "
+                f"the travels someone subscribed to with <code>/{SUBSCRIBE}</code>, "
+                "from the day after."
+            )
+            return
+        update.message.reply_html(reliability_text(title, reliability))
+
+
+def stats_handler(history: TravelHistory, executor: ChatOrderedExecutor):
+    controller = StatsController(history)
+    return CommandHandler(STATS, executor.wrap(controller.send_stats)), BotCommand(
+        STATS, "How reliable a train has been."
+    )
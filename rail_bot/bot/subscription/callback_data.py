@@ -0,0 +1,69 @@
+"""Callback data of the inline unsubscribe buttons.
+
+Payloads look like ``u1:<travel id in base 36>:<MAC>``. The MAC covers the
+chat the button was sent to, so a client cannot forge a button that removes
+another travel, nor replay one in a different chat. Payloads stay well within
+Telegram's 64-byte limit whatever the travel id.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import string
+
+VERSION = "u1"
+SEPARATOR = ":"
+
+# Signing key; defaults to one derived from the bot token
+CALLBACK_SECRET = os.environ.get("CALLBACK_SECRET") or os.environ.get(
+    "TELEGRAM_TOKEN", ""
+)
+
+_MAC_SIZE = 8
+_DIGITS = string.digits + string.ascii_lowercase
+
+
+class InvalidCallbackData(ValueError):
+    pass
+
+
+def _base36(number: int) -> str:
+    digits = ""
+    while True:
+        number, digit = divmod(number, 36)
+        digits = _DIGITS[digit] + digits
+        if number == 0:
+            return digits
+
+
+def _mac(chat_id: int, travel_id: str, secret: str) -> str:
+    key = hashlib.sha256(b"unsubscribe-button:" + secret.encode()).digest()
+    message = f"{VERSION}{SEPARATOR}{chat_id}{SEPARATOR}{travel_id}".encode()
+    digest = hmac.new(key, message, hashlib.sha256).digest()[:_MAC_SIZE]
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def encode_unsubscribe(
+    chat_id: int, travel_id: int, secret: str = CALLBACK_SECRET
+) -> str:
+    encoded_id = _base36(travel_id)
+    return SEPARATOR.join((VERSION, encoded_id, _mac(chat_id, encoded_id, secret)))
+
+
+def is_legacy(data: str) -> bool:
+    """Buttons sent by earlier versions carry ``"origin destination HH:MM"``."""
+    return len(data.split(" ")) == 3
+
+
+def decode_unsubscribe(chat_id: int, data: str, secret: str = CALLBACK_SECRET) -> int:
+    """Travel id of an unsubscribe button pressed in ``chat_id``."""
+    try:
+        version, encoded_id, mac = data.split(SEPARATOR)
+    except ValueError:
+        raise InvalidCallbackData(f"Malformed callback data {data!r}") from None
+    if version != VERSION:
+        raise InvalidCallbackData(f"Unsupported callback data version {version!r}")
+    if not hmac.compare_digest(mac, _mac(chat_id, encoded_id, secret)):
+        raise InvalidCallbackData(f"Invalid signature in callback data {data!r}")
+    return int(encoded_id, 36)
@@ -1,19 +1,66 @@
 import datetime
 import logging
+from typing import Optional
 
 from telegram import BotCommand, Update
 from telegram.ext import CallbackContext, CommandHandler
 
+from rail_bot.bot.dispatch import ChatOrderedExecutor
 from rail_bot.bot.job_manager import JobManager
+from rail_bot.bot.stations import resolve_stations
 from rail_bot.bot.subscription.common import SUBSCRIBE
-from rail_bot.utils import parse_time
+from rail_bot.rail_api.timetable import TIMETABLE_SNAP_MINUTES, Timetable
+from rail_bot.utils import format_time, parse_time
 
 logger = logging.getLogger(__name__)
 
 
+# Departures suggested when a subscription matches no train
+SUGGESTED_DEPARTURES = 3
+
+
 class SubscribeController:
-    def __init__(self, job_manager: JobManager) -> None:
+    def __init__(
+        self,
+        job_manager: JobManager,
+        timetable: Optional[Timetable] = None,
+        snap_minutes: int = TIMETABLE_SNAP_MINUTES,
+    ) -> None:
         self.job_manager = job_manager
+        self.timetable = timetable
+        self.snap_minutes = snap_minutes
+
+    def _scheduled_departure(
+        self, origin: str, destination: str, departure_time: datetime.time
+    ) -> Optional[datetime.time]:
+        """The departure of the timetable the subscription is anchored to."""
+        if self.timetable is None:
+            return departure_time
+        departure = self.timetable.nearest(
+            origin, destination, departure_time, within=self.snap_minutes
+        )
+        return None if departure is None else departure.time
+
+    def _no_train_text(
+        self, origin: str, destination: str, departure_time: datetime.time
+    ) -> str:
+        departures = self.timetable.departures(origin, destination)
+        if not departures:
+            return (
+                f"There are no direct trains between {origin} and {destination} "
+                "in the timetable."
+            )
+
+        minute = departure_time.hour * 60 + departure_time.minute
+        closest = sorted(
+            departures,
+            key=lambda d: abs(d.time.hour * 60 + d.time.minute - minute),
+        )[:SUGGESTED_DEPARTURES]
+        times = ", ".join(format_time(d.time) for d in sorted(closest))
+        return (
+            f"There is no train from {origin} to {destination} around "
+            f"{format_time(departure_time)}. The closest departures are at {times}."
+        )
 
     def _subscribe_departure(
         self,
@@ -54,16 +101,37 @@ class SubscribeController:
             update.message.reply_text(f"{e!r}")
             return
 
+        stations = resolve_stations(update, origin, destination, verify=True)
+        if stations is None:
+            return
+        origin, destination = stations
+
+        scheduled_time = self._scheduled_departure(origin, destination, departure_time)
+        if scheduled_time is None:
+            update.message.reply_text(
+                self._no_train_text(origin, destination, departure_time)
+            )
+            return
+
         response = self._subscribe_departure(
-            chat_id, origin, destination, departure_time
+            chat_id, origin, destination, scheduled_time
         )
+        if scheduled_time != departure_time:
+            response = (
+                f"There is no train at {format_time(departure_time)}, the closest "
+                f"one leaves at {format_time(scheduled_time)}. {response}"
+            )
         update.message.reply_text(response)
 
 
-def subscribe_handler(job_manager: JobManager):
+def subscribe_handler(
+    job_manager: JobManager,
+    executor: ChatOrderedExecutor,
+    timetable: Optional[Timetable] = None,
+):
     description = "Subscribe to service updates."
-    controller = SubscribeController(job_manager=job_manager)
+    controller = SubscribeController(job_manager=job_manager, timetable=timetable)
     return (
-        CommandHandler(SUBSCRIBE, controller.subscribe_departure),
+        CommandHandler(SUBSCRIBE, executor.wrap(controller.subscribe_departure)),
         BotCommand(SUBSCRIBE, description),
     )
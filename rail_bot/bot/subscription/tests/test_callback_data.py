@@ -0,0 +1,42 @@
+import unittest
+
+from rail_bot.bot.subscription.callback_data import (
+    InvalidCallbackData,
+    decode_unsubscribe,
+    encode_unsubscribe,
+    is_legacy,
+)
+
+SECRET = "test-secret"
+
+
+class TestCallbackData(unittest.TestCase):
+    def test_round_trip(self):
+        for travel_id in (0, 1, 35, 36, 2**31 - 1, 2**63 - 1):
+            data = encode_unsubscribe(123, travel_id, SECRET)
+            self.assertTrue(data.startswith("u1:"))
+            self.assertLessEqual(len(data.encode()), 64)
+            self.assertFalse(is_legacy(data))
+            self.assertEqual(decode_unsubscribe(123, data, SECRET), travel_id)
+
+    def test_rejects_tampered_data(self):
+        data = encode_unsubscribe(123, 42, SECRET)
+        version, _, mac = data.split(":")
+        forged = ":".join((version, "15", mac))
+
+        for chat_id, payload, secret in (
+            (456, data, SECRET),  # replayed in another chat
+            (123, data, "other-secret"),
+            (123, forged, SECRET),
+            (123, "u2" + data[2:], SECRET),
+            (123, "garbage", SECRET),
+        ):
+            with self.assertRaises(InvalidCallbackData):
+                decode_unsubscribe(chat_id, payload, secret)
+
+    def test_legacy(self):
+        self.assertTrue(is_legacy("kgx cbg 12:23"))
+
+
+if __name__ == "__main__":
+    unittest.main()
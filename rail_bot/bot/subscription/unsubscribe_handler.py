@@ -12,26 +12,29 @@ from telegram import (
 from telegram.callbackquery import CallbackQuery
 from telegram.ext import CallbackContext, CallbackQueryHandler, CommandHandler
 
+from rail_bot.bot.dispatch import ChatOrderedExecutor
 from rail_bot.bot.job_manager import JobManager
 from rail_bot.bot.service.subscription_service import Travel
+from rail_bot.bot.stations import resolve_stations
+from rail_bot.bot.subscription.callback_data import (
+    InvalidCallbackData,
+    decode_unsubscribe,
+    encode_unsubscribe,
+    is_legacy,
+)
 from rail_bot.bot.subscription.common import UNSUBSCRIBE
-from rail_bot.utils import parse_time
+from rail_bot.utils import format_time, parse_time
 
 logger = logging.getLogger(__name__)
 
 
-# TODO: callback data should be just travel_id
-def travels_markup(travels: List[Travel]) -> InlineKeyboardMarkup:
+def travels_markup(chat_id: int, travels: List[Travel]) -> InlineKeyboardMarkup:
     keyboard = []
     for travel in sorted(travels, key=lambda travel: travel.departure_time):
-        time_str = (
-            str(travel.departure_time.hour).zfill(2)
-            + ":"
-            + str(travel.departure_time.minute).zfill(2)
-        )
+        time_str = format_time(travel.departure_time)
         key_text = f"- From {travel.origin.upper()} to {travel.destination.upper()} at {time_str}"
 
-        travel_data = " ".join((travel.origin, travel.destination, time_str))
+        travel_data = encode_unsubscribe(chat_id, travel.id)
         keyboard.append([InlineKeyboardButton(key_text, callback_data=travel_data)])
 
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -63,7 +66,7 @@ class UnsubscribeController:
             "\nClick on one of the buttons below to unsubscribe. "
             f"Or use <code>/{UNSUBSCRIBE} all</code> to cancel all notifications."
         )
-        reply_markup = travels_markup(travels)
+        reply_markup = travels_markup(chat_id, travels)
 
         return text, reply_markup
 
@@ -91,11 +94,7 @@ class UnsubscribeController:
             destination=destination,
             departure_time=departure_time,
         )
-        departure_time_str = (
-            str(departure_time.hour).zfill(2)
-            + ":"
-            + str(departure_time.minute).zfill(2)
-        )
+        departure_time_str = format_time(departure_time)
         if removed != 0:
             text = (
                 f"Subscription from {origin.upper()} to {destination.upper()} "
@@ -109,6 +108,20 @@ class UnsubscribeController:
             )
         return text
 
+    def unsubscribe_by_id(self, chat_id: int, travel_id: int) -> str:
+        if self.job_manager.remove_subscription(chat_id, travel_id) == 0:
+            return "You are not subscribed to this service anymore."
+
+        travels = self.job_manager.service.get_travels(travel_id=travel_id)
+        if len(travels) == 0:
+            return "Subscription cancelled!"
+        travel = travels[0]
+        return (
+            f"Subscription from {travel.origin.upper()} to "
+            f"{travel.destination.upper()} at {format_time(travel.departure_time)} "
+            "cancelled!"
+        )
+
     def unsubscribe_departure(self, update: Update, context: CallbackContext) -> None:
         """Remove the job if the user changed their mind."""
         if context.args is None:
@@ -126,6 +139,10 @@ class UnsubscribeController:
         elif len(context.args) == 3:
             origin, destination, departure_time = context.args
             departure_time = parse_time(departure_time)
+            stations = resolve_stations(update, origin, destination)
+            if stations is None:
+                return
+            origin, destination = stations
             response = self.unsubscribe_one(
                 chat_id, origin, destination, departure_time
             )
@@ -139,8 +156,6 @@ class UnsubscribeController:
         query: CallbackQuery = update.callback_query
         query.answer()
 
-        # TODO: this only needs the travel_id from the callback query and chat_id can be
-        # retrieved from the context
         if update.effective_chat is None:
             logger.warning(
                 f"'unsubscribe_button': 'update.effective_chat' is None. Cannot respond"
@@ -149,13 +164,21 @@ class UnsubscribeController:
             return
 
         chat_id: int = update.effective_chat.id
-        origin, destination, departure_time_str = query.data.split(" ")
-        unsubscribe_response = self.unsubscribe_one(
-            chat_id,
-            origin,
-            destination,
-            parse_time(departure_time_str),
-        )
+        if is_legacy(query.data):
+            origin, destination, departure_time_str = query.data.split(" ")
+            unsubscribe_response = self.unsubscribe_one(
+                chat_id,
+                origin.upper(),
+                destination.upper(),
+                parse_time(departure_time_str),
+            )
+        else:
+            try:
+                travel_id = decode_unsubscribe(chat_id, query.data)
+            except InvalidCallbackData as e:
+                logger.warning(f"'unsubscribe_button' in {chat_id}: {e}")
+                return
+            unsubscribe_response = self.unsubscribe_by_id(chat_id, travel_id)
 
         response, reply_markup = self.unsubscribe_info(chat_id)
         response = unsubscribe_response + "\n" + response
@@ -165,13 +188,15 @@ class UnsubscribeController:
         )
 
 
-def unsubscribe_handler(job_manager: JobManager):
+def unsubscribe_handler(job_manager: JobManager, executor: ChatOrderedExecutor):
     description = "See and manage your subscriptions."
     controller = UnsubscribeController(job_manager=job_manager)
     return (
         (
-            CommandHandler(UNSUBSCRIBE, controller.unsubscribe_departure),
+            CommandHandler(
+                UNSUBSCRIBE, executor.wrap(controller.unsubscribe_departure)
+            ),
             BotCommand(UNSUBSCRIBE, description),
         ),
-        (CallbackQueryHandler(controller.unsubscribe_button), None),
+        (CallbackQueryHandler(executor.wrap(controller.unsubscribe_button)), None),
     )
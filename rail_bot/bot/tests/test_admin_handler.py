@@ -0,0 +1,37 @@
+import unittest
+from unittest import mock
+
+from rail_bot.bot.admin_handler import capture_command, profile_command
+
+
+class TestAdminHandler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.update = mock.Mock()
+        self.context = mock.Mock()
+
+    def reply(self) -> str:
+        return self.update.message.reply_text.call_args.args[0]
+
+    @mock.patch("rail_bot.bot.admin_handler.capture")
+    def test_capture_invalid_arguments_show_the_usage(self, capture):
+        for args in (["on", "many"], ["on", "10", "often"], ["on", "0"]):
+            self.context.args = args
+
+            capture_command(self.update, self.context)
+
+            self.assertTrue(self.reply().startswith("Usage: /capture"), args)
+        capture.start.assert_not_called()
+
+    @mock.patch("rail_bot.bot.admin_handler.profiler")
+    def test_profile_invalid_arguments_show_the_usage(self, profiler):
+        for args in (["long"], ["10", "stack", "often"], ["-5"], ["10", "heap"]):
+            self.context.args = args
+
+            profile_command(self.update, self.context)
+
+            self.assertTrue(self.reply().startswith("Usage: /profile"), args)
+        profiler.start.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
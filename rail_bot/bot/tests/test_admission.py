@@ -0,0 +1,72 @@
+import datetime
+import time
+import unittest
+from unittest import mock
+
+from rail_bot.bot.admission import AdaptiveLimit, update_age
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestAdaptiveLimit(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.limit = AdaptiveLimit(
+            max_limit=8, target_seconds=2, min_limit=2, backoff=0.5, clock=self.clock
+        )
+
+    def finish(self, started_at: float, running: int = 7) -> None:
+        self.limit.on_done(started_at, running)
+
+    def test_decreases_once_per_slow_round(self):
+        self.clock.now = 10
+        # Handlers started together, all slow
+        for _ in range(5):
+            self.finish(started_at=5)
+        self.assertEqual(self.limit.limit, 4)
+
+        # Started after the decrease
+        self.clock.now = 20
+        self.finish(started_at=15)
+        self.assertEqual(self.limit.limit, 2)
+        self.clock.now = 30
+        self.finish(started_at=25)
+        self.assertEqual(self.limit.limit, 2)
+
+    def test_increases_when_reached(self):
+        self.clock.now = 10
+        self.finish(started_at=5)
+        self.assertEqual(self.limit.limit, 4)
+
+        # Fast, but the limit was not reached
+        self.finish(started_at=9, running=1)
+        self.assertEqual(self.limit.limit, 4)
+
+        # About one more per round of handlers
+        for _ in range(5):
+            self.finish(started_at=9, running=3)
+        self.assertEqual(self.limit.limit, 5)
+        for _ in range(100):
+            self.finish(started_at=9, running=8)
+        self.assertEqual(self.limit.limit, 8)
+
+
+class TestUpdateAge(unittest.TestCase):
+    def test_age(self):
+        update = mock.Mock()
+        sent = datetime.datetime.fromtimestamp(time.time() - 60, datetime.timezone.utc)
+        update.message.date = sent
+        self.assertAlmostEqual(update_age(update), 60, delta=1)
+
+        update.message = None
+        self.assertEqual(update_age(update), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from unittest import mock
+
+from rail_bot.bot.admission import BUSY_TEXT
+from rail_bot.bot.board_handler import (
+    USAGE_TEXT,
+    send_cached_board,
+    send_departure_board,
+)
+
+
+class TestBoardHandler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.update = mock.Mock()
+        self.update.callback_query = None
+        self.context = mock.Mock()
+
+    def test_invalid_rows_show_the_usage(self):
+        for rows in ("many", "-2", "0"):
+            self.context.args = ["kgx", "cbg", rows]
+            self.update.message.reply_html.reset_mock()
+
+            send_departure_board(self.update, self.context)
+
+            self.update.message.reply_html.assert_called_once_with(USAGE_TEXT)
+            self.context.bot.send_message.assert_not_called()
+
+    def test_shed_invalid_rows_show_the_usage(self):
+        self.context.args = ["kgx", "cbg", "many"]
+
+        send_cached_board(self.update, self.context)
+
+        self.update.message.reply_html.assert_called_once_with(USAGE_TEXT)
+
+    def test_shed_without_cached_board_reply_busy(self):
+        self.context.args = ["kgx"]
+
+        with mock.patch(
+            "rail_bot.bot.board_handler.cached_departure_board", return_value=None
+        ):
+            send_cached_board(self.update, self.context)
+
+        self.assertEqual(
+            self.context.bot.send_message.call_args.kwargs["text"], BUSY_TEXT
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
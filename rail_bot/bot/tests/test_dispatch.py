@@ -0,0 +1,128 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from rail_bot.bot.admission import AdaptiveLimit
+from rail_bot.bot.dispatch import ChatOrderedExecutor
+
+
+def make_update(chat_id: int, update_id: int):
+    update = mock.Mock(update_id=update_id)
+    update.effective_chat.id = chat_id
+    return update
+
+
+class TestChatOrderedExecutor(unittest.TestCase):
+    def setUp(self) -> None:
+        self.executor = ChatOrderedExecutor(max_workers=4)
+
+    def tearDown(self) -> None:
+        self.executor.shutdown()
+
+    def test_same_chat_runs_in_order(self):
+        handled = []
+
+        def callback(update, context):
+            time.sleep(0.001 * (10 - update.update_id))
+            handled.append(update.update_id)
+
+        handler = self.executor.wrap(callback)
+        for update_id in range(10):
+            handler(make_update(1, update_id), mock.Mock())
+        self.executor.shutdown()
+
+        self.assertEqual(handled, list(range(10)))
+        self.assertEqual(self.executor.pending, 0)
+        self.assertEqual(self.executor.stats.count, 10)
+
+    def test_slow_chat_does_not_block_other_chats(self):
+        release = threading.Event()
+        fast_done = threading.Event()
+
+        def callback(update, context):
+            if update.effective_chat.id == 1:
+                release.wait(5)
+            else:
+                fast_done.set()
+
+        handler = self.executor.wrap(callback)
+        handler(make_update(1, 1), mock.Mock())
+        handler(make_update(2, 2), mock.Mock())
+
+        self.assertTrue(fast_done.wait(1))
+        release.set()
+
+    def test_errors_go_to_dispatcher(self):
+        error = ValueError("bad station")
+        context = mock.Mock()
+        update = make_update(1, 1)
+
+        def callback(update, context):
+            raise error
+
+        self.executor.wrap(callback)(update, context)
+        self.executor.shutdown()
+
+        context.dispatcher.dispatch_error.assert_called_once_with(update, error)
+
+    def test_updates_past_deadline_are_shed(self):
+        self.executor.deadline = 0.05
+        handled, shed = [], []
+
+        def callback(update, context):
+            time.sleep(0.1)
+            handled.append(update.update_id)
+
+        handler = self.executor.wrap(
+            callback, shed=lambda update, context: shed.append(update.update_id)
+        )
+        for update_id in range(3):
+            handler(make_update(1, update_id), mock.Mock())
+        self.executor.shutdown()
+
+        self.assertEqual(handled, [0])
+        self.assertEqual(shed, [1, 2])
+        self.assertEqual(self.executor.stats.shed, 2)
+
+    def test_updates_without_shed_callback_are_handled(self):
+        self.executor.deadline = 0.05
+        handled = []
+
+        def callback(update, context):
+            time.sleep(0.1)
+            handled.append(update.update_id)
+
+        handler = self.executor.wrap(callback)
+        for update_id in range(3):
+            handler(make_update(1, update_id), mock.Mock())
+        self.executor.shutdown()
+
+        self.assertEqual(handled, [0, 1, 2])
+        self.assertEqual(self.executor.stats.shed, 0)
+
+    def test_limit(self):
+        self.executor.limit = AdaptiveLimit(max_limit=2, target_seconds=10)
+        lock = threading.Lock()
+        running = []
+        max_running = []
+
+        def callback(update, context):
+            with lock:
+                running.append(update.update_id)
+                max_running.append(len(running))
+            time.sleep(0.01)
+            with lock:
+                running.remove(update.update_id)
+
+        handler = self.executor.wrap(callback)
+        for update_id in range(8):
+            handler(make_update(update_id, update_id), mock.Mock())
+        self.executor.shutdown()
+
+        self.assertEqual(len(max_running), 8)
+        self.assertEqual(max(max_running), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
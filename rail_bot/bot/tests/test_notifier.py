@@ -0,0 +1,119 @@
+import unittest
+from unittest import mock
+
+from telegram.error import NetworkError, RetryAfter
+
+from rail_bot.bot.notifier import Notifier
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestNotifier(unittest.TestCase):
+    def setUp(self) -> None:
+        self.job_queue = mock.Mock()
+        self.clock = FakeClock()
+        self.notifier = Notifier(
+            self.job_queue, window=10, edit_window=600, clock=self.clock
+        )
+        self.bot = mock.Mock()
+        self.bot.send_message.return_value = mock.Mock(message_id=7)
+
+    def flush(self) -> None:
+        """Run the flush jobs scheduled so far."""
+        calls = self.job_queue.run_once.call_args_list
+        self.job_queue.run_once.reset_mock()
+        for call in calls:
+            context = mock.Mock(bot=self.bot)
+            context.job.context = call.kwargs["context"]
+            call.args[0](context)
+
+    def test_coalesces_notifications(self):
+        self.notifier.notify(1, "kgx-cbg", "DELAYED: KGX - CBG")
+        self.notifier.notify(1, "kgx-ely", "DELAYED: KGX - ELY")
+        self.notifier.notify(1, "kgx-cbg", "CANCELLED: KGX - CBG")
+        self.notifier.notify(2, "kgx-cbg", "DELAYED: KGX - CBG")
+        self.assertEqual(self.job_queue.run_once.call_count, 2)
+
+        self.flush()
+
+        self.bot.send_message.assert_has_calls(
+            [
+                mock.call(1, text="CANCELLED: KGX - CBG\n\nDELAYED: KGX - ELY"),
+                mock.call(2, text="DELAYED: KGX - CBG"),
+            ]
+        )
+        self.assertEqual(self.notifier.coalesced, 2)
+
+    def test_edits_previous_digest(self):
+        self.notifier.notify(1, "kgx-cbg", "DELAYED: KGX - CBG")
+        self.notifier.notify(1, "kgx-ely", "DELAYED: KGX - ELY")
+        self.flush()
+
+        self.clock.now = 120
+        self.notifier.notify(1, "kgx-ely", "CANCELLED: KGX - ELY")
+        self.flush()
+
+        self.bot.send_message.assert_called_once()
+        self.bot.edit_message_text.assert_called_once_with(
+            text="DELAYED: KGX - CBG\n\nCANCELLED: KGX - ELY",
+            chat_id=1,
+            message_id=7,
+        )
+
+        # A new travel, or an old digest, gets a new message
+        self.notifier.notify(1, "ely-cbg", "DELAYED: ELY - CBG")
+        self.flush()
+        self.clock.now = 1000
+        self.notifier.notify(1, "ely-cbg", "CANCELLED: ELY - CBG")
+        self.flush()
+        self.assertEqual(self.bot.send_message.call_count, 3)
+
+    def test_retries_after_flood_limit(self):
+        self.bot.send_message.side_effect = [RetryAfter(5), mock.Mock(message_id=8)]
+        self.notifier.notify(1, "kgx-cbg", "DELAYED: KGX - CBG")
+        self.flush()
+        self.notifier.notify(1, "kgx-ely", "DELAYED: KGX - ELY")
+
+        self.assertEqual(self.job_queue.run_once.call_args.kwargs["when"], 5)
+        self.flush()
+        self.bot.send_message.assert_called_with(
+            1, text="DELAYED: KGX - CBG\n\nDELAYED: KGX - ELY"
+        )
+
+    def test_retries_edit_after_flood_limit(self):
+        self.notifier.notify(1, "kgx-cbg", "DELAYED: KGX - CBG")
+        self.flush()
+        self.bot.edit_message_text.side_effect = [RetryAfter(5), None]
+
+        self.notifier.notify(1, "kgx-cbg", "CANCELLED: KGX - CBG")
+        self.flush()
+        self.assertEqual(self.job_queue.run_once.call_args.kwargs["when"], 5)
+        self.flush()
+
+        self.bot.send_message.assert_called_once()
+        self.bot.edit_message_text.assert_called_with(
+            text="CANCELLED: KGX - CBG", chat_id=1, message_id=7
+        )
+        self.assertEqual(self.notifier.edited, 1)
+
+    def test_failed_edit_is_dropped(self):
+        self.notifier.notify(1, "kgx-cbg", "DELAYED: KGX - CBG")
+        self.flush()
+        self.bot.edit_message_text.side_effect = NetworkError("Connection reset")
+
+        self.notifier.notify(1, "kgx-cbg", "CANCELLED: KGX - CBG")
+        with self.assertLogs("rail_bot.bot.notifier", "WARNING"):
+            self.flush()
+
+        self.bot.send_message.assert_called_once()
+        self.job_queue.run_once.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
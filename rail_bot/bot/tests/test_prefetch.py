@@ -0,0 +1,147 @@
+import datetime
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from rail_bot.bot.prefetch import DemandModel, Prefetcher
+from rail_bot.rail_api.board import Board, BoardCache
+
+# A Monday
+MORNING = datetime.datetime(2021, 3, 1, 7, 59, 50)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def travel(origin: str, destination: str, departure_time, subscribers: int):
+    return SimpleNamespace(
+        origin=origin,
+        destination=destination,
+        departure_time=departure_time,
+        subscriber_count=subscribers,
+    )
+
+
+class TestDemandModel(unittest.TestCase):
+    def test_requests_and_subscribers(self):
+        demand = DemandModel(slot_minutes=15)
+        for _ in range(3):
+            demand.record_request(("KGX", None), MORNING.replace(hour=8, minute=5))
+        demand.record_request(("CBG", None), MORNING.replace(hour=8, minute=10))
+        # Checked in the 8:00 slot, 15 minutes before leaving
+        demand.set_travels([("kgx", "cbg", datetime.time(8, 20), 4)])
+
+        slot = demand.slot(MORNING.replace(hour=8, minute=0))
+        self.assertEqual(
+            demand.hottest(slot, 5, min_demand=2),
+            [(("KGX", "CBG"), 4), (("KGX", None), 3)],
+        )
+        # Requests are learnt for weekdays only
+        weekend = (True, slot[1])
+        self.assertEqual(
+            demand.hottest(weekend, 5, min_demand=2), [(("KGX", "CBG"), 4)]
+        )
+
+    def test_request_weight(self):
+        demand = DemandModel(slot_minutes=15, request_weight=3)
+        demand.record_request(("KGX", None), MORNING)
+
+        self.assertEqual(
+            demand.hottest(demand.slot(MORNING), 5, min_demand=2),
+            [(("KGX", None), 3)],
+        )
+
+    def test_decay(self):
+        demand = DemandModel(slot_minutes=15)
+        for _ in range(4):
+            demand.record_request(("KGX", None), MORNING)
+        slot = demand.slot(MORNING)
+
+        demand.decay(0.5)
+        self.assertEqual(demand.hottest(slot, 5, min_demand=2), [(("KGX", None), 2)])
+        demand.decay(0.5)
+        self.assertEqual(demand.hottest(slot, 5, min_demand=2), [])
+
+
+class TestPrefetcher(unittest.TestCase):
+    def setUp(self) -> None:
+        self.service = mock.Mock()
+        self.service.get_travels.return_value = [
+            travel("KGX", "CBG", datetime.time(8, 20), 5),
+            travel("KGX", "ELY", datetime.time(8, 25), 3),
+            travel("KGX", "LDS", datetime.time(8, 25), 2),
+            travel("KGX", "YRK", datetime.time(9, 25), 9),
+        ]
+        self.clock = FakeClock()
+        self.cache = BoardCache(ttl=30, clock=self.clock)
+        self.fetched = []
+        self.prefetcher = Prefetcher(
+            self.service,
+            demand=DemandModel(slot_minutes=15),
+            cache=self.cache,
+            fetch=self.fetch,
+            rate=4,
+            lead=15,
+            now=lambda: MORNING,
+        )
+        self.prefetcher.learn()
+
+    def fetch(self, origin, destination, rows):
+        self.fetched.append((origin, destination))
+        return Board(location_name=origin, rows=())
+
+    def test_keeps_the_hottest_boards_fresh_within_the_budget(self):
+        # 4 requests a minute refresh 2 boards every 30 s, 1 every 15 s run
+        self.assertEqual(self.prefetcher.boards, 2)
+
+        self.assertEqual(self.prefetcher.prefetch(), 2)
+        self.assertEqual(self.fetched, [("KGX", "CBG"), ("KGX", "ELY")])
+
+        # The boards still cached are skipped
+        self.assertEqual(self.prefetcher.prefetch(), 0)
+
+        # Until they expire within the lead time
+        self.clock.now = 20
+        self.assertEqual(self.prefetcher.prefetch(), 2)
+        self.assertEqual(self.fetched[2:], [("KGX", "CBG"), ("KGX", "ELY")])
+
+    def test_budget(self):
+        self.prefetcher.prefetch()
+        self.clock.now = 20
+        # Only 1 fetch allowed since the last run
+        self.prefetcher._tokens = 0
+
+        self.assertEqual(self.prefetcher.prefetch(), 1)
+        self.assertEqual(self.fetched[2:], [("KGX", "CBG")])
+
+    def test_counts_the_boards_used(self):
+        self.prefetcher.prefetch()
+        self.cache.get(("KGX", "CBG"), 10, lambda rows: None)
+        self.clock.now = 31
+
+        self.prefetcher.log_stats()
+
+        self.assertEqual((self.prefetcher.prefetched, self.prefetcher.used), (2, 1))
+
+    def test_errors_are_logged(self):
+        self.prefetcher.fetch = mock.Mock(side_effect=ConnectionError("LDB is down"))
+
+        with self.assertLogs("rail_bot.bot.prefetch", "WARNING"):
+            self.assertEqual(self.prefetcher.prefetch(), 2)
+
+    def test_schedule(self):
+        job_queue = mock.Mock()
+
+        self.prefetcher.schedule(job_queue)
+
+        kwargs = job_queue.run_repeating.call_args.kwargs
+        self.assertEqual((kwargs["interval"], kwargs["first"]), (15, 15))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,237 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+from rail_bot.bot.job_manager import JobManager, PollingPolicy
+from rail_bot.bot.notifier import Notifier
+from rail_bot.bot.service.subscription_service import SubscriptionService
+from rail_bot.bot.simulation import (
+    CountingBot,
+    Disruption,
+    ScriptedDepartures,
+    SimulatedJobQueue,
+    VirtualClock,
+)
+from rail_bot.darwin.store import TravelIndex
+from rail_bot.history.stats import TravelHistory
+from rail_bot.history.store import HistoryStore
+from rail_bot.rail_api.timetable import Timetable, write_timetable
+
+START = datetime.datetime(2024, 1, 8)
+
+
+class TestSimulatedJobQueue(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = VirtualClock(START)
+        self.started = []
+
+    def job(self, context) -> None:
+        self.started.append(self.clock.now())
+        self.clock.spend(10)
+
+    def test_busy_workers_delay_jobs(self):
+        queue = SimulatedJobQueue(self.clock, CountingBot(), workers=1)
+        for _ in range(3):
+            queue.run_once(self.job, when=60)
+
+        queue.run_until(START + datetime.timedelta(hours=1))
+
+        self.assertEqual(
+            [(started - START).total_seconds() for started in self.started],
+            [60, 70, 80],
+        )
+        self.assertEqual(queue.lags, [0, 10, 20])
+        self.assertEqual(queue.peak_concurrency, 1)
+        self.assertEqual(self.clock.now(), START + datetime.timedelta(hours=1))
+
+    def test_concurrent_jobs(self):
+        queue = SimulatedJobQueue(self.clock, CountingBot(), workers=4)
+        for _ in range(3):
+            queue.run_once(self.job, when=60)
+
+        queue.run_until(START + datetime.timedelta(hours=1))
+
+        self.assertEqual(queue.lags, [0, 0, 0])
+        self.assertEqual(queue.peak_concurrency, 3)
+
+    def test_repeating_and_daily_jobs(self):
+        queue = SimulatedJobQueue(self.clock, CountingBot())
+        repeating = queue.run_repeating(self.job, interval=600, first=0)
+        queue.run_daily(self.job, time=datetime.time(7), name="daily")
+
+        queue.run_until(START + datetime.timedelta(hours=1))
+        self.assertEqual(queue.runs["job"], 7)
+        repeating.schedule_removal()
+        queue.run_until(START + datetime.timedelta(days=2))
+
+        self.assertEqual(queue.runs["job"], 9)
+        (daily,) = queue.get_jobs_by_name("daily")
+        self.assertEqual(daily.next_t, START + datetime.timedelta(days=2, hours=7))
+
+
+class TestPollingSimulation(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, "simulation.db")
+        self.service = SubscriptionService(database_url=f"sqlite:///{path}")
+        self.clock = VirtualClock(START)
+        self.bot = CountingBot()
+        self.queue = SimulatedJobQueue(self.clock, self.bot)
+
+    def tearDown(self) -> None:
+        self.service.shutdown()
+        self.directory.cleanup()
+
+    def simulate(self, timeline):
+        departure = datetime.time(8)
+        for chat_id in (1, 2):
+            self.service.add_subscription(chat_id, "kgx", "cbg", departure)
+        departures = ScriptedDepartures(
+            self.clock, [("kgx", "cbg", departure)], timeline, latency=0.5
+        )
+        manager = JobManager(
+            self.queue,
+            self.service,
+            notifier=Notifier(self.queue, window=5, clock=self.clock.monotonic),
+            policy=PollingPolicy(
+                first_check_before=3600, interval=600, disrupted_interval=120
+            ),
+            departure_status=departures,
+            now=self.clock.now,
+        )
+        manager.recover_travel_jobs()
+        self.queue.run_until(START + datetime.timedelta(days=1))
+        return departures
+
+    def test_quiet_day(self):
+        departures = self.simulate(timeline=[])
+
+        # Every 10 minutes from 07:00 to 08:00
+        self.assertEqual(departures.calls, 7)
+        self.assertEqual(self.bot.sent, 0)
+
+    def test_delay(self):
+        timeline = [Disruption(datetime.time(7, 30), datetime.time(8, 30), delay=10)]
+        departures = self.simulate(timeline)
+
+        # Every 2 minutes from 07:00 to 08:00, one notification per chat
+        self.assertEqual(departures.calls, 31)
+        self.assertEqual(self.bot.sent, 2)
+        self.assertEqual(self.queue.errors, 0)
+
+    def test_push_travels_are_not_polled(self):
+        travels = TravelIndex()
+        manager = JobManager(
+            self.queue, self.service, now=self.clock.now, push_travels=travels
+        )
+
+        manager.add_subscription(1, "kgx", "cbg", datetime.time(8))
+
+        self.assertEqual(self.queue.jobs(), ())
+        self.assertIn("CBG", travels.departing("KGX", datetime.time(8)))
+
+    def test_travels_without_tiploc_are_polled(self):
+        travels = TravelIndex(stations={"KGX", "CBG"})
+        manager = JobManager(
+            self.queue, self.service, now=self.clock.now, push_travels=travels
+        )
+
+        manager.add_subscription(1, "kgx", "cbg", datetime.time(8))
+        manager.add_subscription(1, "kgx", "ely", datetime.time(8))
+
+        self.assertEqual(len(self.queue.jobs()), 1)
+        self.assertEqual(len(travels), 1)
+
+    def test_polls_only_on_running_days(self):
+        path = os.path.join(self.directory.name, "timetable.bin")
+        weekends = 0b1100000
+        write_timetable(path, {("KGX", "CBG"): {8 * 60: weekends}}, START.date(), 7)
+        timetable = Timetable(path)
+        self.addCleanup(timetable.close)
+        departures = ScriptedDepartures(self.clock, [("kgx", "cbg", datetime.time(8))])
+        manager = JobManager(
+            self.queue,
+            self.service,
+            departure_status=departures,
+            now=self.clock.now,
+            timetable=timetable,
+        )
+
+        manager.add_subscription(1, "kgx", "cbg", datetime.time(8))
+        manager.add_subscription(1, "kgx", "cbg", datetime.time(9))
+        self.queue.run_until(START + datetime.timedelta(days=7))
+
+        # Polled on Saturday and Sunday; the 09:00 is not in the timetable
+        self.assertEqual(departures.calls, 2 * 7 + 7 * 7)
+
+    def test_unreliable_travels_are_polled_more(self):
+        store = HistoryStore(os.path.join(self.directory.name, "history"))
+        for day in range(1, 6):
+            observed = START - datetime.timedelta(days=day, minutes=10)
+            store.append("kgx", "cbg", datetime.time(8), observed, None)
+        history = TravelHistory(store, today=self.clock.now().date)
+        history.refresh()
+        departures = ScriptedDepartures(self.clock, [("kgx", "cbg", datetime.time(8))])
+        manager = JobManager(
+            self.queue,
+            self.service,
+            departure_status=departures,
+            now=self.clock.now,
+            history=history,
+        )
+        policy = manager.policy_for("kgx", "cbg", datetime.time(8))
+        self.assertEqual(policy.first_check_before, 2 * 3600)
+
+        manager.add_subscription(1, "kgx", "cbg", datetime.time(8))
+        self.queue.run_until(START + datetime.timedelta(days=1))
+
+        # Cancelled on the last 5 days: every 5 minutes from 06:00 to 08:00
+        self.assertEqual(departures.calls, 25)
+        self.assertEqual(len(store.read(START.date(), START.date())), 25)
+
+    def test_travels_are_polled_by_their_owner(self):
+        managers = [
+            JobManager(
+                SimulatedJobQueue(self.clock, self.bot),
+                self.service,
+                now=self.clock.now,
+                owns=lambda origin, destination, time, index=index: (
+                    (time.hour % 2) == index
+                ),
+            )
+            for index in range(2)
+        ]
+
+        managers[0].add_subscription(1, "kgx", "cbg", datetime.time(9))
+        self.assertEqual(managers[0].job_queue.jobs(), ())
+        self.assertEqual(managers[1].sync_travel_jobs(), 1)
+        self.assertEqual(managers[1].sync_travel_jobs(), 0)
+        self.assertEqual(len(managers[1].job_queue.jobs()), 1)
+        self.assertEqual(managers[0].sync_travel_jobs(), 0)
+
+        managers[0].remove_subscriptions(1)
+        self.assertEqual(managers[1].sync_travel_jobs(), 1)
+        self.assertEqual(managers[1].job_queue.jobs(), ())
+
+    def test_compaction_keeps_travels_subscribed_to_again(self):
+        manager = JobManager(self.queue, self.service, now=self.clock.now)
+        departure = datetime.time(9)
+        manager.add_subscription(1, "kgx", "cbg", departure)
+        manager.remove_subscriptions(1)
+        remove_orphaned_travels = self.service.remove_orphaned_travels
+
+        def resubscribe_after_delete(batch_size):
+            removed = remove_orphaned_travels(batch_size=batch_size)
+            manager.add_subscription(2, "kgx", "cbg", departure)
+            return removed
+
+        self.service.remove_orphaned_travels = resubscribe_after_delete
+        self.assertEqual(manager.compact_travels(), 1)
+
+        self.assertEqual(len(self.queue.jobs()), 1)
+        self.assertEqual(len(self.service.get_travels(only_active=True)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
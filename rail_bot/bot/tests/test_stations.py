@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from zeep.exceptions import Fault
+
+from rail_bot.bot.stations import resolve_stations
+from rail_bot.rail_api.api import station_exists
+from rail_bot.rail_api.response_cache import ResponseCache
+
+
+class TestResolveStations(unittest.TestCase):
+    def setUp(self) -> None:
+        self.update = mock.Mock()
+        patcher = mock.patch("rail_bot.bot.stations.station_exists")
+        self.station_exists = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_unknown_codes_are_passed_on(self):
+        self.assertEqual(resolve_stations(self.update, "kgx", "zzq"), ["KGX", "ZZQ"])
+        self.station_exists.assert_not_called()
+
+    def test_unknown_codes_are_verified(self):
+        self.station_exists.return_value = False
+
+        self.assertIsNone(resolve_stations(self.update, "kgx", "zzq", verify=True))
+
+        self.station_exists.assert_called_once_with("ZZQ")
+        self.update.message.reply_html.assert_called_once()
+
+    def test_existing_codes_are_accepted(self):
+        self.station_exists.return_value = True
+
+        self.assertEqual(
+            resolve_stations(self.update, "kgx", "zzq", verify=True), ["KGX", "ZZQ"]
+        )
+
+    def test_failed_checks_are_not_stored(self):
+        self.station_exists.side_effect = Fault("Unexpected server error")
+
+        with self.assertLogs("rail_bot.bot.stations", "WARNING"):
+            self.assertIsNone(resolve_stations(self.update, "kgx", "zzq", verify=True))
+
+        self.assertIn("try again", self.update.message.reply_html.call_args.args[0])
+
+
+class TestStationExists(unittest.TestCase):
+    def setUp(self) -> None:
+        station_exists.cache_clear()
+        self.addCleanup(station_exists.cache_clear)
+        patcher = mock.patch("rail_bot.rail_api.api.call_ldb")
+        self.call_ldb = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_invalid_codes(self):
+        self.call_ldb.side_effect = Fault("Invalid crs code supplied")
+
+        self.assertFalse(station_exists("ZZQ"))
+        self.assertFalse(station_exists("ZZQ"))
+        self.call_ldb.assert_called_once()
+
+    def test_other_faults_are_raised_and_not_cached(self):
+        self.call_ldb.side_effect = [Fault("Unexpected server error"), None]
+
+        with self.assertRaises(Fault):
+            station_exists("ZZQ")
+        self.assertTrue(station_exists("ZZQ"))
+
+    def test_shared_through_the_response_cache(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        cache = ResponseCache(os.path.join(directory.name, "responses.db"))
+        self.addCleanup(cache.close)
+        patcher = mock.patch(
+            "rail_bot.rail_api.api.get_response_cache", return_value=cache
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.call_ldb.side_effect = Fault("Invalid crs code supplied")
+
+        self.assertFalse(station_exists("zzq"))
+        # As in another process, or after a restart
+        station_exists.cache_clear()
+        self.assertFalse(station_exists("ZZQ"))
+        self.call_ldb.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import unittest
+from unittest import mock
+
+from telegram.error import BadRequest
+
+from rail_bot.bot.watch_handler import WatchController
+from rail_bot.bot.watch_manager import WatchManager, watch_job_name
+from rail_bot.rail_api.api import BoardUnavailableError
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestWatchManager(unittest.TestCase):
+    def setUp(self) -> None:
+        self.job_queue = mock.Mock()
+        self.job_queue.get_jobs_by_name.return_value = [mock.Mock()]
+        self.board = "Trains at London Kings Cross\n12:23 Cambridge\n"
+        self.render = mock.Mock(side_effect=lambda origin, destination: self.board)
+        self.clock = FakeClock()
+        self.manager = WatchManager(
+            self.job_queue, self.render, interval=60, duration=600, clock=self.clock
+        )
+        self.context = mock.Mock()
+        self.context.job.context = ("KGX", None)
+
+    def watch(self, chat_id: int, key=("KGX", None)) -> None:
+        send = mock.Mock(return_value=mock.Mock(message_id=100 + chat_id))
+        self.manager.watch(chat_id, key, send)
+
+    def test_one_poll_per_station(self):
+        for chat_id in range(3):
+            self.watch(chat_id)
+
+        self.job_queue.run_repeating.assert_called_once()
+        self.assertEqual(
+            self.job_queue.run_repeating.call_args.kwargs["name"],
+            watch_job_name(("KGX", None)),
+        )
+
+        self.manager.unwatch(0)
+        self.manager.unwatch(1)
+        self.job_queue.get_jobs_by_name.return_value[
+            0
+        ].schedule_removal.assert_not_called()
+        self.assertTrue(self.manager.unwatch(2))
+        self.job_queue.get_jobs_by_name.return_value[
+            0
+        ].schedule_removal.assert_called_once()
+        self.assertFalse(self.manager.unwatch(2))
+
+    def test_edits_only_changed_boards(self):
+        for chat_id in range(3):
+            self.watch(chat_id)
+        self.render.reset_mock()
+
+        self.manager.poll(self.context)
+        self.context.bot.edit_message_text.assert_not_called()
+
+        self.board = "Trains at London Kings Cross\n12:23 Cambridge - 12:30\n"
+        self.manager.poll(self.context)
+        self.manager.poll(self.context)
+
+        self.assertEqual(self.render.call_count, 3)
+        self.assertEqual(self.context.bot.edit_message_text.call_count, 3)
+        text = self.context.bot.edit_message_text.call_args.kwargs["text"]
+        self.assertTrue(text.startswith(self.board))
+
+    def test_expiry(self):
+        self.watch(1)
+        self.clock.now = 601
+
+        self.manager.poll(self.context)
+
+        self.context.bot.edit_message_text.assert_called_once()
+        self.assertFalse(self.manager.unwatch(1))
+
+    def test_deleted_message_stops_watch(self):
+        self.watch(1)
+        self.board = "Trains at London Kings Cross\n"
+        self.context.bot.edit_message_text.side_effect = BadRequest(
+            "Message to edit not found"
+        )
+
+        self.manager.poll(self.context)
+
+        self.assertFalse(self.manager.unwatch(1))
+
+    def test_failed_first_render_starts_no_watch(self):
+        self.render.side_effect = BoardUnavailableError("No board")
+        send = mock.Mock()
+
+        with self.assertRaises(BoardUnavailableError):
+            self.manager.watch(1, ("KGX", None), send)
+
+        send.assert_not_called()
+        self.job_queue.run_repeating.assert_not_called()
+        self.assertFalse(self.manager.unwatch(1))
+
+    def test_failed_refresh_keeps_the_board(self):
+        self.watch(1)
+        self.render.side_effect = ConnectionError("LDB is down")
+
+        self.manager.poll(self.context)
+
+        self.context.bot.edit_message_text.assert_not_called()
+        self.assertTrue(self.manager.unwatch(1))
+
+
+class TestWatchController(unittest.TestCase):
+    def setUp(self) -> None:
+        self.manager = mock.Mock()
+        self.controller = WatchController(self.manager)
+        self.update = mock.Mock()
+        self.context = mock.Mock(args=["kgx"])
+
+    def test_replies_error_instead_of_watching(self):
+        self.manager.watch.side_effect = BoardUnavailableError(
+            "Could not retrieve board information for trains from KGX."
+        )
+
+        self.controller.watch_board(self.update, self.context)
+
+        self.update.message.reply_text.assert_called_once_with(
+            "Could not retrieve board information for trains from KGX."
+        )
+
+    def test_replies_details_of_failed_call(self):
+        self.manager.watch.side_effect = ConnectionError("LDB is down")
+
+        self.controller.watch_board(self.update, self.context)
+
+        (text,), _ = self.update.message.reply_text.call_args
+        self.assertTrue(text.startswith("Something bad just happened..."))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import http.client
+import json
+import unittest
+from queue import Queue
+
+from telegram import Bot
+
+from rail_bot.bot.webhook import SECRET_TOKEN_HEADER, WebhookServer
+
+UPDATE = {
+    "update_id": 7,
+    "message": {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 42, "type": "private"},
+        "text": "/board KGX",
+    },
+}
+
+
+class TestWebhookServer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.update_queue: Queue = Queue()
+        self.server = WebhookServer(
+            bot=Bot(token="123456:token"),
+            update_queue=self.update_queue,
+            listen="127.0.0.1",
+            port=0,
+            url_path="/telegram",
+            secret_token="secret",
+            workers=2,
+        )
+        self.server.start()
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def _post(self, path: str, secret_token: str) -> int:
+        connection = http.client.HTTPConnection("127.0.0.1", self.server.port)
+        connection.request(
+            "POST",
+            path,
+            body=json.dumps(UPDATE),
+            headers={SECRET_TOKEN_HEADER: secret_token},
+        )
+        status = connection.getresponse().status
+        connection.close()
+        return status
+
+    def test_accepts_update_with_secret_token(self):
+        self.assertEqual(self._post("/telegram", "secret"), 200)
+
+        update = self.update_queue.get(timeout=1)
+        self.assertEqual(update.update_id, 7)
+        self.assertEqual(update.effective_chat.id, 42)
+
+    def test_rejects_wrong_secret_token(self):
+        self.assertEqual(self._post("/telegram", "guess"), 403)
+        self.assertEqual(self._post("/other", "secret"), 404)
+
+        self.assertTrue(self.update_queue.empty())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import logging
+
+from telegram import BotCommand, Update
+from telegram.ext import CallbackContext, CommandHandler
+
+from rail_bot.bot.admission import reply_busy
+from rail_bot.bot.dispatch import ChatOrderedExecutor
+from rail_bot.bot.stations import resolve_stations
+from rail_bot.bot.watch_manager import WatchManager
+from rail_bot.rail_api.api import board_error_text
+
+logger = logging.getLogger(__name__)
+
+WATCH = "watch"
+UNWATCH = "unwatch"
+
+
+class WatchController:
+    def __init__(self, watch_manager: WatchManager) -> None:
+        self.watch_manager = watch_manager
+
+    def watch_board(self, update: Update, context: CallbackContext) -> None:
+        if context.args is None:
+            logger.info(f"Got `None` as context.args in {update.message.chat_id}.")
+            return
+
+        if len(context.args) not in (1, 2):
+            update.message.reply_html(
+                "To keep a live departures board up to date in a single message, "
+                f"use <code>/{WATCH} ABC</code> or <code>/{WATCH} ABC DEF</code>, "
+                "where ABC and DEF are the origin and destination station codes."
+            )
+            return
+
+        stations = resolve_stations(update, *context.args)
+        if stations is None:
+            return
+        origin = stations[0]
+        destination = stations[1] if len(stations) == 2 else None
+
+        try:
+            self.watch_manager.watch(
+                update.message.chat_id,
+                (origin, destination),
+                update.message.reply_text,
+            )
+        except Exception as e:
+            logger.info(f"Not watching {origin} to {destination}: {e!r}")
+            update.message.reply_text(board_error_text(e))
+
+    def unwatch_board(self, update: Update, context: CallbackContext) -> None:
+        if self.watch_manager.unwatch(update.message.chat_id):
+            text = "Stopped refreshing the board."
+        else:
+            text = "You are not watching any board."
+        update.message.reply_text(text)
+
+
+def watch_handler(watch_manager: WatchManager, executor: ChatOrderedExecutor):
+    controller = WatchController(watch_manager)
+    return (
+        (
+            CommandHandler(
+                WATCH, executor.wrap(controller.watch_board, shed=reply_busy)
+            ),
+            BotCommand(WATCH, "Live departures board, kept up to date."),
+        ),
+        (
+            CommandHandler(UNWATCH, executor.wrap(controller.unwatch_board)),
+            BotCommand(UNWATCH, "Stop updating the watched board."),
+        ),
+    )
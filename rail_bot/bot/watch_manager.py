@@ -0,0 +1,212 @@
+"""Live boards kept up to date in a single message per chat.
+
+Every watched (origin, destination) pair has one repeating poll job, however
+many chats watch it. The poll renders the board once and edits the watchers'
+messages, skipping those that already show the same content.
+"""
+
+import datetime
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from telegram import Message
+from telegram.error import BadRequest, Unauthorized
+from telegram.ext import CallbackContext, JobQueue
+
+from rail_bot.profiling import traced
+
+logger = logging.getLogger(__name__)
+
+# Seconds between refreshes of a watched board
+WATCH_INTERVAL = int(os.environ.get("WATCH_INTERVAL", 60))
+# Seconds after which a watch stops refreshing
+WATCH_DURATION = int(os.environ.get("WATCH_DURATION", 30 * 60))
+
+# (origin CRS, destination CRS or None)
+WatchKey = Tuple[str, Optional[str]]
+# Renders the board text of (origin, destination), raises if it cannot
+Render = Callable[[str, Optional[str]], str]
+
+
+def watch_job_name(key: WatchKey) -> str:
+    origin, destination = key
+    return f"watch-{origin.lower()}-{(destination or '').lower()}"
+
+
+def content_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+class Watch:
+    def __init__(
+        self,
+        chat_id: int,
+        message_id: int,
+        key: WatchKey,
+        expires_at: float,
+        footer: str,
+        content_hash: bytes,
+    ) -> None:
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.key = key
+        self.expires_at = expires_at
+        self.footer = footer
+        self.content_hash: Optional[bytes] = content_hash
+
+    def __repr__(self) -> str:
+        return (
+            f"Watch(chat_id={self.chat_id}, message_id={self.message_id}, "
+            f"key={self.key!r})"
+        )
+
+
+class WatchManager:
+    def __init__(
+        self,
+        job_queue: JobQueue,
+        render: Render,
+        interval: float = WATCH_INTERVAL,
+        duration: float = WATCH_DURATION,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.job_queue = job_queue
+        self.render = render
+        self.interval = interval
+        self.duration = duration
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        # A chat watches at most one board
+        self._watches: Dict[int, Watch] = {}
+        self._watchers: Dict[WatchKey, Set[int]] = {}
+
+    def watch(
+        self, chat_id: int, key: WatchKey, send: Callable[[str], Message]
+    ) -> None:
+        """Send the board with ``send`` and keep the message up to date. The
+        errors of the first render are raised, and then nothing is watched.
+        """
+        until = datetime.datetime.now() + datetime.timedelta(seconds=self.duration)
+        footer = (
+            f"\nRefreshed every {self.interval} s until {until:%H:%M}. "
+            "Use /unwatch to stop."
+        )
+        text = self.render(*key)
+        message = send(text + footer)
+        watch = Watch(
+            chat_id,
+            message.message_id,
+            key,
+            self.clock() + self.duration,
+            footer,
+            content_hash(text),
+        )
+        with self._lock:
+            self._remove(chat_id)
+            self._watches[chat_id] = watch
+            watchers = self._watchers.setdefault(key, set())
+            start_polling = not watchers
+            watchers.add(chat_id)
+
+        if start_polling:
+            self.job_queue.run_repeating(
+                self.poll,
+                interval=self.interval,
+                first=self.interval,
+                context=key,
+                name=watch_job_name(key),
+            )
+            logger.info(f"Started polling {watch_job_name(key)}.")
+
+    def unwatch(self, chat_id: int) -> bool:
+        with self._lock:
+            return self._remove(chat_id) is not None
+
+    def _discard(self, watch: Watch) -> None:
+        with self._lock:
+            # Unless the chat has started another watch in the meantime
+            if self._watches.get(watch.chat_id) is watch:
+                self._remove(watch.chat_id)
+
+    def _remove(self, chat_id: int) -> Optional[Watch]:
+        watch = self._watches.pop(chat_id, None)
+        if watch is None:
+            return None
+
+        watchers = self._watchers[watch.key]
+        watchers.discard(chat_id)
+        if not watchers:
+            del self._watchers[watch.key]
+            for job in self.job_queue.get_jobs_by_name(watch_job_name(watch.key)):
+                job.schedule_removal()
+            logger.info(f"Stopped polling {watch_job_name(watch.key)}.")
+        return watch
+
+    @traced("watch.poll")
+    def poll(self, context: CallbackContext) -> None:
+        key: WatchKey = context.job.context
+        now = self.clock()
+        with self._lock:
+            watches = [
+                self._watches[chat_id] for chat_id in self._watchers.get(key, ())
+            ]
+            expired = [watch for watch in watches if watch.expires_at <= now]
+            for watch in expired:
+                self._remove(watch.chat_id)
+        watches = [watch for watch in watches if watch.expires_at > now]
+        if not watches and not expired:
+            return
+
+        try:
+            text = self.render(*key)
+        except Exception as e:
+            # The messages keep the last board until the next poll
+            logger.warning(f"Could not refresh {watch_job_name(key)}: {e!r}")
+            return
+        new_hash = content_hash(text)
+        for watch in expired:
+            self._edit(context, watch, new_hash, text + "\nNo longer refreshed.")
+
+        edited = 0
+        for watch in watches:
+            if watch.content_hash == new_hash:
+                continue
+            if self._edit(context, watch, new_hash, text + watch.footer):
+                edited += 1
+        if watches:
+            logger.info(
+                f"Refreshed {watch_job_name(key)}: edited {edited} of {len(watches)} "
+                "messages."
+            )
+
+    def _edit(
+        self,
+        context: CallbackContext,
+        watch: Watch,
+        new_hash: Optional[bytes],
+        text: str,
+    ) -> bool:
+        try:
+            context.bot.edit_message_text(
+                text=text, chat_id=watch.chat_id, message_id=watch.message_id
+            )
+        except BadRequest as e:
+            if "not modified" in e.message:
+                watch.content_hash = new_hash
+                return False
+            # The message was deleted, or is too old to be edited
+            logger.info(f"Cannot edit {watch!r} any more: {e.message}")
+            self._discard(watch)
+            return False
+        except Unauthorized:
+            # The user blocked the bot
+            self._discard(watch)
+            return False
+
+        watch.content_hash = new_hash
+        return True
@@ -0,0 +1,173 @@
+"""Embedded HTTP server receiving Telegram updates through a webhook.
+
+Telegram sends every update as a POST request to the registered URL, with the
+secret token given at registration in the ``X-Telegram-Bot-Api-Secret-Token``
+header. Requests are served by a fixed pool of worker threads, and accepted
+updates are put on the dispatcher's update queue, exactly like polled ones.
+"""
+
+import hmac
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from queue import Queue
+from typing import Optional
+
+from telegram import Bot, Update
+from telegram.ext import Updater
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class _WebhookRequestHandler(BaseHTTPRequestHandler):
+    # Telegram keeps connections open between updates. Idle ones are closed
+    # after `timeout` seconds to free their worker.
+    protocol_version = "HTTP/1.1"
+    timeout = 60
+    server: "_WebhookHTTPServer"
+
+    def do_POST(self) -> None:
+        if self.path != self.server.url_path:
+            self._respond(HTTPStatus.NOT_FOUND)
+            return
+
+        secret_token = self.headers.get(SECRET_TOKEN_HEADER, "")
+        if not hmac.compare_digest(secret_token, self.server.secret_token):
+            logger.warning(f"Rejected webhook request from {self.client_address[0]}.")
+            self._respond(HTTPStatus.FORBIDDEN)
+            return
+
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            update = Update.de_json(json.loads(body), self.server.bot)
+        except Exception as e:
+            logger.warning(f"Could not parse webhook update: {e!r}")
+            self._respond(HTTPStatus.BAD_REQUEST)
+            return
+
+        self.server.update_queue.put(update)
+        self._respond(HTTPStatus.OK)
+
+    def _respond(self, status: HTTPStatus) -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args) -> None:
+        logger.debug(format % args)
+
+
+class _WebhookHTTPServer(HTTPServer):
+    """HTTP server handling connections on a fixed pool of worker threads."""
+
+    def __init__(
+        self,
+        server_address,
+        workers: int,
+        bot: Bot,
+        update_queue: Queue,
+        url_path: str,
+        secret_token: str,
+    ) -> None:
+        super().__init__(server_address, _WebhookRequestHandler)
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="webhook")
+        self.bot = bot
+        self.update_queue = update_queue
+        self.url_path = url_path
+        self.secret_token = secret_token
+
+    def process_request(self, request, client_address) -> None:
+        self.executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.executor.shutdown(wait=False)
+
+
+class WebhookServer:
+    def __init__(
+        self,
+        bot: Bot,
+        update_queue: Queue,
+        listen: str,
+        port: int,
+        url_path: str,
+        secret_token: str,
+        workers: int,
+    ) -> None:
+        self.httpd = _WebhookHTTPServer(
+            (listen, port),
+            workers=workers,
+            bot=bot,
+            update_queue=update_queue,
+            url_path=url_path,
+            secret_token=secret_token,
+        )
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self.httpd.serve_forever, name="webhook", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Webhook server listening on port {self.port}.")
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def start_webhook(
+    updater: Updater,
+    webhook_url: str,
+    listen: str,
+    port: int,
+    url_path: str,
+    secret_token: str,
+    workers: int,
+) -> WebhookServer:
+    """Start the dispatcher and job queue of ``updater`` and serve updates on
+    ``url_path``, then register ``webhook_url`` with Telegram.
+    Stop everything with ``WebhookServer.stop`` and ``Updater.stop``.
+    """
+    updater.job_queue.start()
+    threading.Thread(
+        target=updater.dispatcher.start, name="dispatcher", daemon=True
+    ).start()
+
+    server = WebhookServer(
+        bot=updater.bot,
+        update_queue=updater.update_queue,
+        listen=listen,
+        port=port,
+        url_path=url_path,
+        secret_token=secret_token,
+        workers=workers,
+    )
+    server.start()
+
+    updater.bot.set_webhook(
+        url=webhook_url.rstrip("/") + url_path,
+        secret_token=secret_token,
+        max_connections=workers,
+    )
+    return server
@@ -0,0 +1,208 @@
+"""Notifications of subscribed travels from the Darwin Push Port feed.
+
+When ``DARWIN_FEED`` is set, subscribed travels are not polled through LDB,
+unless the TIPLOC of one of their stations is unknown, as Darwin identifies
+stations by TIPLOC.
+``DarwinConsumer`` applies every message of the feed to the ``ServiceStore``,
+matches the updated service against the ``TravelIndex`` of active travels, and
+notifies the subscribers of the travels it carries as soon as they become
+delayed or cancelled, or their disruption changes.
+
+Darwin only pushes a schedule when it changes, so the day's schedules should be
+replayed from a snapshot (``DARWIN_SNAPSHOT``) before following the live feed.
+"""
+
+import datetime
+import functools
+import logging
+import os
+import threading
+from typing import Callable, Dict, Iterable, Optional, Set, Union
+from urllib.parse import unquote, urlsplit
+
+from rail_bot.darwin.feed import FileReplayFeed, StompFeed
+from rail_bot.darwin.messages import parse_message
+from rail_bot.darwin.store import (
+    Reference,
+    ServiceStore,
+    TravelIndex,
+    TravelKey,
+    read_reference,
+)
+from rail_bot.metrics import Counter, Gauge
+from rail_bot.rail_api.stations import StationIndex, get_station_index
+from rail_bot.rail_api.travel import Travel
+
+logger = logging.getLogger(__name__)
+
+# Darwin feed replacing LDB polling of subscribed travels, either
+# stomp://[LOGIN:PASSCODE@]HOST:PORT/DESTINATION or a capture file to replay
+DARWIN_FEED = os.environ.get("DARWIN_FEED", "")
+# Capture of the day's schedules, replayed before the feed
+DARWIN_SNAPSHOT = os.environ.get("DARWIN_SNAPSHOT", "")
+# Darwin reference data file, for the TIPLOCs missing from the station table and
+# the texts of delay and cancellation reasons
+DARWIN_REFERENCE = os.environ.get("DARWIN_REFERENCE", "")
+# Durable subscription name of the STOMP feed
+DARWIN_CLIENT_ID = os.environ.get("DARWIN_CLIENT_ID") or None
+# Pace of a replayed DARWIN_FEED file relative to the original, 0 for at once
+DARWIN_REPLAY_SPEED = float(os.environ.get("DARWIN_REPLAY_SPEED", 1.0))
+
+DARWIN_MESSAGES = Counter(
+    "darwin_messages_total", "Darwin messages received.", ["result"]
+)
+DARWIN_SERVICES = Gauge("darwin_services", "Services followed through Darwin.")
+
+Feed = Union[FileReplayFeed, StompFeed]
+# Notifies the subscribers of a travel
+Notify = Callable[[str, str, datetime.time, str], None]
+
+
+class DarwinConsumer:
+    def __init__(
+        self,
+        feeds: Iterable[Feed],
+        travels: TravelIndex,
+        notify: Notify,
+        stations: Optional[StationIndex] = None,
+        reference: Optional[Reference] = None,
+        today: Callable[[], datetime.date] = datetime.date.today,
+    ) -> None:
+        self.feeds = list(feeds)
+        self.travels = travels
+        self.notify = notify
+        self.stations = stations or get_station_index()
+        self.reference = reference or Reference({}, {}, {})
+        self.today = today
+        self.store = ServiceStore(self.crs_of)
+        self.notified = 0
+
+        # Latest status notified of every travel today
+        self._statuses: Dict[TravelKey, Travel] = {}
+        self._day: Optional[datetime.date] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def crs_of(self, tiploc: str) -> Optional[str]:
+        crs = self.reference.tiplocs.get(tiploc)
+        if crs is not None:
+            return crs
+        station = self.stations.by_tiploc(tiploc)
+        return None if station is None else station.crs
+
+    def station_name(self, crs: str) -> str:
+        station = self.stations.get(crs)
+        return crs if station is None else station.name
+
+    def handle(self, message: bytes) -> int:
+        """Apply a message. Returns the number of travels notified."""
+        today = self.today()
+        if today != self._day:
+            self._day = today
+            self._statuses.clear()
+            pruned = self.store.prune(today - datetime.timedelta(days=1))
+            logger.info(f"Forgot {pruned} Darwin services of past days.")
+
+        try:
+            updates = parse_message(message)
+        except ValueError as e:
+            DARWIN_MESSAGES.labels("malformed").inc()
+            logger.warning(f"{e}: {message[:200]!r}")
+            return 0
+        DARWIN_MESSAGES.labels("parsed").inc()
+
+        notified = 0
+        for update in updates:
+            service = self.store.apply(update)
+            if service is None:
+                continue
+            for origin, destination, key in self.travels.matches(service, today):
+                travel = service.travel(
+                    origin, destination, self.station_name, self.reference
+                )
+                previous = self._statuses.get(key)
+                self._statuses[key] = travel
+                if (travel.is_delayed or travel.is_cancelled) and travel != previous:
+                    self.notify(*key, f"{travel!r}")
+                    notified += 1
+        self.notified += notified
+        return notified
+
+    def run(self) -> None:
+        for feed in self.feeds:
+            for message in feed:
+                if self._stopped.is_set():
+                    return
+                try:
+                    self.handle(message)
+                except Exception as e:
+                    DARWIN_MESSAGES.labels("failed").inc()
+                    logger.exception(f"Failed to handle a Darwin message: {e!r}")
+            logger.info(f"Darwin feed {feed!r} ended.")
+
+    def start(self) -> None:
+        DARWIN_SERVICES.set_function(lambda: len(self.store))
+        self._thread = threading.Thread(target=self.run, name="darwin", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stopped.set()
+        for feed in self.feeds:
+            feed.stop()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def create_feed(url: str, client_id: Optional[str] = None) -> Feed:
+    parts = urlsplit(url)
+    if parts.scheme == "stomp":
+        return StompFeed(
+            host=parts.hostname or "localhost",
+            port=parts.port or 61613,
+            destination=parts.path,
+            login=None if parts.username is None else unquote(parts.username),
+            passcode=None if parts.password is None else unquote(parts.password),
+            client_id=client_id,
+        )
+    return FileReplayFeed(url, speed=DARWIN_REPLAY_SPEED)
+
+
+@functools.lru_cache(maxsize=None)
+def get_darwin_reference() -> Optional[Reference]:
+    if not DARWIN_REFERENCE:
+        return None
+    with open(DARWIN_REFERENCE, "rb") as file:
+        return read_reference(file)
+
+
+def darwin_stations(stations: StationIndex, reference: Optional[Reference]) -> Set[str]:
+    """CRS codes of the stations whose TIPLOC is known, in the station table or
+    in the reference data.
+    """
+    crs = {station.crs for station in stations.with_tiploc()}
+    if reference is not None:
+        crs.update(reference.tiplocs.values())
+    return crs
+
+
+def create_travel_index() -> TravelIndex:
+    """Index of the travels followed through Darwin. Travels at stations without
+    a known TIPLOC cannot be matched, and are left to be polled.
+    """
+    reference = get_darwin_reference()
+    stations = darwin_stations(get_station_index(), reference)
+    if reference is None:
+        logger.warning(
+            f"DARWIN_REFERENCE is not set: only the {len(stations)} stations with "
+            f"a TIPLOC in the station table are followed through Darwin."
+        )
+    return TravelIndex(stations)
+
+
+def create_darwin_consumer(travels: TravelIndex, notify: Notify) -> DarwinConsumer:
+    feeds = []
+    if DARWIN_SNAPSHOT:
+        feeds.append(FileReplayFeed(DARWIN_SNAPSHOT))
+    feeds.append(create_feed(DARWIN_FEED, DARWIN_CLIENT_ID))
+
+    return DarwinConsumer(feeds, travels, notify, reference=get_darwin_reference())
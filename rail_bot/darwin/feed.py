@@ -0,0 +1,195 @@
+"""Sources of Darwin Push Port messages.
+
+``StompFeed`` subscribes to the Darwin topic of the National Rail Open Data
+STOMP broker. ``FileReplayFeed`` replays messages captured to a file, one per
+line, either as fast as possible or at a multiple of their original pace.
+"""
+
+import datetime
+import gzip
+import logging
+import re
+import socket
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_TIMESTAMP = re.compile(rb'<[^>]*?Pport[^>]*?\sts="([^"]+)"')
+
+
+def message_timestamp(message: bytes) -> Optional[datetime.datetime]:
+    """The ``ts`` attribute of a ``Pport`` message."""
+    match = _TIMESTAMP.search(message[:512])
+    if match is None:
+        return None
+    value = match.group(1).decode()
+    # Darwin uses 7 fractional digits, more than fromisoformat accepts
+    value = re.sub(r"(\.\d{6})\d+", r"\1", value)
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+class FileReplayFeed:
+    def __init__(self, path: str, speed: float = 0.0) -> None:
+        """Messages of ``path`` (gzip compressed if it ends in ``.gz``), replayed
+        ``speed`` times faster than they were published, or at once if 0.
+        """
+        self.path = path
+        self.speed = speed
+        self._stopped = threading.Event()
+
+    def __iter__(self) -> Iterator[bytes]:
+        opener = gzip.open if self.path.endswith(".gz") else open
+        first: Optional[Tuple[datetime.datetime, float]] = None
+        with opener(self.path, "rb") as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                if self._stopped.is_set():
+                    return
+                if self.speed > 0:
+                    published = message_timestamp(line)
+                    if published is not None and first is None:
+                        first = (published, time.monotonic())
+                    elif published is not None:
+                        offset = (published - first[0]).total_seconds() / self.speed
+                        delay = first[1] + offset - time.monotonic()
+                        if delay > 0 and self._stopped.wait(delay):
+                            return
+                yield line
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+class StompError(Exception):
+    pass
+
+
+class StompFeed:
+    """Message bodies of a STOMP 1.2 subscription, reconnecting when the
+    connection is lost or stays silent for ``timeout`` seconds.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        destination: str,
+        login: Optional[str] = None,
+        passcode: Optional[str] = None,
+        client_id: Optional[str] = None,
+        timeout: float = 90.0,
+        reconnect_delay: float = 5.0,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.destination = destination
+        self.login = login
+        self.passcode = passcode
+        # Makes the subscription durable, so messages are kept while offline
+        self.client_id = client_id
+        self.timeout = timeout
+        self.reconnect_delay = reconnect_delay
+        self._stopped = threading.Event()
+        self._socket: Optional[socket.socket] = None
+
+    def __iter__(self) -> Iterator[bytes]:
+        while not self._stopped.is_set():
+            try:
+                yield from self._subscribe()
+            except (OSError, StompError) as e:
+                if self._stopped.is_set():
+                    return
+                logger.warning(
+                    f"Darwin feed {self.host}:{self.port} failed: {e!r}. "
+                    f"Reconnecting in {self.reconnect_delay} s."
+                )
+                self._stopped.wait(self.reconnect_delay)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._socket is not None:
+            try:
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _subscribe(self) -> Iterator[bytes]:
+        with socket.create_connection(
+            (self.host, self.port), timeout=self.timeout
+        ) as connection:
+            self._socket = connection
+            frames = _read_frames(connection)
+
+            headers = {"accept-version": "1.2", "host": self.host, "heart-beat": "0,0"}
+            if self.login is not None:
+                headers.update(login=self.login, passcode=self.passcode or "")
+            if self.client_id is not None:
+                headers["client-id"] = self.client_id
+            connection.sendall(_frame("CONNECT", headers))
+            command, headers, body = next(frames)
+            if command != "CONNECTED":
+                raise StompError(f"{command} {headers.get('message', '')}".strip())
+            logger.info(f"Connected to the Darwin feed {self.host}:{self.port}.")
+
+            subscription = {"id": "0", "destination": self.destination, "ack": "auto"}
+            if self.client_id is not None:
+                subscription["activemq.subscriptionName"] = self.client_id
+            connection.sendall(_frame("SUBSCRIBE", subscription))
+
+            for command, headers, body in frames:
+                if command == "MESSAGE":
+                    yield body
+                elif command == "ERROR":
+                    raise StompError(
+                        headers.get("message", body.decode(errors="ignore"))
+                    )
+
+
+def _frame(command: str, headers: Dict[str, str], body: bytes = b"") -> bytes:
+    lines = [command] + [f"{name}:{value}" for name, value in headers.items()]
+    return ("\n".join(lines) + "\n\n").encode() + body + b"\0"
+
+
+def _read_frames(
+    connection: socket.socket,
+) -> Iterator[Tuple[str, Dict[str, str], bytes]]:
+    buffer = b""
+
+    def fill() -> None:
+        nonlocal buffer
+        data = connection.recv(65536)
+        if not data:
+            raise StompError("Connection closed by the broker.")
+        buffer += data
+
+    while True:
+        # Heart-beats are bare end of lines between frames
+        buffer = buffer.lstrip(b"\r\n")
+        while b"\n\n" not in buffer:
+            fill()
+            buffer = buffer.lstrip(b"\r\n")
+        head, buffer = buffer.split(b"\n\n", 1)
+        command, *lines = head.decode().replace("\r", "").split("\n")
+        headers: Dict[str, str] = {}
+        for line in lines:
+            name, _, value = line.partition(":")
+            # The first occurrence of a repeated header wins
+            headers.setdefault(name, value)
+
+        if "content-length" in headers:
+            length = int(headers["content-length"])
+            while len(buffer) < length + 1:
+                fill()
+            body, buffer = buffer[:length], buffer[length + 1 :]
+        else:
+            while b"\0" not in buffer:
+                fill()
+            body, buffer = buffer.split(b"\0", 1)
+        yield command, headers, body
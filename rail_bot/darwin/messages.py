@@ -0,0 +1,157 @@
+"""Parsing of Darwin Push Port messages.
+
+Only what is needed to follow today's passenger services is kept: schedules
+(the public calling points and cancellations), train status forecasts and
+deactivations. Elements are matched by their local name, so the messages of
+any version of the ``Pport`` schema are accepted.
+"""
+
+import datetime
+import gzip
+import xml.etree.ElementTree as ElementTree
+from typing import List, NamedTuple, Optional, Tuple, Union
+
+# Schedule locations with public times: origin, intermediate and destination
+PUBLIC_LOCATIONS = ("OR", "IP", "DT")
+
+
+class CallingPoint(NamedTuple):
+    tiploc: str
+    # Public times, None where passengers cannot board or alight
+    arrival: Optional[datetime.time]
+    departure: Optional[datetime.time]
+    cancelled: bool = False
+
+
+class Schedule(NamedTuple):
+    rid: str
+    uid: str
+    # Scheduled start date
+    ssd: datetime.date
+    calling_points: Tuple[CallingPoint, ...]
+    # Darwin reason code
+    cancel_reason: Optional[str] = None
+
+
+class Forecast(NamedTuple):
+    tiploc: str
+    # Public times, identifying the calling point
+    arrival: Optional[datetime.time]
+    departure: Optional[datetime.time]
+    # Estimated or actual times
+    estimated_arrival: Optional[datetime.time]
+    estimated_departure: Optional[datetime.time]
+    # Delayed by an unknown amount of time
+    delayed: bool = False
+
+
+class TrainStatus(NamedTuple):
+    rid: str
+    ssd: datetime.date
+    forecasts: Tuple[Forecast, ...]
+    # Darwin reason code
+    late_reason: Optional[str] = None
+
+
+class Deactivated(NamedTuple):
+    rid: str
+
+
+Update = Union[Schedule, TrainStatus, Deactivated]
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _time(value: Optional[str]) -> Optional[datetime.time]:
+    """``HH:MM`` or ``HH:MM:SS``, truncated to the minute."""
+    if not value:
+        return None
+    hour, minute = value.split(":")[:2]
+    return datetime.time(int(hour), int(minute))
+
+
+def _child_text(element: ElementTree.Element, name: str) -> Optional[str]:
+    for child in element:
+        if _local_name(child.tag) == name:
+            return (child.text or "").strip() or None
+    return None
+
+
+def _schedule(element: ElementTree.Element) -> Schedule:
+    calling_points = tuple(
+        CallingPoint(
+            tiploc=location.get("tpl", ""),
+            arrival=_time(location.get("pta")),
+            departure=_time(location.get("ptd")),
+            cancelled=location.get("can") == "true",
+        )
+        for location in element
+        if _local_name(location.tag) in PUBLIC_LOCATIONS
+    )
+    return Schedule(
+        rid=element.get("rid", ""),
+        uid=element.get("uid", ""),
+        ssd=datetime.date.fromisoformat(element.get("ssd", "")),
+        calling_points=calling_points,
+        cancel_reason=_child_text(element, "cancelReason"),
+    )
+
+
+def _forecast(location: ElementTree.Element) -> Forecast:
+    estimates = {"arr": None, "dep": None}
+    delayed = False
+    for child in location:
+        name = _local_name(child.tag)
+        if name in estimates:
+            estimates[name] = _time(child.get("at") or child.get("et"))
+            delayed = delayed or child.get("delayed") == "true"
+    return Forecast(
+        tiploc=location.get("tpl", ""),
+        arrival=_time(location.get("pta")),
+        departure=_time(location.get("ptd")),
+        estimated_arrival=estimates["arr"],
+        estimated_departure=estimates["dep"],
+        delayed=delayed,
+    )
+
+
+def _train_status(element: ElementTree.Element) -> TrainStatus:
+    forecasts = tuple(
+        _forecast(location)
+        for location in element
+        if _local_name(location.tag) == "Location"
+        and (location.get("pta") or location.get("ptd"))
+    )
+    return TrainStatus(
+        rid=element.get("rid", ""),
+        ssd=datetime.date.fromisoformat(element.get("ssd", "")),
+        forecasts=forecasts,
+        late_reason=_child_text(element, "LateReason"),
+    )
+
+
+def parse_message(data: bytes) -> List[Update]:
+    """Updates of a ``Pport`` message, gzip compressed or not. Raises
+    ``ValueError`` if it is not well-formed.
+    """
+    if data[:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    try:
+        root = ElementTree.fromstring(data)
+    except ElementTree.ParseError as e:
+        raise ValueError(f"Malformed Darwin message: {e}") from e
+
+    updates: List[Update] = []
+    # Updates (uR) and snapshot records (sR)
+    for group in root:
+        for element in group:
+            name = _local_name(element.tag)
+            if name == "schedule":
+                updates.append(_schedule(element))
+            elif name == "TS":
+                updates.append(_train_status(element))
+            elif name == "deactivated":
+                updates.append(Deactivated(rid=element.get("rid", "")))
+    return updates
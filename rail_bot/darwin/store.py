@@ -0,0 +1,293 @@
+"""In-memory state of the services followed through Darwin, and the index of
+the active travels their updates are matched against.
+"""
+
+import datetime
+import threading
+import xml.etree.ElementTree as ElementTree
+from typing import (
+    IO,
+    AbstractSet,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from rail_bot.darwin.messages import (
+    Deactivated,
+    Forecast,
+    Schedule,
+    TrainStatus,
+    Update,
+)
+from rail_bot.rail_api.travel import CANCELLED_LABEL, Travel, TravelDisruptionInfo
+
+# LDB's estimated time of a service delayed by an unknown amount of time
+DELAYED_LABEL = "Delayed"
+
+# (origin, destination, departure time) as subscribed
+TravelKey = Tuple[str, str, datetime.time]
+
+
+class Reference(NamedTuple):
+    """Darwin reference data: CRS codes of TIPLOCs, and reason texts by code."""
+
+    tiplocs: Dict[str, str]
+    late_reasons: Dict[str, str]
+    cancel_reasons: Dict[str, str]
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def read_reference(file: IO[bytes]) -> Reference:
+    """Reads a Darwin reference data file (``*_ref_v3.xml``)."""
+    reference = Reference({}, {}, {})
+    section = None
+    for event, element in ElementTree.iterparse(file, events=("start", "end")):
+        name = _local_name(element.tag)
+        if event == "start":
+            if name in ("LateRunningReasons", "CancellationReasons"):
+                section = name
+            continue
+        if name == "LocationRef" and element.get("crs"):
+            reference.tiplocs[element.get("tpl", "")] = element.get("crs", "")
+        elif name == "Reason" and section is not None:
+            reasons = (
+                reference.late_reasons
+                if section == "LateRunningReasons"
+                else reference.cancel_reasons
+            )
+            reasons[element.get("code", "")] = element.get("reasontext", "")
+        elif name in ("LateRunningReasons", "CancellationReasons"):
+            section = None
+        element.clear()
+    return reference
+
+
+class Service:
+    """A service of the timetable and its latest forecasts."""
+
+    def __init__(self, schedule: Schedule, crs_of: Callable[[str], Optional[str]]):
+        self.rid = schedule.rid
+        self.ssd = schedule.ssd
+        self.calling_points = schedule.calling_points
+        self.cancel_reason = schedule.cancel_reason
+        self.late_reason: Optional[str] = None
+        self.crs = [crs_of(point.tiploc) for point in self.calling_points]
+        self.forecasts: List[Optional[Forecast]] = [None] * len(self.calling_points)
+
+        # Date of every calling point, past midnight for overnight services
+        self.dates: List[datetime.date] = []
+        date, previous = self.ssd, None
+        for point in self.calling_points:
+            time = point.departure or point.arrival
+            if previous is not None and time is not None and time < previous:
+                date += datetime.timedelta(days=1)
+            previous = time or previous
+            self.dates.append(date)
+
+    @property
+    def cancelled(self) -> bool:
+        # The cancel reason may only apply to some calling points
+        return bool(self.calling_points) and all(
+            point.cancelled for point in self.calling_points
+        )
+
+    def update(self, status: TrainStatus) -> bool:
+        """Apply the forecasts of ``status``. Returns whether any calling point
+        was updated.
+        """
+        updated = False
+        for forecast in status.forecasts:
+            for index, point in enumerate(self.calling_points):
+                if (
+                    point.tiploc == forecast.tiploc
+                    and point.arrival == forecast.arrival
+                    and point.departure == forecast.departure
+                ):
+                    self.forecasts[index] = forecast
+                    updated = True
+                    break
+        if status.late_reason is not None:
+            self.late_reason = status.late_reason
+        return updated
+
+    def travel(
+        self,
+        origin: int,
+        destination: int,
+        names: Callable[[str], str],
+        reference: Reference,
+    ) -> Travel:
+        """Status of the journey between two calling points, as LDB reports it."""
+        departure_point = self.calling_points[origin]
+        arrival_point = self.calling_points[destination]
+        departure_forecast = self.forecasts[origin]
+        arrival_forecast = self.forecasts[destination]
+        cancelled = (
+            self.cancelled or departure_point.cancelled or arrival_point.cancelled
+        )
+
+        if cancelled:
+            estimated_departure = estimated_arrival = CANCELLED_LABEL
+        else:
+            estimated_departure = _estimate(
+                departure_point.departure,
+                departure_forecast and departure_forecast.estimated_departure,
+                departure_forecast is not None and departure_forecast.delayed,
+            )
+            estimated_arrival = _estimate(
+                arrival_point.arrival,
+                arrival_forecast and arrival_forecast.estimated_arrival,
+                arrival_forecast is not None and arrival_forecast.delayed,
+            )
+
+        late_reason = (
+            None
+            if self.late_reason is None
+            else reference.late_reasons.get(self.late_reason)
+        )
+        cancel_reason = (
+            None
+            if self.cancel_reason is None
+            else reference.cancel_reasons.get(self.cancel_reason)
+        )
+        return Travel(
+            origin=names(self.crs[origin] or departure_point.tiploc),
+            destination=names(self.crs[destination] or arrival_point.tiploc),
+            scheduled_departure=departure_point.departure,
+            estimated_departure=estimated_departure,
+            scheduled_arrival=arrival_point.arrival,
+            estimated_arrival=estimated_arrival,
+            service_type="train",
+            delay_info=TravelDisruptionInfo("DELAY", late_reason, is_active=True),
+            cancel_info=TravelDisruptionInfo("CANCEL", cancel_reason, cancelled),
+        )
+
+
+def _estimate(
+    scheduled: Optional[datetime.time],
+    estimated: Optional[datetime.time],
+    delayed: bool,
+) -> Union[datetime.time, str, None]:
+    if estimated is not None:
+        return estimated
+    return DELAYED_LABEL if delayed else scheduled
+
+
+class ServiceStore:
+    """Services by RID, kept up to date by Darwin updates."""
+
+    def __init__(self, crs_of: Callable[[str], Optional[str]]) -> None:
+        self.crs_of = crs_of
+        self._services: Dict[str, Service] = {}
+        # Train status updates of services without a schedule yet
+        self.unknown = 0
+
+    def __len__(self) -> int:
+        return len(self._services)
+
+    def get(self, rid: str) -> Optional[Service]:
+        return self._services.get(rid)
+
+    def apply(self, update: Update) -> Optional[Service]:
+        """Returns the service whose state changed, if any."""
+        if isinstance(update, Schedule):
+            service = Service(update, self.crs_of)
+            previous = self._services.get(update.rid)
+            if previous is not None:
+                # Keep the forecasts of the calling points that are still there
+                forecasts = tuple(f for f in previous.forecasts if f is not None)
+                service.update(
+                    TrainStatus(update.rid, update.ssd, forecasts, previous.late_reason)
+                )
+            self._services[update.rid] = service
+            return service
+        if isinstance(update, TrainStatus):
+            service = self._services.get(update.rid)
+            if service is None:
+                self.unknown += 1
+                return None
+            return service if service.update(update) else None
+        if isinstance(update, Deactivated):
+            self._services.pop(update.rid, None)
+        return None
+
+    def prune(self, before: datetime.date) -> int:
+        """Forget the services that started before ``before``."""
+        expired = [
+            rid for rid, service in self._services.items() if service.ssd < before
+        ]
+        for rid in expired:
+            del self._services[rid]
+        return len(expired)
+
+
+class TravelIndex:
+    """Active travels by origin CRS and departure time."""
+
+    def __init__(self, stations: Optional[AbstractSet[str]] = None) -> None:
+        # CRS codes of the stations Darwin services can be matched at; all if None
+        self.stations = stations
+        self._lock = threading.Lock()
+        # (ORIGIN, departure time) -> {DESTINATION: travel as subscribed}
+        self._travels: Dict[Tuple[str, datetime.time], Dict[str, TravelKey]] = {}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(travels) for travels in self._travels.values())
+
+    def can_follow(self, origin: str, destination: str) -> bool:
+        """Whether Darwin services can be matched at both stations of a travel."""
+        return self.stations is None or (
+            origin.upper() in self.stations and destination.upper() in self.stations
+        )
+
+    def add(self, origin: str, destination: str, departure_time: datetime.time) -> None:
+        with self._lock:
+            travels = self._travels.setdefault((origin.upper(), departure_time), {})
+            travels[destination.upper()] = (origin, destination, departure_time)
+
+    def remove(
+        self, origin: str, destination: str, departure_time: datetime.time
+    ) -> None:
+        key = (origin.upper(), departure_time)
+        with self._lock:
+            travels = self._travels.get(key, {})
+            travels.pop(destination.upper(), None)
+            if not travels:
+                self._travels.pop(key, None)
+
+    def departing(
+        self, origin: str, departure_time: datetime.time
+    ) -> Dict[str, TravelKey]:
+        """Travels from ``origin`` at ``departure_time``, by destination CRS."""
+        with self._lock:
+            return dict(self._travels.get((origin.upper(), departure_time), {}))
+
+    def matches(
+        self, service: Service, date: datetime.date
+    ) -> List[Tuple[int, int, TravelKey]]:
+        """Travels on ``date`` that ``service`` carries, with the indices of their
+        origin and destination calling points.
+        """
+        found = []
+        for origin, point in enumerate(service.calling_points):
+            crs = service.crs[origin]
+            if crs is None or point.departure is None or service.dates[origin] != date:
+                continue
+            travels = self.departing(crs, point.departure)
+            for destination in range(origin + 1, len(service.calling_points)):
+                travel = travels.get(service.crs[destination] or "")
+                if (
+                    travel is not None
+                    and service.calling_points[destination].arrival is not None
+                ):
+                    found.append((origin, destination, travel))
+        return found
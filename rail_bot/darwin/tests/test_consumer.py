@@ -0,0 +1,130 @@
+import datetime
+import pkg_resources
+import unittest
+from unittest import mock
+
+from rail_bot.darwin.consumer import DarwinConsumer, darwin_stations
+from rail_bot.darwin.feed import FileReplayFeed
+from rail_bot.darwin.messages import Schedule, TrainStatus, parse_message
+from rail_bot.darwin.store import TravelIndex, read_reference
+from rail_bot.rail_api.stations import Station, StationIndex
+
+PUSHPORT_MESSAGES = pkg_resources.resource_filename(
+    "rail_bot.darwin.tests", "resources/pushport.xml"
+)
+REFERENCE = pkg_resources.resource_filename(
+    "rail_bot.darwin.tests", "resources/reference.xml"
+)
+
+TODAY = datetime.date(2024, 1, 8)
+
+
+def messages():
+    return list(FileReplayFeed(PUSHPORT_MESSAGES))
+
+
+class TestMessages(unittest.TestCase):
+    def test_parse(self):
+        schedule, status, _, cancellation = messages()
+
+        (update,) = parse_message(schedule)
+        self.assertIsInstance(update, Schedule)
+        self.assertEqual(update.ssd, TODAY)
+        # Passing points have no public times
+        self.assertEqual(
+            [point.tiploc for point in update.calling_points],
+            ["KNGX", "STEVNGE", "CAMBDGE"],
+        )
+
+        (update,) = parse_message(status)
+        self.assertIsInstance(update, TrainStatus)
+        self.assertEqual(update.late_reason, "104")
+        self.assertEqual(update.forecasts[0].estimated_departure, datetime.time(8, 15))
+
+        (update,) = parse_message(cancellation)
+        self.assertTrue(all(point.cancelled for point in update.calling_points))
+
+    def test_malformed(self):
+        with self.assertRaises(ValueError):
+            parse_message(b"<Pport><uR>")
+
+
+class TestDarwinConsumer(unittest.TestCase):
+    def setUp(self) -> None:
+        with open(REFERENCE, "rb") as file:
+            self.reference = read_reference(file)
+        self.travels = TravelIndex()
+        self.notify = mock.Mock()
+        self.consumer = DarwinConsumer(
+            [],
+            self.travels,
+            self.notify,
+            reference=self.reference,
+            today=lambda: TODAY,
+        )
+
+    def test_reference(self):
+        self.assertEqual(self.reference.tiplocs["HITCHIN"], "HIT")
+        self.assertNotIn("FNPK", self.reference.tiplocs)
+        self.assertTrue(self.reference.late_reasons["104"].endswith("system"))
+
+    def test_darwin_stations(self):
+        stations = StationIndex(
+            [
+                Station("FPK", "Finsbury Park", "FNPK"),
+                Station("ELY", "Ely", None),
+            ]
+        )
+
+        crs = darwin_stations(stations, self.reference)
+
+        self.assertIn("FPK", crs)
+        self.assertIn("HIT", crs)
+        self.assertNotIn("ELY", crs)
+        self.assertTrue(TravelIndex(crs).can_follow("fpk", "hit"))
+        self.assertFalse(TravelIndex(crs).can_follow("fpk", "ely"))
+
+    def test_notifies_changes_of_matching_travels(self):
+        self.travels.add("kgx", "cbg", datetime.time(8))
+        self.travels.add("kgx", "svg", datetime.time(8, 1))
+
+        notified = [self.consumer.handle(message) for message in messages()]
+
+        # The delay, the same delay again, and the cancellation
+        self.assertEqual(notified, [0, 1, 0, 1])
+        (delay, _), (cancellation, _) = self.notify.call_args_list
+        self.assertEqual(delay[:3], ("kgx", "cbg", datetime.time(8)))
+        self.assertIn("signalling system", delay[3])
+        self.assertIn("London Kings Cross - Cambridge", delay[3])
+        self.assertIn("expected 08:15", delay[3])
+        self.assertIn("CANCELLED: This train has been cancelled", cancellation[3])
+
+    def test_intermediate_stations(self):
+        self.travels.add("SVG", "CBG", datetime.time(8, 23))
+        self.travels.add("CBG", "KGX", datetime.time(8, 50))
+
+        for message in messages():
+            self.consumer.handle(message)
+
+        # No forecast of Stevenage, so only the cancellation
+        (call,) = self.notify.call_args_list
+        self.assertEqual(call.args[:3], ("SVG", "CBG", datetime.time(8, 23)))
+
+    def test_other_days_are_ignored(self):
+        self.travels.add("kgx", "cbg", datetime.time(8))
+        self.consumer.today = lambda: TODAY + datetime.timedelta(days=1)
+
+        for message in messages():
+            self.consumer.handle(message)
+
+        self.notify.assert_not_called()
+
+    def test_status_before_schedule(self):
+        self.travels.add("kgx", "cbg", datetime.time(8))
+        self.assertEqual(self.consumer.handle(messages()[1]), 0)
+        self.assertEqual(self.consumer.store.unknown, 1)
+        self.assertEqual(self.consumer.handle(b"not xml"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import gzip
+import socket
+import threading
+import unittest
+
+from rail_bot.darwin.feed import StompFeed
+
+
+class FakeBroker:
+    """Accepts one connection, answers CONNECT and sends ``bodies``."""
+
+    def __init__(self, bodies) -> None:
+        self.bodies = bodies
+        self.received = b""
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.port = self.server.getsockname()[1]
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def receive(self, connection: socket.socket, frames: int) -> None:
+        while self.received.count(b"\0") < frames:
+            self.received += connection.recv(4096)
+
+    def serve(self) -> None:
+        connection, _ = self.server.accept()
+        with connection:
+            self.receive(connection, frames=1)
+            connection.sendall(b"CONNECTED\nversion:1.2\n\n\0\n")
+            self.receive(connection, frames=2)
+            for number, body in enumerate(self.bodies):
+                connection.sendall(
+                    f"MESSAGE\nsubscription:0\nmessage-id:{number}\n"
+                    f"content-length:{len(body)}\n\n".encode() + body + b"\0\n\n"
+                )
+            connection.recv(1)
+        self.server.close()
+
+
+class TestStompFeed(unittest.TestCase):
+    def test_messages(self):
+        bodies = [gzip.compress(b"<Pport/>"), b"<Pport>\0</Pport>", b"<Pport/>"]
+        broker = FakeBroker(bodies)
+        feed = StompFeed(
+            "127.0.0.1",
+            broker.port,
+            "/topic/darwin.pushport-v16",
+            login="user",
+            passcode="secret",
+            timeout=5,
+        )
+
+        received = []
+        for body in feed:
+            received.append(body)
+            if len(received) == len(bodies):
+                feed.stop()
+                break
+
+        self.assertEqual(received, bodies)
+        self.assertIn(b"login:user\npasscode:secret", broker.received)
+        self.assertIn(b"destination:/topic/darwin.pushport-v16", broker.received)
+
+
+if __name__ == "__main__":
+    unittest.main()
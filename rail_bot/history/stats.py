@@ -0,0 +1,194 @@
+"""Reliability statistics of the subscribed travels, from their history.
+
+The status a travel had on a day is its last observation of that day, the one
+closest to the departure. ``reliability`` computes the statistics of every
+travel at once with NumPy, and ``TravelHistory`` keeps them in memory between
+daily refreshes, for ``/stats`` and to adapt the polling of each travel.
+"""
+
+import datetime
+import logging
+import os
+import threading
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from rail_bot.history.store import HISTORY_DAYS, HISTORY_DIR, HistoryStore
+from rail_bot.rail_api.travel import Travel
+
+logger = logging.getLogger(__name__)
+
+# A train leaving less than this many minutes late is on time
+ON_TIME_MINUTES = float(os.environ.get("ON_TIME_MINUTES", 1))
+# Days of history needed before the polling of a travel is adapted to it
+RELIABILITY_MIN_DAYS = int(os.environ.get("RELIABILITY_MIN_DAYS", 5))
+
+# Travels at least this often on time, and never cancelled, are polled less often
+RELIABLE_ON_TIME_RATE = 0.95
+# Travels less often on time, or cancelled this often, are polled earlier and more
+UNRELIABLE_ON_TIME_RATE = 0.7
+UNRELIABLE_CANCELLED_RATE = 0.1
+
+TravelKey = Tuple[str, str, datetime.time]
+
+_KEY = np.dtype([("origin", "S3"), ("destination", "S3"), ("departure", "<u2")])
+
+
+class Reliability(NamedTuple):
+    days: int
+    on_time_rate: float
+    cancelled_rate: float
+    # Percentiles of the delay in minutes, on the days it was known; NaN if never
+    median_delay: float
+    p90_delay: float
+    max_delay: float
+
+    @property
+    def is_reliable(self) -> bool:
+        return (
+            self.days >= RELIABILITY_MIN_DAYS
+            and self.on_time_rate >= RELIABLE_ON_TIME_RATE
+            and self.cancelled_rate == 0
+        )
+
+    @property
+    def is_unreliable(self) -> bool:
+        return self.days >= RELIABILITY_MIN_DAYS and (
+            self.on_time_rate < UNRELIABLE_ON_TIME_RATE
+            or self.cancelled_rate >= UNRELIABLE_CANCELLED_RATE
+        )
+
+
+def _percentiles(
+    groups: np.ndarray, values: np.ndarray, count: int, quantiles: Tuple[float, ...]
+) -> np.ndarray:
+    """Linearly interpolated ``quantiles`` of ``values`` in each of ``count``
+    groups, as a (groups, quantiles) array, NaN for empty groups.
+    """
+    if len(values) == 0:
+        return np.full((count, len(quantiles)), np.nan)
+    order = np.lexsort((values, groups))
+    values = values[order]
+    sizes = np.bincount(groups, minlength=count)
+    starts = np.cumsum(sizes) - sizes
+
+    spans = np.maximum(sizes - 1, 0)
+    positions = starts[:, None] + spans[:, None] * np.asarray(quantiles)
+    last = len(values) - 1
+    low = np.minimum(np.floor(positions).astype(np.int64), last)
+    high = np.minimum(np.ceil(positions).astype(np.int64), last)
+    fraction = positions - np.floor(positions)
+    result = values[low] + (values[high] - values[low]) * fraction
+    result[sizes == 0] = np.nan
+    return result
+
+
+def reliability(
+    records: np.ndarray, on_time_minutes: float = ON_TIME_MINUTES
+) -> Dict[TravelKey, Reliability]:
+    """Reliability of every travel in ``records``, of dtype ``RECORD``."""
+    if len(records) == 0:
+        return {}
+
+    keys = np.empty(len(records), dtype=_KEY)
+    for field in _KEY.names:
+        keys[field] = records[field]
+    travels, travel = np.unique(keys, return_inverse=True)
+    travel = travel.reshape(-1)
+
+    # Last observation of every travel on every day
+    order = np.lexsort((records["observed"], records["day"], travel))
+    travel, day = travel[order], records["day"][order]
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = (travel[1:] != travel[:-1]) | (day[1:] != day[:-1])
+    final, travel = records[order][last], travel[last]
+
+    count = len(travels)
+    days = np.bincount(travel, minlength=count)
+    cancelled = final["cancelled"]
+    delay = final["delay"]
+    known = ~cancelled & ~np.isnan(delay)
+    on_time = np.bincount(
+        travel, weights=known & (delay < on_time_minutes), minlength=count
+    )
+    cancellations = np.bincount(travel, weights=cancelled, minlength=count)
+    percentiles = _percentiles(travel[known], delay[known], count, (0.5, 0.9, 1.0))
+
+    return {
+        (
+            origin.decode("ascii"),
+            destination.decode("ascii"),
+            datetime.time(*divmod(int(departure), 60)),
+        ): Reliability(
+            days=int(days[index]),
+            on_time_rate=float(on_time[index] / days[index]),
+            cancelled_rate=float(cancellations[index] / days[index]),
+            median_delay=float(percentiles[index, 0]),
+            p90_delay=float(percentiles[index, 1]),
+            max_delay=float(percentiles[index, 2]),
+        )
+        for index, (origin, destination, departure) in enumerate(travels.tolist())
+    }
+
+
+class TravelHistory:
+    def __init__(
+        self,
+        store: HistoryStore,
+        on_time_minutes: float = ON_TIME_MINUTES,
+        today: Callable[[], datetime.date] = datetime.date.today,
+    ) -> None:
+        self.store = store
+        self.on_time_minutes = on_time_minutes
+        self.today = today
+        self._reliability: Dict[TravelKey, Reliability] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        origin: str,
+        destination: str,
+        departure_time: datetime.time,
+        observed: datetime.datetime,
+        travel: Optional[Travel],
+    ) -> None:
+        self.store.append(origin, destination, departure_time, observed, travel)
+
+    def refresh(self, context=None, prune: bool = True) -> int:
+        """Recomputes the statistics of the retention period, up to yesterday,
+        after deleting the expired days if ``prune``. Returns the number of
+        travels.
+        """
+        today = self.today()
+        if prune:
+            self.store.prune(today)
+        records = self.store.read(
+            today - datetime.timedelta(days=self.store.days),
+            today - datetime.timedelta(days=1),
+        )
+        aggregates = reliability(records, self.on_time_minutes)
+        with self._lock:
+            self._reliability = aggregates
+        logger.info(
+            f"Computed the reliability of {len(aggregates)} travels from "
+            f"{len(records)} observations."
+        )
+        return len(aggregates)
+
+    def reliability(
+        self, origin: str, destination: str, departure_time: datetime.time
+    ) -> Optional[Reliability]:
+        key = (origin.upper(), destination.upper(), departure_time.replace(second=0))
+        with self._lock:
+            return self._reliability.get(key)
+
+
+def create_travel_history(
+    directory: str = HISTORY_DIR, days: int = HISTORY_DAYS
+) -> Optional[TravelHistory]:
+    if not directory:
+        return None
+    history = TravelHistory(HistoryStore(directory, days))
+    history.refresh()
+    return history
@@ -0,0 +1,163 @@
+"""Columnar history of the travel statuses observed by the polling jobs.
+
+Every poll appends one fixed-size ``RECORD`` to the partition of its day,
+``YYYY-MM-DD.bin`` in the history directory, so that a partition is an array
+NumPy reads back without parsing. Partitions older than the retention period
+are deleted by ``prune``.
+"""
+
+import datetime
+import logging
+import os
+import threading
+from typing import List, Optional, Set
+
+import numpy as np
+
+from rail_bot.rail_api.travel import Travel
+
+logger = logging.getLogger(__name__)
+
+# Directory of the history partitions; observed statuses are not kept if unset
+HISTORY_DIR = os.environ.get("HISTORY_DIR", "")
+# Days of history kept, and used for the statistics
+HISTORY_DAYS = int(os.environ.get("HISTORY_DAYS", 28))
+
+RECORD = np.dtype(
+    [
+        ("origin", "S3"),
+        ("destination", "S3"),
+        # Subscribed departure, in minutes of the day
+        ("departure", "<u2"),
+        # Ordinal of the day, and seconds since its midnight, of the poll
+        ("day", "<u4"),
+        ("observed", "<u4"),
+        # Minutes the train is expected to leave late, NaN if unknown
+        ("delay", "<f4"),
+        ("cancelled", "?"),
+    ]
+)
+
+_SUFFIX = ".bin"
+
+
+def _minutes(time: datetime.time) -> int:
+    return time.hour * 60 + time.minute
+
+
+def delay_minutes(travel: Travel) -> float:
+    """Minutes between the scheduled and estimated departures of ``travel``,
+    NaN if the estimate is not a time.
+    """
+    if not isinstance(travel.estimated_departure, datetime.time):
+        return float("nan")
+    delay = _minutes(travel.estimated_departure) - _minutes(travel.scheduled_departure)
+    # Across midnight
+    if delay < -12 * 60:
+        delay += 24 * 60
+    elif delay > 12 * 60:
+        delay -= 24 * 60
+    return float(delay)
+
+
+class HistoryStore:
+    def __init__(self, directory: str, days: int = HISTORY_DAYS) -> None:
+        self.directory = directory
+        self.days = days
+        self._lock = threading.Lock()
+        # Partitions appended to since the start, checked for a partial record
+        self._repaired: Set[str] = set()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, date: datetime.date) -> str:
+        return os.path.join(self.directory, f"{date.isoformat()}{_SUFFIX}")
+
+    def append(
+        self,
+        origin: str,
+        destination: str,
+        departure_time: datetime.time,
+        observed: datetime.datetime,
+        travel: Optional[Travel],
+    ) -> None:
+        """Records the status of a travel; ``None`` if no train was found."""
+        record = np.array(
+            [
+                (
+                    origin.upper().encode("ascii"),
+                    destination.upper().encode("ascii"),
+                    _minutes(departure_time),
+                    observed.toordinal(),
+                    observed.hour * 3600 + observed.minute * 60 + observed.second,
+                    float("nan") if travel is None else delay_minutes(travel),
+                    travel is None or bool(travel.is_cancelled),
+                )
+            ],
+            dtype=RECORD,
+        )
+        path = self._path(observed.date())
+        with self._lock:
+            if path not in self._repaired:
+                self._truncate_partial_record(path)
+                self._repaired.add(path)
+            with open(path, "ab") as file:
+                file.write(record.tobytes())
+
+    def _truncate_partial_record(self, path: str) -> None:
+        """Drops the partly written record the bot may have left when it stopped
+        while appending, which would shift every record appended after it.
+        """
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return
+        if size % RECORD.itemsize:
+            os.truncate(path, size - size % RECORD.itemsize)
+            logger.warning(f"Dropped a partly written record at the end of {path}.")
+
+    def partitions(self) -> List[datetime.date]:
+        dates = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(_SUFFIX):
+                continue
+            try:
+                dates.append(datetime.date.fromisoformat(name[: -len(_SUFFIX)]))
+            except ValueError:
+                continue
+        return sorted(dates)
+
+    def read(self, start: datetime.date, end: datetime.date) -> np.ndarray:
+        """Records of the days from ``start`` to ``end`` included."""
+        arrays = []
+        for date in self.partitions():
+            if start <= date <= end:
+                try:
+                    with self._lock:
+                        data = np.fromfile(self._path(date), dtype=np.uint8)
+                # Pruned by another process since it was listed
+                except FileNotFoundError:
+                    continue
+                # A record may be partly written if the bot stopped while appending
+                usable = len(data) - len(data) % RECORD.itemsize
+                arrays.append(data[:usable].view(RECORD))
+        if not arrays:
+            return np.empty(0, dtype=RECORD)
+        return np.concatenate(arrays)
+
+    def prune(self, today: datetime.date) -> int:
+        """Deletes the partitions out of the retention period. Returns their
+        number.
+        """
+        oldest = today - datetime.timedelta(days=self.days)
+        removed = 0
+        for date in self.partitions():
+            if date < oldest:
+                try:
+                    os.remove(self._path(date))
+                # Pruned by another process since it was listed
+                except FileNotFoundError:
+                    continue
+                removed += 1
+        if removed:
+            logger.info(f"Deleted {removed} history partitions before {oldest}.")
+        return removed
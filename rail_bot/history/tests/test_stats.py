@@ -0,0 +1,144 @@
+import datetime
+import math
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from rail_bot.history.stats import TravelHistory, reliability
+from rail_bot.history.store import RECORD, HistoryStore
+from rail_bot.rail_api.travel import Travel, TravelDisruptionInfo
+
+TODAY = datetime.date(2024, 1, 29)
+DEPARTURE = datetime.time(8)
+
+
+def travel(estimated, cancelled: bool = False) -> Travel:
+    return Travel(
+        origin="London Kings Cross",
+        destination="Cambridge",
+        scheduled_departure=DEPARTURE,
+        estimated_departure=estimated,
+        scheduled_arrival=datetime.time(8, 50),
+        estimated_arrival=datetime.time(8, 50),
+        service_type="train",
+        delay_info=TravelDisruptionInfo("DELAY", "Signalling", not cancelled),
+        cancel_info=TravelDisruptionInfo("CANCEL", "Signalling", cancelled),
+    )
+
+
+class TestTravelHistory(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = HistoryStore(self.directory.name, days=7)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def observe(self, days_ago: int, hour: int, minute: int, status) -> None:
+        observed = datetime.datetime.combine(
+            TODAY - datetime.timedelta(days=days_ago), datetime.time(hour, minute)
+        )
+        self.store.append("kgx", "cbg", DEPARTURE, observed, status)
+
+    def test_last_status_of_each_day(self):
+        # Delayed early in the morning, on time by departure
+        self.observe(1, 7, 0, travel(datetime.time(8, 20)))
+        self.observe(1, 7, 50, travel(DEPARTURE))
+        self.observe(2, 7, 50, travel(datetime.time(8, 4)))
+        self.observe(3, 7, 50, travel(datetime.time(8, 10)))
+        self.observe(4, 7, 50, travel("Delayed"))
+        self.observe(5, 7, 50, travel("Cancelled", cancelled=True))
+        self.observe(6, 7, 50, None)
+        self.store.append(
+            "kgx",
+            "svg",
+            DEPARTURE,
+            datetime.datetime(2024, 1, 28, 7),
+            travel(DEPARTURE),
+        )
+
+        history = TravelHistory(self.store, on_time_minutes=1, today=lambda: TODAY)
+        self.assertEqual(history.refresh(), 2)
+
+        stats = history.reliability("KGX", "CBG", DEPARTURE)
+        self.assertEqual(stats.days, 6)
+        self.assertAlmostEqual(stats.on_time_rate, 1 / 6)
+        self.assertAlmostEqual(stats.cancelled_rate, 2 / 6)
+        self.assertEqual(stats.median_delay, 4)
+        self.assertAlmostEqual(stats.p90_delay, 8.8)
+        self.assertEqual(stats.max_delay, 10)
+        self.assertTrue(stats.is_unreliable)
+        self.assertFalse(stats.is_reliable)
+        self.assertEqual(history.reliability("KGX", "SVG", DEPARTURE).days, 1)
+        self.assertIsNone(history.reliability("KGX", "CBG", datetime.time(9)))
+
+    def test_today_and_expired_days_are_left_out(self):
+        self.observe(0, 7, 50, None)
+        self.observe(9, 7, 50, None)
+
+        history = TravelHistory(self.store, today=lambda: TODAY)
+
+        self.assertEqual(history.refresh(), 0)
+        self.assertEqual(self.store.partitions(), [TODAY])
+
+    def test_pruned_by_another_process(self):
+        self.observe(1, 7, 50, travel(DEPARTURE))
+        self.observe(9, 7, 50, None)
+        partitions = self.store.partitions()
+        for date in partitions:
+            os.remove(os.path.join(self.directory.name, f"{date}.bin"))
+
+        with mock.patch.object(self.store, "partitions", return_value=partitions):
+            self.assertEqual(self.store.prune(TODAY), 0)
+            self.assertEqual(
+                len(self.store.read(TODAY - datetime.timedelta(days=7), TODAY)), 0
+            )
+
+    def test_refresh_without_pruning(self):
+        self.observe(9, 7, 50, None)
+        history = TravelHistory(self.store, today=lambda: TODAY)
+
+        history.refresh(prune=False)
+
+        self.assertEqual(len(self.store.partitions()), 1)
+
+    def test_partial_record(self):
+        self.observe(1, 7, 50, travel(DEPARTURE))
+        path = os.path.join(self.directory.name, "2024-01-28.bin")
+        with open(path, "ab") as file:
+            file.write(b"\0" * (RECORD.itemsize // 2))
+
+        records = self.store.read(TODAY - datetime.timedelta(days=1), TODAY)
+
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]["delay"], 0)
+
+    def test_appending_after_a_partial_record(self):
+        self.observe(0, 7, 40, travel(DEPARTURE))
+        path = os.path.join(self.directory.name, "2024-01-29.bin")
+        with open(path, "ab") as file:
+            file.write(b"\0" * (RECORD.itemsize // 2))
+
+        # Restarted after being stopped while appending
+        self.store = HistoryStore(self.directory.name, days=7)
+        self.observe(0, 7, 50, travel(datetime.time(8, 5)))
+        self.observe(0, 7, 55, travel(datetime.time(8, 10)))
+
+        records = self.store.read(TODAY, TODAY)
+        self.assertEqual(list(records["delay"]), [0, 5, 10])
+        self.assertEqual(os.path.getsize(path), 3 * RECORD.itemsize)
+
+    def test_no_known_delay(self):
+        self.observe(1, 7, 50, None)
+
+        (stats,) = reliability(
+            self.store.read(TODAY - datetime.timedelta(days=7), TODAY)
+        ).values()
+
+        self.assertEqual(stats.cancelled_rate, 1)
+        self.assertTrue(math.isnan(stats.median_delay))
+
+
+if __name__ == "__main__":
+    unittest.main()
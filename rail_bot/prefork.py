@@ -0,0 +1,238 @@
+"""Pre-fork mode: one master process receiving updates, forked worker processes
+handling them.
+
+The master loads what is slow to load and read-only (the LDB WSDL, the station
+table, the timetable, the database schema) before forking, so that workers
+share it copy-on-write. It then receives the updates, by polling or through
+the webhook, and routes each one to a worker by chat, over a pipe, so updates
+from a chat are still handled in order. Polling jobs are split between the
+workers by travel (``travel_owner``).
+
+The master restarts workers that exit, at most once every ``restart_delay``
+seconds each. Updates routed to a worker while it is down are dropped. By then
+the master runs threads, which a forked child would inherit with whatever locks
+they held, so restarted workers are spawned as new interpreters instead: they
+load their state themselves, and ``run`` must be importable from its module,
+which cannot be ``__main__``.
+"""
+
+import json
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+import zlib
+from multiprocessing.connection import Connection
+from typing import Callable, List, Optional
+
+from telegram import Update
+from telegram.ext import CallbackContext, Dispatcher
+
+from rail_bot.bot.job_manager import subscribe_travel_job_name
+from rail_bot.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+PREFORK_UPDATES = Counter(
+    "prefork_updates_total", "Updates routed to the workers.", ["worker", "result"]
+)
+PREFORK_RESTARTS = Counter(
+    "prefork_worker_restarts_total", "Worker processes restarted.", ["worker"]
+)
+
+# Seconds the worker's dispatcher may take to finish after the master stops it
+WORKER_STOP_TIMEOUT = 30
+
+# Function run in each worker process, with its index and its update pipe
+RunWorker = Callable[[int, Connection], None]
+
+_fork = multiprocessing.get_context("fork")
+_spawn = multiprocessing.get_context("spawn")
+
+
+def chat_worker(update: Update, workers: int) -> int:
+    """Worker handling the updates of the chat of ``update``."""
+    chat = update.effective_chat
+    return 0 if chat is None else chat.id % workers
+
+
+def travel_owner(origin: str, destination: str, departure_time, workers: int) -> int:
+    """Worker polling a travel. Stable across processes, unlike ``hash``."""
+    name = subscribe_travel_job_name(origin, destination, departure_time)
+    return zlib.crc32(name.encode("utf-8")) % workers
+
+
+def _run_worker(
+    run: RunWorker, index: int, updates: Connection, inherited: List[Connection]
+) -> None:
+    # Forked with the master's ends of the pipes, which would keep them open
+    for connection in inherited:
+        connection.close()
+    run(index, updates)
+
+
+class WorkerProcess:
+    def __init__(self, index: int, run: RunWorker) -> None:
+        # A spawned process does not import the __main__ module of the master
+        if run.__module__ == "__main__":
+            raise ValueError(f"{run.__qualname__} must not be defined in __main__.")
+        self.index = index
+        self.run = run
+        self.process: Optional[multiprocessing.process.BaseProcess] = None
+        self.updates: Optional[Connection] = None
+        self.started_at = 0.0
+        self.exited_at: Optional[float] = None
+
+    def start(self, inherited: List[Connection]) -> None:
+        """Forks the worker; ``inherited`` are the update pipes of the others."""
+        reader, writer = _fork.Pipe(duplex=False)
+        self._start(
+            _fork.Process(
+                target=_run_worker,
+                args=(self.run, self.index, reader, [*inherited, writer]),
+                name=f"rail-bot-worker-{self.index}",
+            ),
+            reader,
+            writer,
+        )
+
+    def restart(self) -> None:
+        """Spawns the worker again; a spawned process inherits no pipes."""
+        reader, writer = _spawn.Pipe(duplex=False)
+        self._start(
+            _spawn.Process(
+                target=_run_worker,
+                args=(self.run, self.index, reader, []),
+                name=f"rail-bot-worker-{self.index}",
+            ),
+            reader,
+            writer,
+        )
+
+    def _start(
+        self,
+        process: multiprocessing.process.BaseProcess,
+        reader: Connection,
+        writer: Connection,
+    ) -> None:
+        process.start()
+        reader.close()
+        self.process = process
+        self.updates = writer
+        self.started_at = time.monotonic()
+        self.exited_at = None
+        logger.info(f"Started worker {self.index} as process {process.pid}.")
+
+    def send(self, data: bytes) -> bool:
+        try:
+            self.updates.send_bytes(data)
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def stop(self) -> None:
+        """Closes the update pipe, which stops the worker once it is done."""
+        if self.updates is not None:
+            self.updates.close()
+
+
+class Master:
+    def __init__(self, workers: int, run: RunWorker, restart_delay: float) -> None:
+        self.workers: List[WorkerProcess] = [
+            WorkerProcess(index, run) for index in range(workers)
+        ]
+        self.restart_delay = restart_delay
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Forks the workers. Call before starting threads in the master."""
+        for worker in self.workers:
+            worker.start(self._pipes())
+
+    def _pipes(self) -> List[Connection]:
+        return [
+            worker.updates
+            for worker in self.workers
+            if worker.updates is not None and not worker.updates.closed
+        ]
+
+    def route(self, update: Update, context: Optional[CallbackContext] = None) -> None:
+        """Update handler of the master's dispatcher."""
+        worker = self.workers[chat_worker(update, len(self.workers))]
+        data = update.to_json().encode("utf-8")
+        with self._lock:
+            sent = worker.send(data)
+        result = "sent" if sent else "dropped"
+        PREFORK_UPDATES.labels(str(worker.index), result).inc()
+        if not sent:
+            logger.warning(
+                f"Dropped update {update.update_id}: worker {worker.index} is down."
+            )
+
+    def check_workers(self) -> int:
+        """Restarts the workers that exited, once their restart delay is over.
+        Returns the number of workers restarted.
+        """
+        restarted = 0
+        now = time.monotonic()
+        for worker in self.workers:
+            if worker.process.is_alive():
+                continue
+            if worker.exited_at is None:
+                worker.exited_at = now
+                logger.error(
+                    f"Worker {worker.index} exited with code "
+                    f"{worker.process.exitcode}."
+                )
+            # Restarted at once, unless it crashed soon after starting
+            crashed_early = worker.exited_at - worker.started_at < self.restart_delay
+            if crashed_early and now - worker.exited_at < self.restart_delay:
+                continue
+            with self._lock:
+                worker.stop()
+            worker.restart()
+            PREFORK_RESTARTS.labels(str(worker.index)).inc()
+            restarted += 1
+        return restarted
+
+    def supervise(self, stop: threading.Event, interval: float = 1.0) -> None:
+        while not stop.wait(interval):
+            self.check_workers()
+
+    def stop(self, timeout: float = WORKER_STOP_TIMEOUT) -> None:
+        with self._lock:
+            for worker in self.workers:
+                worker.stop()
+        deadline = time.monotonic() + timeout
+        for worker in self.workers:
+            worker.process.join(max(deadline - time.monotonic(), 0))
+            if worker.process.is_alive():
+                logger.warning(f"Worker {worker.index} did not stop, terminating it.")
+                worker.process.terminate()
+                worker.process.join()
+
+
+def serve_updates(updates: Connection, dispatcher: Dispatcher) -> None:
+    """Dispatches the updates the master sends to this worker, until the master
+    closes the pipe or the worker is asked to stop.
+    """
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: stop.set())
+
+    thread = threading.Thread(target=dispatcher.start, name="dispatcher")
+    thread.start()
+    try:
+        while not stop.is_set():
+            if not updates.poll(0.5):
+                continue
+            try:
+                data = updates.recv_bytes()
+            except EOFError:
+                break
+            update = Update.de_json(json.loads(data), dispatcher.bot)
+            dispatcher.update_queue.put(update)
+    finally:
+        dispatcher.stop()
+        thread.join(WORKER_STOP_TIMEOUT)
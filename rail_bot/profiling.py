@@ -0,0 +1,263 @@
+"""Span timing of callbacks, and on-demand profiles of the running bot.
+
+Callbacks decorated with ``traced`` collect the time spent in the ``span``s
+entered while they run (LDB requests, database statements, Telegram requests).
+Callbacks slower than ``SLOW_CALLBACK_BUDGET`` seconds are logged with that
+breakdown.
+
+``profiler.start`` records a profile for a number of seconds and writes it to
+``PROFILE_DIR``: either cProfile stats of a sample of the traced callbacks, or
+stacks of all threads sampled every ``STACK_SAMPLE_INTERVAL`` seconds, in the
+folded format of flamegraph.pl and speedscope.
+"""
+
+import cProfile
+import collections
+import datetime
+import functools
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+from rail_bot.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Callbacks running longer than this many seconds are logged
+SLOW_CALLBACK_BUDGET = float(os.environ.get("SLOW_CALLBACK_BUDGET", 2.0))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+STACK_SAMPLE_INTERVAL = 0.01
+
+CPROFILE = "cprofile"
+STACK = "stack"
+PROFILE_MODES = (CPROFILE, STACK)
+
+CALLBACK_SECONDS = Histogram(
+    "callback_seconds", "Duration of handler and job callbacks.", ["callback"]
+)
+
+
+class Trace:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.start = time.perf_counter()
+        self.depth = 0
+        # Span name -> [count, total seconds]
+        self.spans: Dict[str, List[float]] = {}
+        # Spans entered inside other spans, not counted again in "other"
+        self.nested: Set[str] = set()
+
+    def add(self, name: str, duration: float) -> None:
+        span = self.spans.setdefault(name, [0, 0.0])
+        span[0] += 1
+        span[1] += duration
+        if self.depth > 0:
+            self.nested.add(name)
+
+    def breakdown(self, elapsed: float) -> str:
+        parts = [
+            f"{name} {count:.0f}x {total:.3f} s"
+            for name, (count, total) in sorted(
+                self.spans.items(), key=lambda item: -item[1][1]
+            )
+        ]
+        other = elapsed - sum(
+            total for name, (_, total) in self.spans.items() if name not in self.nested
+        )
+        parts.append(f"other {max(other, 0.0):.3f} s")
+        return ", ".join(parts)
+
+
+_local = threading.local()
+
+
+def add_span(name: str, duration: float) -> None:
+    """Count ``duration`` seconds towards the callback running in this thread."""
+    trace: Optional[Trace] = getattr(_local, "trace", None)
+    if trace is not None:
+        trace.add(name, duration)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    trace: Optional[Trace] = getattr(_local, "trace", None)
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    trace.depth += 1
+    try:
+        yield
+    finally:
+        trace.depth -= 1
+        trace.add(name, time.perf_counter() - start)
+
+
+def traced(name: str, budget: Optional[float] = None):
+    """Decorator timing a callback and the spans it enters."""
+
+    def decorator(callback: Callable) -> Callable:
+        histogram = CALLBACK_SECONDS.labels(name)
+
+        @functools.wraps(callback)
+        def wrapper(*args, **kwargs):
+            if getattr(_local, "trace", None) is not None:
+                # Called from another traced callback: only a span of it
+                with span(name):
+                    return callback(*args, **kwargs)
+
+            trace = _local.trace = Trace(name)
+            profile = profiler.callback_profile()
+            try:
+                if profile is None:
+                    return callback(*args, **kwargs)
+                return profile.runcall(callback, *args, **kwargs)
+            finally:
+                _local.trace = None
+                elapsed = time.perf_counter() - trace.start
+                histogram.observe(elapsed)
+                if profile is not None:
+                    profiler.add_callback_profile(profile)
+                limit = SLOW_CALLBACK_BUDGET if budget is None else budget
+                if elapsed > limit:
+                    logger.warning(
+                        f"{name} took {elapsed:.3f} s, over its {limit} s budget: "
+                        f"{trace.breakdown(elapsed)}."
+                    )
+
+        return wrapper
+
+    return decorator
+
+
+class Profiler:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.mode: Optional[str] = None
+        self._sample_rate = 1.0
+        self._stats: Optional[pstats.Stats] = None
+        self._stacks: Dict[str, int] = {}
+        self._done = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self.mode is not None
+
+    def start(
+        self,
+        mode: str,
+        duration: float,
+        directory: str = PROFILE_DIR,
+        sample_rate: float = 1.0,
+        on_done: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        """Profile for ``duration`` seconds in a background thread, then write the
+        profile to ``directory`` and call ``on_done`` with its path.
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode {mode!r}.")
+        with self._lock:
+            if self.mode is not None:
+                raise RuntimeError(f"A {self.mode} profile is already running.")
+            self.mode = mode
+            self._sample_rate = sample_rate
+            self._stats = None
+            self._stacks = {}
+            self._done.clear()
+
+        thread = threading.Thread(
+            target=self._run,
+            args=(mode, duration, directory, on_done),
+            name="profiler",
+            daemon=True,
+        )
+        thread.start()
+
+    def _run(
+        self,
+        mode: str,
+        duration: float,
+        directory: str,
+        on_done: Optional[Callable[[str], None]],
+    ) -> None:
+        if mode == STACK:
+            self._sample_stacks(duration)
+        else:
+            self._done.wait(duration)
+
+        with self._lock:
+            self.mode = None
+            stats, stacks = self._stats, self._stacks
+
+        os.makedirs(directory, exist_ok=True)
+        name = f"{datetime.datetime.now():%Y%m%dT%H%M%S}-{mode}"
+        if mode == STACK:
+            path = os.path.join(directory, f"{name}.folded")
+            with open(path, "w") as file:
+                for stack, count in sorted(stacks.items()):
+                    file.write(f"{stack} {count}\n")
+        else:
+            path = os.path.join(directory, f"{name}.pstats")
+            if stats is None:
+                open(path, "w").close()
+            else:
+                stats.dump_stats(path)
+        logger.info(f"Wrote {mode} profile to {path}.")
+
+        if on_done is not None:
+            on_done(path)
+
+    def stop(self) -> None:
+        self._done.set()
+
+    def callback_profile(self) -> Optional[cProfile.Profile]:
+        if self.mode != CPROFILE:
+            return None
+        if self._sample_rate < 1.0 and random.random() >= self._sample_rate:
+            return None
+        return cProfile.Profile()
+
+    def add_callback_profile(self, profile: cProfile.Profile) -> None:
+        with self._lock:
+            if self.mode != CPROFILE:
+                return
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+
+    def _sample_stacks(self, duration: float) -> None:
+        stacks: Dict[str, int] = collections.Counter()
+        own_thread = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        deadline = time.monotonic() + duration
+        while not self._done.wait(STACK_SAMPLE_INTERVAL):
+            if time.monotonic() > deadline:
+                break
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                functions = []
+                while frame is not None:
+                    code = frame.f_code
+                    functions.append(
+                        f"{code.co_name} ({os.path.basename(code.co_filename)})"
+                    )
+                    frame = frame.f_back
+                thread_name = names.get(thread_id)
+                if thread_name is None:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                    thread_name = names.get(thread_id, str(thread_id))
+                functions.append(thread_name)
+                stacks[";".join(reversed(functions))] += 1
+        with self._lock:
+            self._stacks = dict(stacks)
+
+
+profiler = Profiler()
@@ -1,20 +1,60 @@
+import functools
 import logging
 import os
-from typing import Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
 
 from zeep import helpers, xsd
 from zeep.client import Client
-from zeep.plugins import HistoryPlugin
+from zeep.exceptions import Fault
 
-from rail_bot.rail_api.travel import Travel, ON_TIME_LABEL
+from rail_bot.metrics import Counter, Histogram
+from rail_bot.profiling import span
+from rail_bot.rail_api.board import Board, BoardCache, parse_board
+from rail_bot.rail_api.capture import capture
+from rail_bot.rail_api.hedging import (
+    LDB_HEDGE_DELAY_SECONDS,
+    LDB_HEDGE_WORKERS,
+    LDB_HEDGING,
+    Hedger,
+)
+from rail_bot.rail_api.response_cache import (
+    SERVICE_CACHE_TTL,
+    STATION_CACHE_TTL,
+    decode_board,
+    decode_flag,
+    decode_travel,
+    encode_board,
+    encode_flag,
+    encode_travel,
+    get_response_cache,
+)
+from rail_bot.rail_api.travel import Travel
 
 logger = logging.getLogger(__name__)
 
 
 LDB_TOKEN = os.environ.get("LDB_TOKEN", "")
-WSDL = "http://lite.realtime.nationalrail.co.uk/OpenLDBWS/wsdl.aspx?ver=2017-10-01"
+# Point at a stand-in server, such as benchmarks/fake_ldb.py, for load tests
+WSDL = os.environ.get(
+    "LDB_WSDL",
+    "http://lite.realtime.nationalrail.co.uk/OpenLDBWS/wsdl.aspx?ver=2017-10-01",
+)
+
+# How long fetched departure boards are shared between requests, in seconds
+BOARD_CACHE_TTL = float(os.environ.get("BOARD_CACHE_TTL", 30))
+# Boards are fetched with at least this many rows, so shorter requests share them
+BOARD_FETCH_ROWS = 10
+# How long expired boards are kept, to answer with when the bot is overloaded
+BOARD_STALE_TTL = float(os.environ.get("BOARD_STALE_TTL", 10 * 60))
+
+
+@functools.lru_cache(maxsize=None)
+def get_client() -> Client:
+    """The SOAP client, created on first use: loading the WSDL is a network call."""
+    return Client(wsdl=WSDL)
 
-client = Client(wsdl=WSDL, plugins=[HistoryPlugin()])
 
 header = xsd.Element(
     "{http://thalesgroup.com/RTTI/2013-11-28/Token/types}AccessToken",
@@ -29,10 +69,132 @@ header = xsd.Element(
 )
 header_value = header(TokenValue=LDB_TOKEN)
 
+board_cache = BoardCache(ttl=BOARD_CACHE_TTL, stale_ttl=BOARD_STALE_TTL)
 
-def departure_board(
+LDB_REQUEST_SECONDS = Histogram(
+    "ldb_request_seconds", "LDB SOAP request latency.", ["operation"]
+)
+LDB_REQUEST_ERRORS = Counter(
+    "ldb_request_errors_total", "Failed LDB SOAP requests.", ["operation"]
+)
+
+
+@functools.lru_cache(maxsize=None)
+def get_board_hedger() -> Optional[Hedger]:
+    if not LDB_HEDGING:
+        return None
+    executor = ThreadPoolExecutor(LDB_HEDGE_WORKERS, thread_name_prefix="ldb-hedge")
+    hedger = Hedger("GetDepBoardWithDetails", executor)
+    LDB_HEDGE_DELAY_SECONDS.set_function(lambda: hedger.delay() or 0.0)
+    return hedger
+
+
+def call_ldb(operation: str, **kwargs: Any) -> Any:
+    buffer = capture.buffer
+    if buffer is not None and not buffer.sampled():
+        buffer = None
+
+    start = time.perf_counter()
+    try:
+        with span(f"ldb.{operation}"):
+            response = get_client().service[operation](
+                _soapheaders=[header_value], **kwargs
+            )
+    except Exception as e:
+        LDB_REQUEST_ERRORS.labels(operation).inc()
+        if buffer is not None:
+            buffer.add(operation, kwargs, time.perf_counter() - start, error=e)
+        raise
+    finally:
+        LDB_REQUEST_SECONDS.labels(operation).observe(time.perf_counter() - start)
+
+    if buffer is not None:
+        buffer.add(operation, kwargs, time.perf_counter() - start, response)
+    return response
+
+
+# Fault message of LDB for a station code it does not know
+INVALID_CRS_FAULT = "invalid crs"
+
+
+@functools.lru_cache(maxsize=4096)
+def station_exists(crs: str) -> bool:
+    """Whether LDB knows the station ``crs``, for the codes missing from an
+    incomplete station table. Errors other than LDB rejecting the code are raised,
+    and not cached.
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return _check_station(crs)
+    return cache.cached(
+        "station",
+        crs.upper(),
+        STATION_CACHE_TTL,
+        lambda: _check_station(crs),
+        encode_flag,
+        decode_flag,
+    )
+
+
+def _check_station(crs: str) -> bool:
+    try:
+        call_ldb("GetDepartureBoard", numRows=1, crs=crs.upper())
+    except Fault as e:
+        if INVALID_CRS_FAULT in (e.message or "").lower():
+            return False
+        raise
+    return True
+
+
+def _fetch_board(
+    from_station: str, to_station: Optional[str], rows: int
+) -> Optional[Board]:
+    def request() -> Any:
+        return call_ldb(
+            "GetDepBoardWithDetails",
+            numRows=rows,
+            crs=from_station,
+            filterCrs=to_station,
+        )
+
+    hedger = get_board_hedger()
+    if hedger is None:
+        res = request()
+    else:
+        # The requests run on the hedger's threads, outside of the callback's trace
+        with span("ldb.GetDepBoardWithDetails"):
+            res = hedger.call(request)
+    with span("ldb.parse"):
+        return parse_board(res)
+
+
+def fetch_board(
+    from_station: str, to_station: Optional[str], rows: int
+) -> Optional[Board]:
+    """Board from LDB, or from the response cache of the host if enabled."""
+    cache = get_response_cache()
+    if cache is None:
+        return _fetch_board(from_station, to_station, rows)
+    return cache.cached(
+        "board",
+        f"{from_station}:{to_station or ''}:{rows}",
+        BOARD_CACHE_TTL,
+        lambda: _fetch_board(from_station, to_station, rows),
+        encode_board,
+        decode_board,
+    )
+
+
+class BoardUnavailableError(LookupError):
+    pass
+
+
+def render_board(
     from_station: str, to_station: Optional[str], rows: Optional[int] = None
-):
+) -> str:
+    """Text of the departure board. Raises ``BoardUnavailableError`` if LDB has
+    no board for the stations, and the errors of the LDB call.
+    """
     from_station = from_station.upper()
 
     if to_station is not None:
@@ -41,55 +203,100 @@ def departure_board(
     if rows is None:
         rows = 10
 
-    try:
-        res = client.service.GetDepBoardWithDetails(
-            numRows=rows,
-            crs=from_station,
-            filterCrs=to_station,
-            _soapheaders=[header_value],
-        )
-    except Exception as e:
-        return (
-            f"Something bad just happened... Check if the input to the"
-            f" departure board command is correct."
-            f"(Details: {e!r}."
-        )
+    cached = board_cache.get(
+        (from_station, to_station),
+        max(rows, BOARD_FETCH_ROWS),
+        lambda fetch_rows: fetch_board(from_station, to_station, fetch_rows),
+    )
 
-    if res.trainServices is None:
+    text = cached.render(rows)
+    if text is None:
         _to = f" to {to_station!r}" if to_station is not None else ""
-        return (
+        raise BoardUnavailableError(
             f"Could not retrieve board information for trains from {from_station}"
             f"{_to}. Are the station codes correct?"
         )
 
-    msg = f"Trains at {res.locationName}\n"
-    for service in res.trainServices.service:
-        destination = service.destination.location[0].locationName
-        msg += f"{service.std} {destination}"
-        if service.etd != ON_TIME_LABEL:
-            msg += f" - {service.etd}"
+    return text
+
+
+def board_error_text(error: Exception) -> str:
+    """Reply to a board that could not be rendered."""
+    if isinstance(error, BoardUnavailableError):
+        return str(error)
+    return (
+        f"Something bad just happened... Check if the input to the"
+        f" departure board command is correct."
+        f"(Details: {error!r}."
+    )
+
+
+def departure_board(
+    from_station: str, to_station: Optional[str], rows: Optional[int] = None
+) -> str:
+    try:
+        return render_board(from_station, to_station, rows)
+    except Exception as e:
+        return board_error_text(e)
 
-        if service.platform is not None:
-            msg += f" (Platform {service.platform})"
 
-        msg += "\n"
+def cached_departure_board(
+    from_station: str, to_station: Optional[str], rows: int = 10
+) -> Optional[str]:
+    """Last board fetched for the stations, with its age, without calling LDB.
+    None if there is none.
+    """
+    from_station = from_station.upper()
+    if to_station is not None:
+        to_station = to_station.upper()
 
-    return msg
+    cached = board_cache.peek((from_station, to_station), rows)
+    if cached is None:
+        return None
+    text = cached.render(rows)
+    if text is None:
+        return None
+    return f"{text}(As of {board_cache.age(cached):.0f} seconds ago.)"
 
 
 def next_departure_status(
     from_station: str, to_station: str, timeOffset: int = 0
 ) -> Optional[Travel]:
-    res = client.service.GetNextDeparturesWithDetails(
+    """Status of the next departure, shared for ``SERVICE_CACHE_TTL`` seconds by
+    the processes of the host if the response cache is enabled. Responses that
+    could not be parsed are not cached.
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return _next_departure_status(from_station, to_station, timeOffset)
+    return cache.cached(
+        "service",
+        f"{from_station.upper()}:{to_station.upper()}:{timeOffset}",
+        SERVICE_CACHE_TTL,
+        lambda: _next_departure_status(from_station, to_station, timeOffset),
+        encode_travel,
+        decode_travel,
+        cache_if=lambda travel: travel is not None,
+    )
+
+
+def _next_departure_status(
+    from_station: str, to_station: str, timeOffset: int = 0
+) -> Optional[Travel]:
+    res = call_ldb(
+        "GetNextDeparturesWithDetails",
         crs=from_station.upper(),
         filterList=[to_station.upper()],
         timeOffset=timeOffset,
-        _soapheaders=[header_value],
     )
-    response = helpers.serialize_object(res, dict)
     try:
-        travel = Travel.from_response(response)
+        with span("ldb.parse"):
+            travel = Travel.from_response(helpers.serialize_object(res, dict))
     except Exception as e:
         travel = None
-        logger.warning(f"Failed to create Travel object from response {response}: {e}")
+        logger.warning(
+            f"Failed to create Travel object from the {from_station.upper()} - "
+            f"{to_station.upper()} response: {e!r}. Enable LDB_CAPTURE_SIZE to "
+            "capture responses."
+        )
     return travel
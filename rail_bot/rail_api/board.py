@@ -0,0 +1,207 @@
+"""Departure boards, parsed once and shared between everyone asking for them.
+
+Fetched boards are kept as structured rows for ``BOARD_CACHE_TTL`` seconds.
+Each cached board memoizes its rendered text per number of rows, so identical
+requests within the TTL, concurrent or not, get the same string without
+another LDB call or any formatting.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from rail_bot.rail_api.travel import ON_TIME_LABEL
+
+# (origin CRS, destination CRS or None)
+BoardKey = Tuple[str, Optional[str]]
+
+
+class BoardRow(NamedTuple):
+    std: str
+    destination: str
+    etd: str
+    platform: Optional[str]
+
+
+class Board(NamedTuple):
+    location_name: str
+    rows: Tuple[BoardRow, ...]
+
+
+def parse_board(response: Any) -> Optional[Board]:
+    """Board from a ``GetDepBoardWithDetails`` response, None without services."""
+    if response.trainServices is None:
+        return None
+
+    return Board(
+        location_name=response.locationName,
+        rows=tuple(
+            BoardRow(
+                std=service.std,
+                destination=service.destination.location[0].locationName,
+                etd=service.etd,
+                platform=service.platform,
+            )
+            for service in response.trainServices.service
+        ),
+    )
+
+
+def _format_row(row: BoardRow) -> str:
+    parts = [row.std, " ", row.destination]
+    if row.etd != ON_TIME_LABEL:
+        parts += (" - ", row.etd)
+    if row.platform is not None:
+        parts += (" (Platform ", row.platform, ")")
+    return "".join(parts)
+
+
+def render_board(board: Board, rows: int) -> str:
+    lines = [f"Trains at {board.location_name}"]
+    lines.extend(_format_row(row) for row in board.rows[:rows])
+    lines.append("")
+    return "\n".join(lines)
+
+
+class CachedBoard:
+    def __init__(
+        self, board: Optional[Board], fetched_rows: int, expires_at: float
+    ) -> None:
+        self.board = board
+        self.fetched_rows = fetched_rows
+        self.expires_at = expires_at
+        # Requests served by this board after it was fetched
+        self.hits = 0
+        self._renders: Dict[int, str] = {}
+
+    def render(self, rows: int) -> Optional[str]:
+        if self.board is None:
+            return None
+        text = self._renders.get(rows)
+        if text is None:
+            # Racing renders produce the same text; keep whichever came first
+            text = self._renders.setdefault(rows, render_board(self.board, rows))
+        return text
+
+
+class BoardCache:
+    def __init__(
+        self,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+        stale_ttl: float = 0.0,
+    ):
+        self.ttl = ttl
+        self.clock = clock
+        # Seconds expired boards are kept for ``peek``
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._boards: Dict[BoardKey, CachedBoard] = {}
+        # Fetches in progress; concurrent requests for the same board wait on them
+        self._fetches: Dict[BoardKey, "Future[CachedBoard]"] = {}
+
+    def get(
+        self,
+        key: BoardKey,
+        rows: int,
+        fetch: Callable[[int], Optional[Board]],
+        min_ttl: float = 0.0,
+    ) -> CachedBoard:
+        """Cached board with at least ``rows`` rows requested from LDB, and not
+        expiring within ``min_ttl`` seconds, calling ``fetch(rows)`` if there is
+        none. Errors are raised and not cached.
+        """
+        with self._lock:
+            cached = self._boards.get(key)
+            if (
+                cached is not None
+                and cached.expires_at > self.clock() + min_ttl
+                and cached.fetched_rows >= rows
+            ):
+                self.hits += 1
+                cached.hits += 1
+                return cached
+
+            future = self._fetches.get(key)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = self._fetches[key] = Future()
+
+        if not owner:
+            cached = future.result()
+            if cached.fetched_rows >= rows:
+                cached.hits += 1
+                return cached
+            # The fetch in progress asked for fewer rows: fetch again
+            return self.get(key, rows, fetch, min_ttl)
+
+        try:
+            cached = CachedBoard(fetch(rows), rows, self.clock() + self.ttl)
+        except BaseException as e:
+            with self._lock:
+                del self._fetches[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._fetches[key]
+            self._boards[key] = cached
+            self._evict_expired()
+        future.set_result(cached)
+        return cached
+
+    def prefetch(
+        self,
+        key: BoardKey,
+        rows: int,
+        fetch: Callable[[int], Optional[Board]],
+        min_ttl: float = 0.0,
+    ) -> Optional[CachedBoard]:
+        """Fetches a board ahead of the requests for it, unless it is cached and
+        does not expire within ``min_ttl`` seconds. Returns the board fetched,
+        None if it was cached.
+        """
+        with self._lock:
+            cached = self._boards.get(key)
+            if (
+                cached is not None
+                and cached.expires_at > self.clock() + min_ttl
+                and cached.fetched_rows >= rows
+            ):
+                return None
+        cached = self.get(key, rows, fetch, min_ttl)
+        # Fetched by a request in the meantime
+        if cached.hits:
+            return None
+        return cached
+
+    def peek(self, key: BoardKey, rows: int) -> Optional[CachedBoard]:
+        """Board with at least ``rows`` rows, expired or not, without fetching."""
+        with self._lock:
+            cached = self._boards.get(key)
+            if cached is None or cached.fetched_rows < rows:
+                return None
+            if cached.expires_at + self.stale_ttl <= self.clock():
+                return None
+            return cached
+
+    def age(self, cached: CachedBoard) -> float:
+        """Seconds since ``cached`` was fetched."""
+        return self.clock() - (cached.expires_at - self.ttl)
+
+    def _evict_expired(self) -> None:
+        now = self.clock() - self.stale_ttl
+        expired: List[BoardKey] = [
+            key for key, cached in self._boards.items() if cached.expires_at <= now
+        ]
+        for key in expired:
+            del self._boards[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._boards.clear()
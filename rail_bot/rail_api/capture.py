@@ -0,0 +1,145 @@
+"""Opt-in capture of recent LDB exchanges, to be dumped as test fixtures.
+
+Captured exchanges are kept in a ring buffer of ``LDB_CAPTURE_SIZE`` entries
+(capture is off if 0). A ``LDB_CAPTURE_SAMPLE_RATE`` fraction of the calls is
+captured, and responses larger than ``LDB_CAPTURE_MAX_BYTES`` once serialized
+are dropped. When capture is off, an LDB call only checks one attribute.
+
+Dumped responses have the format of the fixtures in ``rail_api/tests/resources``.
+"""
+
+import datetime
+import json
+import os
+import random
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, NamedTuple, Optional
+
+from zeep import helpers
+
+LDB_CAPTURE_SIZE = int(os.environ.get("LDB_CAPTURE_SIZE", 0))
+LDB_CAPTURE_SAMPLE_RATE = float(os.environ.get("LDB_CAPTURE_SAMPLE_RATE", 1.0))
+LDB_CAPTURE_MAX_BYTES = int(os.environ.get("LDB_CAPTURE_MAX_BYTES", 256 * 1024))
+LDB_CAPTURE_DIR = os.environ.get("LDB_CAPTURE_DIR", "ldb-captures")
+
+
+class Exchange(NamedTuple):
+    operation: str
+    params: Dict[str, Any]
+    captured_at: datetime.datetime
+    duration: float
+    # JSON of the serialized response, or None if it was too large
+    response: Optional[str]
+    error: Optional[str]
+
+
+def _to_json(value: Any) -> str:
+    return json.dumps(helpers.serialize_object(value, dict), indent=4, default=str)
+
+
+class CaptureBuffer:
+    def __init__(
+        self,
+        size: int,
+        sample_rate: float = 1.0,
+        max_bytes: int = LDB_CAPTURE_MAX_BYTES,
+    ) -> None:
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.captured = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._exchanges: Deque[Exchange] = deque(maxlen=size)
+
+    @property
+    def size(self) -> int:
+        return self._exchanges.maxlen or 0
+
+    def sampled(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def add(
+        self,
+        operation: str,
+        params: Dict[str, Any],
+        duration: float,
+        response: Any = None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        response_json = None if response is None else _to_json(response)
+        if response_json is not None and len(response_json) > self.max_bytes:
+            response_json = None
+            self.dropped += 1
+
+        exchange = Exchange(
+            operation=operation,
+            params=dict(params),
+            captured_at=datetime.datetime.now(),
+            duration=duration,
+            response=response_json,
+            error=None if error is None else repr(error),
+        )
+        with self._lock:
+            self._exchanges.append(exchange)
+            self.captured += 1
+
+    def exchanges(self) -> List[Exchange]:
+        with self._lock:
+            return list(self._exchanges)
+
+    def dump(self, directory: str) -> List[str]:
+        """Write the captured responses as fixture files, plus an ``index.json``
+        describing every exchange. Returns the paths of the fixture files.
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        index = []
+        for number, exchange in enumerate(self.exchanges()):
+            entry = {
+                "operation": exchange.operation,
+                "params": exchange.params,
+                "captured_at": exchange.captured_at.isoformat(),
+                "duration": exchange.duration,
+                "error": exchange.error,
+                "file": None,
+            }
+            if exchange.response is not None:
+                name = (
+                    f"{exchange.captured_at:%Y%m%dT%H%M%S}-{number:04}-"
+                    f"{exchange.operation}.json"
+                )
+                with open(os.path.join(directory, name), "w") as file:
+                    file.write(exchange.response)
+                entry["file"] = name
+                paths.append(os.path.join(directory, name))
+            index.append(entry)
+
+        with open(os.path.join(directory, "index.json"), "w") as file:
+            json.dump(index, file, indent=4, default=str)
+        return paths
+
+    def __repr__(self) -> str:
+        return (
+            f"CaptureBuffer(size={self.size}, sample_rate={self.sample_rate}, "
+            f"captured={self.captured}, dropped={self.dropped})"
+        )
+
+
+class Capture:
+    """The current capture buffer, or None while capture is off."""
+
+    def __init__(self) -> None:
+        self.buffer: Optional[CaptureBuffer] = None
+
+    def start(self, size: int, sample_rate: float = LDB_CAPTURE_SAMPLE_RATE) -> None:
+        self.buffer = CaptureBuffer(size, sample_rate)
+
+    def stop(self) -> Optional[CaptureBuffer]:
+        buffer, self.buffer = self.buffer, None
+        return buffer
+
+
+capture = Capture()
+if LDB_CAPTURE_SIZE > 0:
+    capture.start(LDB_CAPTURE_SIZE)
@@ -0,0 +1,175 @@
+"""Hedged requests: a second identical request when the first one is slow.
+
+A few slow LDB responses set the tail latency of ``/board``. ``Hedger.call``
+runs a request on a thread pool and, if it has not answered within the
+``quantile`` of the recent latencies, sends the same request again and returns
+whichever answers first. The slow request is not cancelled, so hedges are
+extra load on LDB: they are limited to a ``budget`` fraction of the requests.
+
+Latencies are tracked in a histogram of logarithmic buckets whose counts decay,
+so the quantile follows LDB when it slows down or recovers.
+"""
+
+import bisect
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional, TypeVar
+
+from rail_bot.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+# Hedge GetDepBoardWithDetails requests slower than the quantile of the latencies
+LDB_HEDGING = os.environ.get("LDB_HEDGING", "") not in ("", "0")
+LDB_HEDGE_QUANTILE = float(os.environ.get("LDB_HEDGE_QUANTILE", 0.95))
+# Hedges allowed, as a fraction of the requests
+LDB_HEDGE_BUDGET = float(os.environ.get("LDB_HEDGE_BUDGET", 0.05))
+# Threads running hedged requests, both the first and the second one
+LDB_HEDGE_WORKERS = int(os.environ.get("LDB_HEDGE_WORKERS", 16))
+
+LDB_HEDGES = Counter(
+    "ldb_hedges_total",
+    "Outcomes of hedged LDB requests: no hedge needed, hedge not in the budget, "
+    "first or hedged request answering first.",
+    ["operation", "outcome"],
+)
+LDB_HEDGE_DELAY_SECONDS = Gauge(
+    "ldb_hedge_delay_seconds", "Latency after which LDB requests are hedged."
+)
+
+R = TypeVar("R")
+
+FAST = "fast"
+NO_BUDGET = "no_budget"
+FIRST_WON = "first_won"
+HEDGE_WON = "hedge_won"
+
+
+class LatencyHistogram:
+    """Decaying histogram of latencies, for online quantile estimates."""
+
+    def __init__(
+        self,
+        low: float = 0.01,
+        high: float = 60.0,
+        buckets_per_doubling: int = 4,
+        half_life: int = 1000,
+        min_count: int = 20,
+    ) -> None:
+        doublings = math.log2(high / low)
+        count = int(math.ceil(doublings * buckets_per_doubling))
+        # Upper bounds of the buckets; the last one takes everything above
+        self.bounds: List[float] = [
+            low * 2 ** (index / buckets_per_doubling) for index in range(count + 1)
+        ]
+        self.counts = [0.0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        # Counts are halved every ``half_life`` observations
+        self.half_life = half_life
+        self.min_count = min_count
+        self._observations = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+            self.total += 1
+            self._observations += 1
+            if self._observations % self.half_life == 0:
+                self.counts = [count / 2 for count in self.counts]
+                self.total /= 2
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket of the ``q`` quantile, None until
+        ``min_count`` latencies were observed.
+        """
+        with self._lock:
+            if self._observations < self.min_count:
+                return None
+            rank = q * self.total
+            cumulative = 0.0
+            for index, count in enumerate(self.counts):
+                cumulative += count
+                if cumulative >= rank:
+                    return self.bounds[min(index, len(self.bounds) - 1)]
+            return self.bounds[-1]
+
+
+class Hedger:
+    def __init__(
+        self,
+        operation: str,
+        executor: ThreadPoolExecutor,
+        quantile: float = LDB_HEDGE_QUANTILE,
+        budget: float = LDB_HEDGE_BUDGET,
+        latencies: Optional[LatencyHistogram] = None,
+        max_tokens: float = 10.0,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        self.operation = operation
+        self.executor = executor
+        self.quantile = quantile
+        self.budget = budget
+        self.latencies = latencies or LatencyHistogram()
+        self.clock = clock
+        # Every request earns ``budget`` of a hedge, up to ``max_tokens``
+        self.max_tokens = max_tokens
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+        self._outcomes = {
+            outcome: LDB_HEDGES.labels(operation, outcome)
+            for outcome in (FAST, NO_BUDGET, FIRST_WON, HEDGE_WON)
+        }
+
+    def delay(self) -> Optional[float]:
+        """Seconds after which requests are hedged, None until it is known."""
+        return self.latencies.quantile(self.quantile)
+
+    def _submit(self, request: Callable[[], R]) -> "Future[R]":
+        start = self.clock()
+        future = self.executor.submit(request)
+        future.add_done_callback(lambda _: self.latencies.observe(self.clock() - start))
+        return future
+
+    def _earn_token(self) -> None:
+        with self._lock:
+            self._tokens = min(self._tokens + self.budget, self.max_tokens)
+
+    def _take_token(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def call(self, request: Callable[[], R]) -> R:
+        """Result of ``request()``, hedged if slow. Errors of the request
+        answering first are raised only if the other one fails too.
+        """
+        self._earn_token()
+        delay = self.delay()
+        first = self._submit(request)
+        if delay is None:
+            return first.result()
+
+        done, _ = wait([first], timeout=delay)
+        if done:
+            self._outcomes[FAST].inc()
+            return first.result()
+        if not self._take_token():
+            self._outcomes[NO_BUDGET].inc()
+            return first.result()
+
+        hedge = self._submit(request)
+        pending = {first, hedge}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            answered = [future for future in done if future.exception() is None]
+            if answered or not pending:
+                winner = (answered or list(done))[0]
+                self._outcomes[FIRST_WON if winner is first else HEDGE_WON].inc()
+                return winner.result()
@@ -0,0 +1,315 @@
+"""Persistent cache of parsed LDB responses, shared by the processes of a host.
+
+Entries live in a SQLite database in WAL mode, so bot processes on the same
+host (replicas, or the bot restarted by Watchtower) read each other's recent
+responses instead of querying LDB again. Each process and thread opens its own
+connection. Parsed boards and travels are stored in a compact binary form:
+a version byte, then length-prefixed UTF-8 fields.
+
+Entries expire after their TTL and, once the values exceed ``max_bytes`` in
+total, the entries closest to expiry are evicted first, so that reads never
+write.
+"""
+
+import datetime
+import functools
+import logging
+import os
+import sqlite3
+import struct
+import threading
+import time
+from typing import Callable, List, Optional, Sequence, Tuple, TypeVar, Union
+
+from rail_bot.metrics import Counter
+from rail_bot.rail_api.board import Board, BoardRow
+from rail_bot.rail_api.travel import Travel, TravelDisruptionInfo
+from rail_bot.utils import format_time, parse_time
+
+logger = logging.getLogger(__name__)
+
+# SQLite file of the response cache; responses are only cached in memory if unset
+RESPONSE_CACHE_FILE = os.environ.get("RESPONSE_CACHE_FILE", "")
+RESPONSE_CACHE_MAX_BYTES = int(
+    os.environ.get("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+)
+# How long the next departure of a travel is shared, in seconds
+SERVICE_CACHE_TTL = float(os.environ.get("SERVICE_CACHE_TTL", 60))
+# How long LDB's answer to whether a station code exists is shared, in seconds
+STATION_CACHE_TTL = float(os.environ.get("STATION_CACHE_TTL", 24 * 60 * 60))
+
+RESPONSE_CACHE_REQUESTS = Counter(
+    "response_cache_requests_total",
+    "Lookups in the persistent LDB response cache.",
+    ["kind", "result"],
+)
+
+V = TypeVar("V")
+
+_VERSION = 1
+_LENGTH = struct.Struct("<H")
+# Length of a missing field
+_NONE = 0xFFFF
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at);
+"""
+
+
+def _pack(fields: Sequence[Optional[str]]) -> bytes:
+    parts = [bytes([_VERSION])]
+    for field in fields:
+        if field is None:
+            parts.append(_LENGTH.pack(_NONE))
+        else:
+            data = field.encode("utf-8")[: _NONE - 1]
+            parts += (_LENGTH.pack(len(data)), data)
+    return b"".join(parts)
+
+
+def _unpack(data: bytes, count: Optional[int] = None) -> List[Optional[str]]:
+    """Fields of an entry, exactly ``count`` of them if given."""
+    if not data or data[0] != _VERSION:
+        raise ValueError("Unsupported response cache entry.")
+    fields: List[Optional[str]] = []
+    offset = 1
+    while offset < len(data):
+        if offset + _LENGTH.size > len(data):
+            raise ValueError("Truncated response cache entry.")
+        (length,) = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        if length == _NONE:
+            fields.append(None)
+            continue
+        if offset + length > len(data):
+            raise ValueError("Truncated response cache entry.")
+        fields.append(data[offset : offset + length].decode("utf-8"))
+        offset += length
+    if count is not None and len(fields) != count:
+        raise ValueError(f"Expected {count} fields, got {len(fields)}.")
+    return fields
+
+
+def encode_board(board: Optional[Board]) -> bytes:
+    """A board, or the absence of services (None)."""
+    if board is None:
+        return bytes([_VERSION])
+    fields: List[Optional[str]] = [board.location_name]
+    for row in board.rows:
+        fields.extend(row)
+    return _pack(fields)
+
+
+def decode_board(data: bytes) -> Optional[Board]:
+    fields = _unpack(data)
+    if not fields:
+        return None
+    location_name, *cells = fields
+    if len(cells) % len(BoardRow._fields):
+        raise ValueError(f"Incomplete board row in {len(cells)} cells.")
+    rows = tuple(
+        BoardRow(*cells[index : index + len(BoardRow._fields)])
+        for index in range(0, len(cells), len(BoardRow._fields))
+    )
+    return Board(location_name, rows)
+
+
+def encode_flag(value: bool) -> bytes:
+    return _pack(["1" if value else "0"])
+
+
+def decode_flag(data: bytes) -> bool:
+    (field,) = _unpack(data, 1)
+    if field not in ("0", "1"):
+        raise ValueError(f"Invalid flag {field!r}.")
+    return field == "1"
+
+
+def _format(value: Optional[Union[datetime.time, str]]) -> Optional[str]:
+    return None if value is None else format_time(value)
+
+
+def _parse(value: Optional[str]) -> Optional[Union[datetime.time, str]]:
+    """A time, or the label LDB gave instead of one."""
+    if value is None:
+        return None
+    try:
+        return parse_time(value)
+    except ValueError:
+        return value
+
+
+def _disruption_fields(
+    info: Optional[TravelDisruptionInfo],
+) -> Tuple[Optional[str], ...]:
+    if info is None:
+        return (None, None, None)
+    return (info.event_type, info.event_reason, "1" if info.is_active else "")
+
+
+def _disruption(fields: Sequence[Optional[str]]) -> Optional[TravelDisruptionInfo]:
+    event_type, event_reason, is_active = fields
+    if event_type is None:
+        return None
+    return TravelDisruptionInfo(event_type, event_reason, bool(is_active))
+
+
+def encode_travel(travel: Travel) -> bytes:
+    return _pack(
+        (
+            travel.origin,
+            travel.destination,
+            _format(travel.scheduled_departure),
+            _format(travel.estimated_departure),
+            _format(travel.scheduled_arrival),
+            _format(travel.estimated_arrival),
+            travel.service_type,
+            *_disruption_fields(travel.delay_info),
+            *_disruption_fields(travel.cancel_info),
+        )
+    )
+
+
+# Fields of an encoded travel
+_TRAVEL_FIELDS = 13
+
+
+def decode_travel(data: bytes) -> Travel:
+    fields = _unpack(data, _TRAVEL_FIELDS)
+    return Travel(
+        origin=fields[0],
+        destination=fields[1],
+        scheduled_departure=_parse(fields[2]),
+        estimated_departure=_parse(fields[3]),
+        scheduled_arrival=_parse(fields[4]),
+        estimated_arrival=_parse(fields[5]),
+        service_type=fields[6],
+        delay_info=_disruption(fields[7:10]),
+        cancel_info=_disruption(fields[10:13]),
+    )
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        # Wall clock time, shared by the processes and across restarts
+        self.clock = clock
+        self._local = threading.local()
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Connection of the current thread, reopened in forked processes."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key: str) -> Optional[bytes]:
+        """The value of ``key`` if it has not expired."""
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT value FROM responses WHERE key = ? AND expires_at > ?",
+            (key, self.clock()),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        now = self.clock()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                (key, value, now + ttl),
+            )
+            connection.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+            self._evict(connection)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        (total,) = connection.execute(
+            "SELECT total(length(value)) FROM responses"
+        ).fetchone()
+        excess = total - self.max_bytes
+        if excess <= 0:
+            return
+        evicted: List[Tuple[str]] = []
+        for key, size in connection.execute(
+            "SELECT key, length(value) FROM responses ORDER BY expires_at"
+        ):
+            evicted.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def cached(
+        self,
+        kind: str,
+        key: str,
+        ttl: float,
+        fetch: Callable[[], V],
+        encode: Callable[[V], bytes],
+        decode: Callable[[bytes], V],
+        cache_if: Callable[[V], bool] = lambda value: True,
+    ) -> V:
+        """The decoded entry of ``kind:key``, or the result of ``fetch()``,
+        stored if ``cache_if`` allows it.
+        """
+        full_key = f"{kind}:{key}"
+        data = self.get(full_key)
+        if data is not None:
+            try:
+                value = decode(data)
+            # Entries written by another version, or damaged
+            except (ValueError, struct.error, IndexError) as e:
+                logger.warning(f"Ignoring the cached {full_key}: {e!r}")
+            else:
+                RESPONSE_CACHE_REQUESTS.labels(kind, "hit").inc()
+                return value
+
+        RESPONSE_CACHE_REQUESTS.labels(kind, "miss").inc()
+        value = fetch()
+        if cache_if(value):
+            try:
+                self.set(full_key, encode(value), ttl)
+            except sqlite3.Error as e:
+                # The response is still good without the cache
+                logger.warning(f"Could not cache {full_key}: {e!r}")
+        return value
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            connection.close()
+        self._local = threading.local()
+
+
+@functools.lru_cache(maxsize=None)
+def get_response_cache(path: str = RESPONSE_CACHE_FILE) -> Optional[ResponseCache]:
+    if not path:
+        return None
+    return ResponseCache(path)
@@ -0,0 +1,190 @@
+"""Station lookup by CRS code, TIPLOC, or (part of) the station name.
+
+The bundled table lives in ``resources/stations.csv`` (``crs,name,tiploc``).
+A ``# complete: true`` comment line marks a table covering every station, in
+which case unknown codes are rejected outright; otherwise well-formed codes
+that are not in the table are let through to LDB, which ``/subscribe`` asks
+whether they exist before storing them. Regenerate the table from
+the NaPTAN ``RailReferences.csv`` with ``python -m rail_bot.admin stations``.
+"""
+
+import bisect
+import csv
+import difflib
+import functools
+import logging
+import os
+import re
+from typing import IO, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STATIONS_FILE = os.environ.get(
+    "STATIONS_FILE",
+    os.path.join(os.path.dirname(__file__), "resources", "stations.csv"),
+)
+
+COMPLETE_MARKER = "# complete: true"
+
+_CRS_PATTERN = re.compile(r"^[A-Za-z]{3}$")
+_NAPTAN_SUFFIX = " Rail Station"
+
+
+class Station(NamedTuple):
+    crs: str
+    name: str
+    tiploc: Optional[str]
+
+
+class UnknownStationError(ValueError):
+    def __init__(self, query: str, suggestions: List[Station]) -> None:
+        super().__init__(f"Unknown station {query!r}")
+        self.query = query
+        self.suggestions = suggestions
+
+
+def normalize_name(name: str) -> str:
+    name = name.lower().replace("&", " and ")
+    name = re.sub(r"[^a-z0-9 ]", "", name)
+    return " ".join(name.split())
+
+
+class StationIndex:
+    def __init__(self, stations: Iterable[Station], complete: bool = False) -> None:
+        self.complete = complete
+        self._by_crs: Dict[str, Station] = {}
+        self._by_tiploc: Dict[str, Station] = {}
+        self._by_name: Dict[str, Station] = {}
+        # Every word suffix of every name ("london kings cross", "kings cross",
+        # "cross"), sorted, so that any word of a name can be prefix-searched
+        keys: List[Tuple[str, str]] = []
+
+        for station in stations:
+            self._by_crs[station.crs] = station
+            if station.tiploc:
+                self._by_tiploc[station.tiploc] = station
+            name = normalize_name(station.name)
+            self._by_name[name] = station
+            words = name.split(" ")
+            keys.extend((" ".join(words[i:]), station.crs) for i in range(len(words)))
+
+        keys.sort()
+        self._keys = [key for key, _ in keys]
+        self._key_crs = [crs for _, crs in keys]
+        self._names = sorted(self._by_name)
+
+    def __len__(self) -> int:
+        return len(self._by_crs)
+
+    def get(self, crs: str) -> Optional[Station]:
+        return self._by_crs.get(crs.upper())
+
+    def by_tiploc(self, tiploc: str) -> Optional[Station]:
+        return self._by_tiploc.get(tiploc.upper())
+
+    def with_tiploc(self) -> List[Station]:
+        """Stations whose TIPLOC is known."""
+        return list(self._by_tiploc.values())
+
+    def prefix_search(self, query: str, limit: int = 5) -> List[Station]:
+        query = normalize_name(query)
+        if not query:
+            return []
+
+        found: Dict[str, Station] = {}
+        start = bisect.bisect_left(self._keys, query)
+        for key, crs in zip(self._keys[start:], self._key_crs[start:]):
+            if not key.startswith(query) or len(found) == limit:
+                break
+            found.setdefault(crs, self._by_crs[crs])
+        return list(found.values())
+
+    def fuzzy_search(self, query: str, limit: int = 5) -> List[Station]:
+        matches = difflib.get_close_matches(
+            normalize_name(query), self._names, n=limit, cutoff=0.6
+        )
+        return [self._by_name[name] for name in matches]
+
+    def search(self, query: str, limit: int = 5) -> List[Station]:
+        """Stations matching ``query`` as a code, a name prefix, or approximately."""
+        results: Dict[str, Station] = {}
+        exact = self.get(query) if _CRS_PATTERN.match(query) else None
+        for station in (
+            ([exact] if exact else [])
+            + self.prefix_search(query, limit)
+            + self.fuzzy_search(query, limit)
+        ):
+            results.setdefault(station.crs, station)
+        return list(results.values())[:limit]
+
+    def resolve(self, query: str) -> str:
+        """CRS code of the station ``query`` refers to, as a code or as a name.
+        Raises ``UnknownStationError`` with suggestions if there is none.
+        """
+        query = query.strip()
+        if _CRS_PATTERN.match(query):
+            station = self.get(query)
+            if station is not None:
+                return station.crs
+            if not self.complete:
+                return query.upper()
+        else:
+            station = self._by_name.get(normalize_name(query))
+            if station is not None:
+                return station.crs
+            candidates = self.prefix_search(query, limit=2)
+            if len(candidates) == 1:
+                return candidates[0].crs
+
+        raise UnknownStationError(query, self.search(query))
+
+
+def read_stations(file: IO[str]) -> Tuple[List[Station], bool]:
+    complete = False
+    lines = []
+    for line in file:
+        if line.startswith("#"):
+            complete = complete or line.strip() == COMPLETE_MARKER
+        else:
+            lines.append(line)
+
+    stations = [
+        Station(crs=row["crs"], name=row["name"], tiploc=row["tiploc"] or None)
+        for row in csv.DictReader(lines)
+    ]
+    return stations, complete
+
+
+def write_stations(file: IO[str], stations: Iterable[Station], complete: bool) -> None:
+    file.write(f"# complete: {str(complete).lower()}\n")
+    writer = csv.writer(file)
+    writer.writerow(Station._fields)
+    for station in sorted(stations):
+        writer.writerow((station.crs, station.name, station.tiploc or ""))
+
+
+def stations_from_naptan(file: IO[str]) -> List[Station]:
+    """Stations in a NaPTAN ``RailReferences.csv`` export."""
+    stations: Dict[str, Station] = {}
+    for row in csv.DictReader(file):
+        crs = row["CrsCode"].strip().upper()
+        if not crs:
+            continue
+        name = row["StationName"].strip()
+        if name.endswith(_NAPTAN_SUFFIX):
+            name = name[: -len(_NAPTAN_SUFFIX)]
+        stations.setdefault(crs, Station(crs, name, row["TiplocCode"].strip() or None))
+    return list(stations.values())
+
+
+@functools.lru_cache(maxsize=None)
+def get_station_index(path: str = STATIONS_FILE) -> StationIndex:
+    with open(path, newline="") as file:
+        stations, complete = read_stations(file)
+    if not complete:
+        logger.warning(
+            f"The station table {path} has only {len(stations)} stations: codes "
+            f"missing from it are checked with LDB. Build the full table with "
+            f"`python -m rail_bot.admin stations`."
+        )
+    return StationIndex(stations, complete=complete)
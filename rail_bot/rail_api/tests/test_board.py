@@ -0,0 +1,162 @@
+import threading
+import unittest
+from types import SimpleNamespace
+
+from rail_bot.rail_api.board import BoardCache, parse_board, render_board
+
+
+def make_response(services):
+    return SimpleNamespace(
+        locationName="London Kings Cross",
+        trainServices=SimpleNamespace(
+            service=[
+                SimpleNamespace(
+                    std=std,
+                    etd=etd,
+                    platform=platform,
+                    destination=SimpleNamespace(
+                        location=[SimpleNamespace(locationName=destination)]
+                    ),
+                )
+                for std, destination, etd, platform in services
+            ]
+        ),
+    )
+
+
+RESPONSE = make_response(
+    [
+        ("12:23", "Cambridge", "On time", "9"),
+        ("12:30", "Ely", "12:41", None),
+        ("12:45", "Leeds", "Cancelled", "1"),
+    ]
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestRenderBoard(unittest.TestCase):
+    def test_render(self):
+        board = parse_board(RESPONSE)
+
+        self.assertEqual(
+            render_board(board, 10),
+            "Trains at London Kings Cross\n"
+            "12:23 Cambridge (Platform 9)\n"
+            "12:30 Ely - 12:41\n"
+            "12:45 Leeds - Cancelled (Platform 1)\n",
+        )
+        self.assertEqual(
+            render_board(board, 1),
+            "Trains at London Kings Cross\n12:23 Cambridge (Platform 9)\n",
+        )
+
+    def test_no_services(self):
+        response = SimpleNamespace(locationName="Dinting", trainServices=None)
+        self.assertIsNone(parse_board(response))
+
+
+class TestBoardCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.cache = BoardCache(ttl=30, clock=self.clock)
+        self.fetched = []
+
+    def fetch(self, rows):
+        self.fetched.append(rows)
+        return parse_board(RESPONSE)
+
+    def test_shared_until_expiry(self):
+        first = self.cache.get(("KGX", None), 10, self.fetch)
+        second = self.cache.get(("KGX", None), 5, self.fetch)
+        self.assertIs(first, second)
+        self.assertIs(first.render(2), second.render(2))
+
+        # More rows than were fetched
+        self.cache.get(("KGX", None), 20, self.fetch)
+        self.clock.now = 31
+        self.cache.get(("KGX", None), 10, self.fetch)
+
+        self.assertEqual(self.fetched, [10, 20, 10])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 3))
+
+    def test_concurrent_requests_fetch_once(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_fetch(rows):
+            started.set()
+            release.wait(5)
+            return self.fetch(rows)
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    self.cache.get(("KGX", "CBG"), 10, slow_fetch)
+                )
+            )
+            for _ in range(4)
+        ]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.fetched, [10])
+        self.assertEqual(len({id(cached) for cached in results}), 1)
+
+    def test_errors_are_not_cached(self):
+        def failing_fetch(rows):
+            raise ConnectionError("LDB is down")
+
+        with self.assertRaises(ConnectionError):
+            self.cache.get(("KGX", None), 10, failing_fetch)
+        self.cache.get(("KGX", None), 10, self.fetch)
+
+        self.assertEqual(self.fetched, [10])
+
+    def test_prefetch(self):
+        prefetched = self.cache.prefetch(("KGX", None), 10, self.fetch)
+        self.assertIsNone(self.cache.prefetch(("KGX", None), 10, self.fetch))
+        self.assertEqual(prefetched.hits, 0)
+
+        self.assertIs(self.cache.get(("KGX", None), 5, self.fetch), prefetched)
+        self.assertEqual(prefetched.hits, 1)
+        self.assertEqual(self.fetched, [10])
+
+    def test_prefetch_refreshes_boards_about_to_expire(self):
+        first = self.cache.prefetch(("KGX", None), 10, self.fetch)
+        self.clock.now = 25
+        self.assertIsNone(self.cache.prefetch(("KGX", None), 10, self.fetch))
+
+        second = self.cache.prefetch(("KGX", None), 10, self.fetch, min_ttl=10)
+
+        self.assertIsNot(second, first)
+        self.assertIs(self.cache.get(("KGX", None), 10, self.fetch), second)
+        self.assertEqual(self.fetched, [10, 10])
+
+    def test_peek_at_stale_boards(self):
+        cache = BoardCache(ttl=30, clock=self.clock, stale_ttl=60)
+        self.assertIsNone(cache.peek(("KGX", None), 10))
+        cached = cache.get(("KGX", None), 10, self.fetch)
+
+        self.clock.now = 50
+        self.assertIs(cache.peek(("KGX", None), 10), cached)
+        self.assertIsNone(cache.peek(("KGX", None), 20))
+        self.assertEqual(cache.age(cached), 50)
+        self.clock.now = 90
+        self.assertIsNone(cache.peek(("KGX", None), 10))
+
+
+if __name__ == "__main__":
+    unittest.main()
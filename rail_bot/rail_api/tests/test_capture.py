@@ -0,0 +1,56 @@
+import json
+import os
+import tempfile
+import unittest
+
+from rail_bot.rail_api.capture import CaptureBuffer
+
+
+class TestCaptureBuffer(unittest.TestCase):
+    def test_ring_buffer(self):
+        buffer = CaptureBuffer(size=2)
+        for crs in ("KGX", "CBG", "ELY"):
+            buffer.add("GetDepBoardWithDetails", {"crs": crs}, 0.1, {"crs": crs})
+
+        self.assertEqual(
+            [exchange.params["crs"] for exchange in buffer.exchanges()],
+            ["CBG", "ELY"],
+        )
+        self.assertEqual(buffer.captured, 3)
+
+    def test_size_cap(self):
+        buffer = CaptureBuffer(size=2, max_bytes=100)
+        buffer.add("GetDepBoardWithDetails", {}, 0.1, {"services": ["x" * 200]})
+        buffer.add("GetDepBoardWithDetails", {}, 0.1, error=TimeoutError())
+
+        large, failed = buffer.exchanges()
+        self.assertIsNone(large.response)
+        self.assertEqual(buffer.dropped, 1)
+        self.assertEqual(failed.error, "TimeoutError()")
+
+    def test_sampling(self):
+        self.assertTrue(CaptureBuffer(size=1, sample_rate=1.0).sampled())
+        self.assertFalse(CaptureBuffer(size=1, sample_rate=0.0).sampled())
+
+    def test_dump(self):
+        buffer = CaptureBuffer(size=10)
+        response = {"locationName": "Flowery Field", "crs": "FLF"}
+        buffer.add("GetNextDeparturesWithDetails", {"crs": "FLF"}, 0.1, response)
+        buffer.add(
+            "GetNextDeparturesWithDetails", {"crs": "XXX"}, 0.1, error=ValueError()
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            (path,) = buffer.dump(directory)
+            with open(path) as file:
+                self.assertEqual(json.load(file), response)
+            with open(os.path.join(directory, "index.json")) as file:
+                index = json.load(file)
+
+        self.assertEqual([entry["params"]["crs"] for entry in index], ["FLF", "XXX"])
+        self.assertEqual(index[0]["file"], os.path.basename(path))
+        self.assertIsNone(index[1]["file"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from rail_bot.rail_api.hedging import (
+    FAST,
+    HEDGE_WON,
+    LDB_HEDGES,
+    NO_BUDGET,
+    Hedger,
+    LatencyHistogram,
+)
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_quantiles(self):
+        latencies = LatencyHistogram(min_count=20)
+        for _ in range(19):
+            latencies.observe(0.1)
+        self.assertIsNone(latencies.quantile(0.95))
+
+        for _ in range(76):
+            latencies.observe(0.1)
+        for _ in range(5):
+            latencies.observe(5.0)
+
+        self.assertTrue(0.1 <= latencies.quantile(0.95) < 0.12)
+        self.assertTrue(5.0 <= latencies.quantile(0.99) < 6.0)
+        self.assertEqual(latencies.quantile(1.0), latencies.quantile(0.99))
+
+    def test_decay(self):
+        latencies = LatencyHistogram(half_life=100, min_count=1)
+        for _ in range(100):
+            latencies.observe(0.1)
+        for _ in range(200):
+            latencies.observe(2.0)
+
+        self.assertTrue(latencies.quantile(0.5) >= 2.0)
+
+
+class TestHedger(unittest.TestCase):
+    def setUp(self) -> None:
+        self.executor = ThreadPoolExecutor(4)
+        # Released at the end of the test, so slow requests do not block others
+        self.release = threading.Event()
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def tearDown(self) -> None:
+        self.release.set()
+        self.executor.shutdown()
+
+    def hedger(self, budget: float) -> Hedger:
+        latencies = LatencyHistogram(min_count=10)
+        for _ in range(10):
+            latencies.observe(0.01)
+        return Hedger("Test", self.executor, budget=budget, latencies=latencies)
+
+    def first_call_is_slow(self, error: bool = False):
+        def request():
+            with self._lock:
+                self.calls += 1
+                call = self.calls
+            if call == 1:
+                if error:
+                    time.sleep(0.05)
+                    raise RuntimeError("LDB fault")
+                self.release.wait(10)
+                return "first"
+            return "hedge"
+
+        return request
+
+    def outcome(self, outcome: str) -> float:
+        return LDB_HEDGES.labels("Test", outcome).value
+
+    def test_fast_requests_are_not_hedged(self):
+        fast = self.outcome(FAST)
+
+        self.assertEqual(self.hedger(budget=1).call(lambda: "first"), "first")
+        self.assertEqual(self.outcome(FAST), fast + 1)
+
+    def test_slow_request_is_hedged(self):
+        won = self.outcome(HEDGE_WON)
+
+        result = self.hedger(budget=1).call(self.first_call_is_slow())
+
+        self.assertEqual(result, "hedge")
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.outcome(HEDGE_WON), won + 1)
+
+    def test_hedge_after_an_error(self):
+        result = self.hedger(budget=1).call(self.first_call_is_slow(error=True))
+
+        self.assertEqual(result, "hedge")
+
+    def test_budget(self):
+        no_budget = self.outcome(NO_BUDGET)
+        request = self.first_call_is_slow()
+        threading.Timer(0.2, self.release.set).start()
+
+        result = self.hedger(budget=0.5).call(request)
+
+        self.assertEqual(result, "first")
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.outcome(NO_BUDGET), no_budget + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
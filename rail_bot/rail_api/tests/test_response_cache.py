@@ -0,0 +1,143 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import unittest
+
+import pkg_resources
+
+from rail_bot.rail_api.board import parse_board
+from rail_bot.rail_api.response_cache import (
+    ResponseCache,
+    decode_board,
+    decode_flag,
+    decode_travel,
+    encode_board,
+    encode_flag,
+    encode_travel,
+)
+from rail_bot.rail_api.tests.test_board import RESPONSE, FakeClock
+from rail_bot.rail_api.travel import Travel
+
+
+def load_travel(fixture: str) -> Travel:
+    path = pkg_resources.resource_filename(
+        "rail_bot.rail_api.tests", f"resources/{fixture}"
+    )
+    with open(path) as file:
+        return Travel.from_response(json.load(file))
+
+
+def write_entry(path: str) -> None:
+    ResponseCache(path).set("board:KGX::10", encode_board(parse_board(RESPONSE)), 60)
+
+
+class TestEncoding(unittest.TestCase):
+    def test_board(self):
+        board = parse_board(RESPONSE)
+        self.assertEqual(decode_board(encode_board(board)), board)
+        self.assertIsNone(decode_board(encode_board(None)))
+
+    def test_travel(self):
+        for fixture in ("response.json", "response_delayed.json"):
+            travel = load_travel(fixture)
+            decoded = decode_travel(encode_travel(travel))
+            self.assertEqual(decoded, travel)
+            self.assertEqual(repr(decoded), repr(travel))
+
+    def test_flag(self):
+        self.assertTrue(decode_flag(encode_flag(True)))
+        self.assertFalse(decode_flag(encode_flag(False)))
+        with self.assertRaises(ValueError):
+            decode_flag(encode_board(None))
+
+    def test_unsupported_version(self):
+        with self.assertRaises(ValueError):
+            decode_board(b"\x00")
+
+    def test_damaged_entries(self):
+        board = encode_board(parse_board(RESPONSE))
+        travel = encode_travel(load_travel("response.json"))
+        for data in (board[:-3], board[:2]):
+            with self.assertRaises(ValueError):
+                decode_board(data)
+        # Fewer fields, as written by an older layout
+        for data in (travel[:5], encode_board(None)):
+            with self.assertRaises(ValueError):
+                decode_travel(data)
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "responses.db")
+        self.clock = FakeClock()
+        self.cache = ResponseCache(self.path, max_bytes=100, clock=self.clock)
+
+    def tearDown(self) -> None:
+        self.cache.close()
+        self.directory.cleanup()
+
+    def test_ttl(self):
+        self.cache.set("a", b"value", ttl=10)
+        self.assertEqual(self.cache.get("a"), b"value")
+
+        self.clock.now = 10
+        self.assertIsNone(self.cache.get("a"))
+
+    def test_eviction_of_the_entries_closest_to_expiry(self):
+        self.cache.set("a", b"x" * 40, ttl=30)
+        self.cache.set("b", b"x" * 40, ttl=10)
+        self.cache.set("c", b"x" * 40, ttl=20)
+
+        self.assertIsNone(self.cache.get("b"))
+        self.assertIsNotNone(self.cache.get("a"))
+        self.assertIsNotNone(self.cache.get("c"))
+
+    def test_cached(self):
+        fetches = []
+
+        def fetch():
+            fetches.append(1)
+            return None
+
+        for _ in range(2):
+            board = self.cache.cached(
+                "board", "KGX", 10, fetch, encode_board, decode_board
+            )
+            self.assertIsNone(board)
+        self.assertEqual(len(fetches), 1)
+
+        self.cache.cached(
+            "board", "CBG", 10, fetch, encode_board, decode_board, lambda _: False
+        )
+        self.assertEqual(len(fetches), 2)
+        self.assertIsNone(self.cache.get("board:CBG"))
+
+    def test_damaged_entries_are_misses(self):
+        self.cache.set("service:KGX:CBG:0", b"\x01\x05", ttl=10)
+        travel = load_travel("response.json")
+
+        cached = self.cache.cached(
+            "service", "KGX:CBG:0", 10, lambda: travel, encode_travel, decode_travel
+        )
+
+        self.assertEqual(cached, travel)
+
+    def test_shared_between_processes(self):
+        process = multiprocessing.get_context("spawn").Process(
+            target=write_entry, args=(self.path,)
+        )
+        process.start()
+        process.join(30)
+        self.assertEqual(process.exitcode, 0)
+
+        cache = ResponseCache(self.path)
+        self.addCleanup(cache.close)
+        self.assertEqual(
+            decode_board(cache.get("board:KGX::10")), parse_board(RESPONSE)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import io
+import unittest
+
+from rail_bot.rail_api.stations import (
+    Station,
+    StationIndex,
+    UnknownStationError,
+    get_station_index,
+    read_stations,
+    stations_from_naptan,
+    write_stations,
+)
+
+STATIONS = [
+    Station("KGX", "London Kings Cross", "KNGX"),
+    Station("CBG", "Cambridge", "CAMBDGE"),
+    Station("CMB", "Cambridge North", None),
+    Station("SUN", "Sunderland", None),
+    Station("PMS", "Portsmouth & Southsea", None),
+]
+
+
+class TestStationIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.index = StationIndex(STATIONS)
+
+    def test_get(self):
+        self.assertEqual(self.index.get("kgx"), STATIONS[0])
+        self.assertEqual(self.index.by_tiploc("cambdge"), STATIONS[1])
+        self.assertIsNone(self.index.get("XYZ"))
+
+    def test_prefix_search(self):
+        self.assertEqual(
+            [s.crs for s in self.index.prefix_search("camb")], ["CBG", "CMB"]
+        )
+        # Any word of the name
+        self.assertEqual([s.crs for s in self.index.prefix_search("kings")], ["KGX"])
+        self.assertEqual(
+            [s.crs for s in self.index.prefix_search("portsmouth and")], ["PMS"]
+        )
+
+    def test_resolve(self):
+        self.assertEqual(self.index.resolve("cbg"), "CBG")
+        self.assertEqual(self.index.resolve("Sunderland"), "SUN")
+        self.assertEqual(self.index.resolve("cambridge north"), "CMB")
+        # Unambiguous prefix
+        self.assertEqual(self.index.resolve("sunder"), "SUN")
+        # Not in an incomplete table, but may well exist
+        self.assertEqual(self.index.resolve("flf"), "FLF")
+
+    def test_resolve_unknown(self):
+        with self.assertRaises(UnknownStationError) as raised:
+            self.index.resolve("cambrige")
+        self.assertEqual(raised.exception.suggestions[0].crs, "CBG")
+
+        complete = StationIndex(STATIONS, complete=True)
+        with self.assertRaises(UnknownStationError):
+            complete.resolve("flf")
+
+    def test_bundled_table(self):
+        index = get_station_index()
+        self.assertFalse(index.complete)
+        self.assertEqual(index.resolve("kgx"), "KGX")
+        self.assertEqual(index.resolve("Flowery Field"), "FLF")
+
+
+class TestStationFiles(unittest.TestCase):
+    def test_round_trip(self):
+        file = io.StringIO()
+        write_stations(file, STATIONS, complete=True)
+        file.seek(0)
+
+        stations, complete = read_stations(file)
+        self.assertTrue(complete)
+        self.assertEqual(sorted(stations), sorted(STATIONS))
+
+    def test_naptan(self):
+        naptan = io.StringIO(
+            "AtcoCode,TiplocCode,CrsCode,StationName\n"
+            "9100KNGX,KNGX,KGX,London Kings Cross Rail Station\n"
+            "9100XXXX,XXXX,,Freight Terminal\n"
+        )
+        self.assertEqual(stations_from_naptan(naptan), [STATIONS[0]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+from rail_bot.rail_api.timetable import Timetable, write_timetable
+
+START = datetime.date(2024, 1, 8)
+
+
+class TestTimetable(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "timetable.bin")
+        departures = {
+            ("KGX", "CBG"): {12 * 60 + 23: 0b11111, 12 * 60 + 52: 0b1100000},
+            ("CBG", "KGX"): {7 * 60: 0b1111111},
+            ("KGX", "SVG"): {},
+        }
+        self.assertEqual(write_timetable(self.path, departures, START, 7), 3)
+        self.timetable = Timetable(self.path)
+
+    def tearDown(self) -> None:
+        self.timetable.close()
+        self.directory.cleanup()
+
+    def test_departures(self):
+        self.assertEqual(len(self.timetable), 2)
+        self.assertEqual(self.timetable.end, START + datetime.timedelta(days=7))
+
+        first, second = self.timetable.departures("kgx", "cbg")
+        self.assertEqual(first.time, datetime.time(12, 23))
+        self.assertEqual(first.weekdays, (0, 1, 2, 3, 4))
+        self.assertEqual(second.weekdays, (5, 6))
+        self.assertEqual(len(self.timetable.departures("CBG", "KGX")), 1)
+        self.assertEqual(self.timetable.departures("KGX", "SVG"), [])
+        self.assertEqual(self.timetable.departures("AAA", "ZZZ"), [])
+
+    def test_nearest(self):
+        nearest = self.timetable.nearest
+        self.assertEqual(
+            nearest("KGX", "CBG", datetime.time(12, 23), 0).time,
+            datetime.time(12, 23),
+        )
+        self.assertEqual(
+            nearest("KGX", "CBG", datetime.time(12, 50), 5).time,
+            datetime.time(12, 52),
+        )
+        self.assertIsNone(nearest("KGX", "CBG", datetime.time(12, 38), 5))
+
+    def test_invalid_file(self):
+        with open(self.path, "wb") as file:
+            file.write(b"\0" * 64)
+        with self.assertRaises(ValueError):
+            Timetable(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
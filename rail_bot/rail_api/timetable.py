@@ -0,0 +1,169 @@
+"""Memory-mapped index of the scheduled departures between pairs of stations.
+
+The index is built offline from a CIF or JSON timetable extract with
+``python -m rail_bot.admin timetable``, for a period of ``days`` days from
+``start``. Every pair of stations with direct trains has its departures sorted
+by time, each with the mask of the weekdays it runs on during that period.
+
+File layout, little-endian:
+
+- header: magic, version, start date (ordinal), days, number of pairs
+- pairs, sorted: origin CRS, destination CRS, first departure, departure count
+- departures: minute of the day, weekday mask (bit 0 is Monday)
+"""
+
+import datetime
+import functools
+import logging
+import mmap
+import os
+import struct
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Timetable index file; subscriptions are not checked against a timetable if unset
+TIMETABLE_FILE = os.environ.get("TIMETABLE_FILE", "")
+# Subscriptions up to this many minutes from a departure are moved to it
+TIMETABLE_SNAP_MINUTES = int(os.environ.get("TIMETABLE_SNAP_MINUTES", 5))
+
+MAGIC = b"RBTT"
+VERSION = 1
+ALL_DAYS = 0b1111111
+
+_HEADER = struct.Struct("<4sHIHI")
+_PAIR = struct.Struct("<3s3sII")
+_DEPARTURE = struct.Struct("<HB")
+
+# (origin CRS, destination CRS) -> {minute of the day: weekday mask}
+Departures = Dict[Tuple[str, str], Dict[int, int]]
+
+
+class Departure(NamedTuple):
+    time: datetime.time
+    # Bit d is set if the train runs on weekday d (Monday is 0)
+    days: int
+
+    @property
+    def weekdays(self) -> Tuple[int, ...]:
+        return tuple(day for day in range(7) if self.days & (1 << day))
+
+
+def _crs_key(crs: str) -> bytes:
+    return crs.upper().encode("ascii")[:3].ljust(3)
+
+
+def write_timetable(
+    path: str, departures: Departures, start: datetime.date, days: int
+) -> int:
+    """Writes the index atomically. Returns the number of departures."""
+    pairs = sorted(
+        (_crs_key(origin), _crs_key(destination), times)
+        for (origin, destination), times in departures.items()
+        if times
+    )
+    count = sum(len(times) for _, _, times in pairs)
+    buffer = bytearray(_HEADER.size + len(pairs) * _PAIR.size + count * _DEPARTURE.size)
+    _HEADER.pack_into(buffer, 0, MAGIC, VERSION, start.toordinal(), days, len(pairs))
+
+    pair_offset = _HEADER.size
+    departure_offset = pair_offset + len(pairs) * _PAIR.size
+    first = 0
+    for origin, destination, times in pairs:
+        _PAIR.pack_into(buffer, pair_offset, origin, destination, first, len(times))
+        pair_offset += _PAIR.size
+        for minute in sorted(times):
+            _DEPARTURE.pack_into(buffer, departure_offset, minute, times[minute])
+            departure_offset += _DEPARTURE.size
+        first += len(times)
+
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(buffer)
+    os.replace(temporary, path)
+    return count
+
+
+class Timetable:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, start, self.days, self._pairs = _HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} timetable index.")
+        self.start = datetime.date.fromordinal(start)
+        self._departures_offset = _HEADER.size + self._pairs * _PAIR.size
+
+    def __len__(self) -> int:
+        return self._pairs
+
+    @property
+    def end(self) -> datetime.date:
+        """First day after the period of the timetable."""
+        return self.start + datetime.timedelta(days=self.days)
+
+    def close(self) -> None:
+        self._map.close()
+
+    def _find(self, origin: str, destination: str) -> Optional[Tuple[int, int]]:
+        key = (_crs_key(origin), _crs_key(destination))
+        low, high = 0, self._pairs
+        while low < high:
+            middle = (low + high) // 2
+            pair = _PAIR.unpack_from(self._map, _HEADER.size + middle * _PAIR.size)
+            if pair[:2] < key:
+                low = middle + 1
+            elif pair[:2] > key:
+                high = middle
+            else:
+                return pair[2], pair[3]
+        return None
+
+    def departures(self, origin: str, destination: str) -> List[Departure]:
+        """Departures from ``origin`` with a direct train to ``destination``."""
+        found = self._find(origin, destination)
+        if found is None:
+            return []
+        first, count = found
+        offset = self._departures_offset + first * _DEPARTURE.size
+        return [
+            Departure(datetime.time(*divmod(minute, 60)), days)
+            for minute, days in _DEPARTURE.iter_unpack(
+                self._map[offset : offset + count * _DEPARTURE.size]
+            )
+        ]
+
+    def nearest(
+        self,
+        origin: str,
+        destination: str,
+        departure_time: datetime.time,
+        within: int,
+    ) -> Optional[Departure]:
+        """The departure closest to ``departure_time``, if at most ``within``
+        minutes away.
+        """
+        minute = departure_time.hour * 60 + departure_time.minute
+        best: Optional[Tuple[int, Departure]] = None
+        for departure in self.departures(origin, destination):
+            distance = abs(departure.time.hour * 60 + departure.time.minute - minute)
+            if distance <= within and (best is None or distance < best[0]):
+                best = (distance, departure)
+        return None if best is None else best[1]
+
+    def __repr__(self) -> str:
+        return (
+            f"Timetable({self.path!r}, {self._pairs} pairs, "
+            f"{self.start} to {self.end})"
+        )
+
+
+@functools.lru_cache(maxsize=None)
+def get_timetable(path: str = TIMETABLE_FILE) -> Optional[Timetable]:
+    if not path:
+        return None
+    timetable = Timetable(path)
+    if datetime.date.today() >= timetable.end:
+        logger.warning(f"{timetable!r} has expired; import a newer extract.")
+    return timetable
@@ -0,0 +1,76 @@
+import unittest
+import urllib.request
+
+from rail_bot.metrics import (
+    CONTENT_TYPE,
+    Counter,
+    Gauge,
+    Histogram,
+    Registry,
+    start_metrics_server,
+)
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self) -> None:
+        self.registry = Registry()
+
+    def test_counter_and_gauge(self):
+        errors = Counter(
+            "errors_total", "Errors.", ["operation"], registry=self.registry
+        )
+        depth = Gauge("queue_depth", "Queue depth.", registry=self.registry)
+        errors.labels("GetDepBoard").inc()
+        errors.labels("GetDepBoard").inc(2)
+        errors.labels('odd "name"').inc()
+        depth.set_function(lambda: 7)
+
+        self.assertEqual(
+            self.registry.render(),
+            "# HELP errors_total Errors.\n"
+            "# TYPE errors_total counter\n"
+            'errors_total{operation="GetDepBoard"} 3\n'
+            'errors_total{operation="odd \\"name\\""} 1\n'
+            "# HELP queue_depth Queue depth.\n"
+            "# TYPE queue_depth gauge\n"
+            "queue_depth 7\n",
+        )
+
+    def test_histogram(self):
+        latency = Histogram(
+            "latency_seconds", "Latency.", buckets=(0.1, 1.0), registry=self.registry
+        )
+        for value in (0.05, 0.1, 0.5, 3.0):
+            latency.observe(value)
+
+        self.assertEqual(
+            list(latency.samples()),
+            [
+                'latency_seconds_bucket{le="0.1"} 2',
+                'latency_seconds_bucket{le="1"} 3',
+                'latency_seconds_bucket{le="+Inf"} 4',
+                "latency_seconds_sum 3.65",
+                "latency_seconds_count 4",
+            ],
+        )
+
+    def test_duplicate_names_are_rejected(self):
+        Counter("requests_total", "Requests.", registry=self.registry)
+        with self.assertRaises(ValueError):
+            Gauge("requests_total", "Requests.", registry=self.registry)
+
+    def test_endpoint(self):
+        Counter("requests_total", "Requests.", registry=self.registry).inc()
+        server = start_metrics_server(0, listen="127.0.0.1", registry=self.registry)
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            with urllib.request.urlopen(url) as response:
+                self.assertEqual(response.headers["Content-Type"], CONTENT_TYPE)
+                self.assertIn(b"requests_total 1\n", response.read())
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main()
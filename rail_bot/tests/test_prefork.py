@@ -0,0 +1,174 @@
+import datetime
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+import unittest
+from multiprocessing.connection import Connection
+
+from telegram import Update
+
+from rail_bot.prefork import Master, serve_updates, travel_owner
+
+# Directory of the files written by the workers, inherited by spawned workers
+DIRECTORY = "PREFORK_TEST_DIRECTORY"
+
+# Entry point of a package run as ``python PACKAGE``, like the bot's image
+MAIN = textwrap.dedent("""
+    import time
+
+    from rail_bot.prefork import Master
+    from rail_bot.tests.test_prefork import make_update, run_worker
+
+    master = Master(2, run_worker, restart_delay=0)
+    master.start()
+    try:
+        worker = master.workers[1]
+        worker.process.terminate()
+        worker.process.join()
+        assert master.check_workers() == 1
+        master.route(make_update(1, 1))
+        time.sleep(1)
+        assert worker.process.is_alive(), worker.process.exitcode
+    finally:
+        master.stop(timeout=10)
+    """)
+
+
+class RecordingDispatcher:
+    """Writes the chat of every update to a file, in place of a dispatcher."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.bot = None
+        self.update_queue = self
+
+    def put(self, update: Update) -> None:
+        with open(self.path, "a") as file:
+            file.write(f"{update.effective_chat.id}\n")
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+
+def run_worker(index: int, updates: Connection) -> None:
+    path = os.path.join(os.environ[DIRECTORY], f"{index}")
+    serve_updates(updates, RecordingDispatcher(path))
+
+
+def make_update(update_id: int, chat_id: int) -> Update:
+    return Update.de_json(
+        {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": 0,
+                "chat": {"id": chat_id, "type": "private"},
+                "text": "/board KGX",
+            },
+        },
+        None,
+    )
+
+
+class TestPrefork(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        os.environ[DIRECTORY] = self.directory.name
+        self.master = Master(2, run_worker, restart_delay=0)
+        self.master.start()
+
+    def tearDown(self) -> None:
+        self.master.stop(timeout=10)
+        self.directory.cleanup()
+
+    def read(self, index: int):
+        with open(os.path.join(self.directory.name, f"{index}")) as file:
+            return [int(line) for line in file]
+
+    def test_updates_are_routed_by_chat(self):
+        for update_id, chat_id in enumerate([1, 2, 3, 4, 3, 1]):
+            self.master.route(make_update(update_id, chat_id))
+        self.master.stop(timeout=10)
+
+        self.assertEqual(self.read(0), [2, 4])
+        self.assertEqual(self.read(1), [1, 3, 3, 1])
+
+    def test_exited_workers_are_restarted(self):
+        worker = self.master.workers[1]
+        pid = worker.process.pid
+        worker.process.terminate()
+        worker.process.join()
+
+        self.assertEqual(self.master.check_workers(), 1)
+        self.assertNotEqual(worker.process.pid, pid)
+        self.assertTrue(worker.process.is_alive())
+        # Not forked from the master, which runs threads by then
+        spawn = multiprocessing.get_context("spawn")
+        self.assertIsInstance(worker.process, spawn.Process)
+        self.assertEqual(self.master.check_workers(), 0)
+
+        self.master.route(make_update(1, 1))
+        self.master.stop(timeout=10)
+        self.assertEqual(self.read(1), [1])
+
+    def test_crashing_workers_wait_for_the_restart_delay(self):
+        self.master.restart_delay = 60
+        worker = self.master.workers[0]
+        worker.process.terminate()
+        worker.process.join()
+
+        self.assertEqual(self.master.check_workers(), 0)
+        worker.exited_at = time.monotonic() - 60
+        self.assertEqual(self.master.check_workers(), 1)
+
+
+class TestPreforkMain(unittest.TestCase):
+    def test_workers_restarted_from_a_main_module(self):
+        with tempfile.TemporaryDirectory() as directory:
+            package = os.path.join(directory, "app")
+            os.mkdir(package)
+            with open(os.path.join(package, "__main__.py"), "w") as file:
+                file.write(MAIN)
+            root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+            env = {**os.environ, DIRECTORY: directory, "PYTHONPATH": root}
+
+            result = subprocess.run(
+                [sys.executable, package], env=env, capture_output=True, timeout=60
+            )
+
+            self.assertEqual(result.returncode, 0, result.stderr.decode())
+            with open(os.path.join(directory, "1")) as file:
+                self.assertEqual(file.read(), "1\n")
+
+    def test_run_must_not_be_defined_in_main(self):
+        def run(index: int, updates: Connection) -> None:
+            pass
+
+        run.__module__ = "__main__"
+
+        with self.assertRaises(ValueError):
+            Master(2, run, restart_delay=0)
+
+
+class TestTravelOwner(unittest.TestCase):
+    def test_stable_split(self):
+        departure = datetime.time(12, 23)
+        owner = travel_owner("KGX", "CBG", departure, 4)
+
+        self.assertIn(owner, range(4))
+        self.assertEqual(travel_owner("kgx", "cbg", departure, 4), owner)
+        owners = {
+            travel_owner("KGX", "CBG", datetime.time(hour), 4) for hour in range(24)
+        }
+        self.assertEqual(owners, {0, 1, 2, 3})
+
+
+if __name__ == "__main__":
+    unittest.main()
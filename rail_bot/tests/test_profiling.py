@@ -0,0 +1,124 @@
+import os
+import pstats
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from rail_bot import profiling
+from rail_bot.profiling import CPROFILE, STACK, Profiler, add_span, span, traced
+
+
+class TestTraced(unittest.TestCase):
+    def test_slow_callback_logged_with_breakdown(self):
+        @traced("slow", budget=0.01)
+        def slow():
+            with span("ldb.GetDepBoardWithDetails"):
+                with span("ldb.parse"):
+                    time.sleep(0.01)
+            add_span("db", 0.005)
+            add_span("db", 0.005)
+            return "done"
+
+        with self.assertLogs("rail_bot.profiling", "WARNING") as logs:
+            self.assertEqual(slow(), "done")
+
+        (message,) = logs.output
+        self.assertIn("slow took", message)
+        self.assertIn("ldb.GetDepBoardWithDetails 1x", message)
+        self.assertIn("ldb.parse 1x", message)
+        self.assertIn("db 2x 0.010 s", message)
+        self.assertIn("other", message)
+
+    def test_fast_callback_not_logged(self):
+        @traced("fast", budget=1.0)
+        def fast():
+            add_span("db", 0.001)
+
+        with mock.patch.object(profiling.logger, "warning") as warning:
+            fast()
+        warning.assert_not_called()
+
+    def test_nested_callback_is_a_span(self):
+        @traced("inner", budget=0.0)
+        def inner():
+            pass
+
+        @traced("outer", budget=0.0)
+        def outer():
+            inner()
+
+        with self.assertLogs("rail_bot.profiling", "WARNING") as logs:
+            outer()
+
+        (message,) = logs.output
+        self.assertIn("outer took", message)
+        self.assertIn("inner 1x", message)
+
+    def test_spans_outside_callbacks_ignored(self):
+        with span("telegram.sendMessage"):
+            add_span("db", 1.0)
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.profiler = Profiler()
+        self.done = threading.Event()
+        self.paths = []
+
+    def on_done(self, path: str) -> None:
+        self.paths.append(path)
+        self.done.set()
+
+    def test_cprofile(self):
+        self.profiler.start(CPROFILE, 10, self.directory.name, on_done=self.on_done)
+        with self.assertRaises(RuntimeError):
+            self.profiler.start(STACK, 1, self.directory.name)
+
+        def work():
+            return sum(range(1000))
+
+        profile = self.profiler.callback_profile()
+        self.assertEqual(profile.runcall(work), 499500)
+        self.profiler.add_callback_profile(profile)
+        self.profiler.stop()
+
+        self.assertTrue(self.done.wait(5))
+        (path,) = self.paths
+        self.assertTrue(path.endswith("-cprofile.pstats"))
+        functions = {name for _, _, name in pstats.Stats(path).stats}
+        self.assertIn("work", functions)
+        self.assertFalse(self.profiler.running)
+        self.assertIsNone(self.profiler.callback_profile())
+
+    def test_stack(self):
+        stop = threading.Event()
+
+        def busy_loop():
+            while not stop.is_set():
+                sum(range(100))
+
+        thread = threading.Thread(target=busy_loop, name="busy")
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(stop.set)
+
+        self.profiler.start(STACK, 0.2, self.directory.name, on_done=self.on_done)
+        self.assertTrue(self.done.wait(5))
+
+        (path,) = self.paths
+        self.assertTrue(path.endswith("-stack.folded"))
+        with open(path) as file:
+            lines = file.read().splitlines()
+        busy = [line for line in lines if line.startswith("busy;")]
+        self.assertTrue(busy)
+        self.assertIn("busy_loop (test_profiling.py)", busy[0])
+        self.assertTrue(all(line.rsplit(" ", 1)[1].isdigit() for line in lines))
+        self.assertEqual(os.path.dirname(path), self.directory.name)
+
+
+if __name__ == "__main__":
+    unittest.main()
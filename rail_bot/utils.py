@@ -2,6 +2,8 @@ from typing import Union
 import datetime
 
 HOUR_MINUTE_FORMAT = "%H:%M"
+# Any day will do to shift a time of day, as long as it is not read from the clock
+_ANY_DATE = datetime.date(2000, 1, 1)
 
 
 def parse_time(time: str) -> datetime.time:
@@ -21,7 +23,5 @@ def shift_time(
 ) -> datetime.time:
     delta = datetime.timedelta(hours=delta_hour, minutes=delta_minute)
 
-    new_time = (
-        datetime.datetime.combine(datetime.date.today(), time_from) + delta
-    ).time()
+    new_time = (datetime.datetime.combine(_ANY_DATE, time_from) + delta).time()
     return new_time
@@ -0,0 +1,199 @@
+"""Set-up of the bot in a process handling updates, either the only process or
+a worker of the pre-fork mode.
+
+Restarted workers are spawned, and spawn cannot import functions from the
+``__main__`` module, so ``run_worker`` lives here rather than in ``__main__``.
+"""
+
+import logging
+import os
+from multiprocessing.connection import Connection
+from typing import List, Optional
+
+from telegram import Bot, BotCommand
+from telegram.ext import Dispatcher, Updater
+
+from rail_bot.bot.admin_handler import capture_handler, profile_handler
+from rail_bot.bot.admission import HANDLER_DEADLINE, create_adaptive_limit
+from rail_bot.bot.board_handler import board_handler
+from rail_bot.bot.dispatch import ChatOrderedExecutor
+from rail_bot.bot.help_handler import help_handler
+from rail_bot.bot.job_manager import JobManager, TravelOwner
+from rail_bot.bot.prefetch import PREFETCH_RATE, Prefetcher, board_demand
+from rail_bot.bot.request import TracedRequest
+from rail_bot.bot.service.subscription_service import create_subscription_service
+from rail_bot.bot.start_handler import start_handler
+from rail_bot.bot.stats_handler import stats_handler
+from rail_bot.bot.subscription.subscribe_handler import subscribe_handler
+from rail_bot.bot.subscription.unsubscribe_handler import unsubscribe_handler
+from rail_bot.bot.unknown_handler import unknown_command_handler
+from rail_bot.bot.watch_handler import watch_handler
+from rail_bot.bot.watch_manager import WatchManager
+from rail_bot.darwin.consumer import (
+    DARWIN_FEED,
+    create_darwin_consumer,
+    create_travel_index,
+)
+from rail_bot.history.stats import create_travel_history
+from rail_bot.metrics import start_metrics_server
+from rail_bot.prefork import serve_updates, travel_owner
+from rail_bot.rail_api.api import render_board
+from rail_bot.rail_api.timetable import get_timetable
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_TOKEN = os.environ.get("TELEGRAM_TOKEN", "")
+
+# Number of dispatcher threads running handlers
+BOT_WORKERS = int(os.environ.get("BOT_WORKERS", 4))
+# Maximum number of /board, /subscribe and /unsubscribe updates handled at once
+HANDLER_CONCURRENCY = int(os.environ.get("HANDLER_CONCURRENCY", 8))
+# Port of the Prometheus metrics endpoint; disabled if 0
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))
+METRICS_LISTEN = os.environ.get("METRICS_LISTEN", "0.0.0.0")
+# Worker processes forked by a master process; 1 runs everything in one process
+BOT_PROCESSES = int(os.environ.get("BOT_PROCESSES", 1))
+# Seconds between checks of the travels subscribed to through other workers
+TRAVEL_SYNC_INTERVAL = float(os.environ.get("TRAVEL_SYNC_INTERVAL", 60))
+
+
+def create_updater(con_pool_size: int) -> Updater:
+    request = TracedRequest(con_pool_size=con_pool_size)
+    bot = Bot(TELEGRAM_TOKEN, request=request)
+    return Updater(bot=bot, workers=BOT_WORKERS)
+
+
+def setup_bot(
+    updater: Updater, worker: int = 0, owns: Optional[TravelOwner] = None
+) -> ChatOrderedExecutor:
+    """Adds the handlers and jobs of the bot. In the pre-fork mode, ``worker``
+    is the index of the worker process, and ``owns`` tells the travels it polls.
+    """
+    dispatcher: Dispatcher = updater.dispatcher
+    bot_commands: List[BotCommand] = []
+
+    # The schema is brought up to date by the master in the pre-fork mode
+    service = create_subscription_service(migrate=owns is None)
+    # With a Darwin feed, subscribed travels are followed instead of polled
+    push_travels = create_travel_index() if DARWIN_FEED and worker == 0 else None
+    timetable = get_timetable()
+    history = create_travel_history()
+    job_manager = JobManager(
+        job_queue=updater.job_queue,
+        service=service,
+        push_travels=push_travels,
+        timetable=timetable,
+        history=history,
+        owns=owns,
+    )
+
+    job_manager.recover_travel_jobs()
+    if push_travels is not None:
+        darwin_consumer = create_darwin_consumer(
+            push_travels, job_manager.notify_subscribers
+        )
+        darwin_consumer.start()
+        logger.info(f"Following {len(push_travels)} travels through {DARWIN_FEED}.")
+    if worker == 0:
+        job_manager.schedule_travel_compaction()
+    if owns is not None:
+        job_manager.schedule_travel_sync(TRAVEL_SYNC_INTERVAL)
+    job_manager.schedule_metrics_refresh()
+    # Workers share the history directory: one of them deletes the expired days
+    job_manager.schedule_history_refresh(prune=worker == 0)
+
+    executor = ChatOrderedExecutor(
+        max_workers=HANDLER_CONCURRENCY,
+        deadline=HANDLER_DEADLINE,
+        limit=create_adaptive_limit(HANDLER_CONCURRENCY),
+    )
+    updater.job_queue.run_repeating(executor.log_stats, interval=15 * 60)
+    updater.job_queue.run_repeating(job_manager.notifier.log_stats, interval=15 * 60)
+
+    # Prefetched by one worker; the others get the boards from the response cache
+    if PREFETCH_RATE > 0 and worker == 0:
+        # Which only sees the /board requests of its share of the chats
+        if owns is not None:
+            board_demand.request_weight = BOT_PROCESSES
+        prefetcher = Prefetcher(service)
+        prefetcher.schedule(updater.job_queue)
+        updater.job_queue.run_repeating(prefetcher.log_stats, interval=15 * 60)
+
+    # Add /start handler
+    dispatcher.add_handler(start_handler())
+
+    # Add /board handler and bot commands
+    board_handler_, board_bot_command = board_handler(executor)
+    dispatcher.add_handler(board_handler_)
+    bot_commands.append(board_bot_command)
+
+    # Add /subscribe handler and bot commands
+    subscribe_handler_, subscribe_bot_command = subscribe_handler(
+        job_manager, executor, timetable
+    )
+    dispatcher.add_handler(subscribe_handler_)
+    bot_commands.append(subscribe_bot_command)
+
+    # Add /unsubscribe handler and bot commands
+    for handler, bot_command in unsubscribe_handler(job_manager, executor):
+        dispatcher.add_handler(handler)
+        if bot_command is not None:
+            bot_commands.append(bot_command)
+
+    # Add /watch and /unwatch handlers and bot commands
+    watch_manager = WatchManager(job_queue=updater.job_queue, render=render_board)
+    for handler, bot_command in watch_handler(watch_manager, executor):
+        dispatcher.add_handler(handler)
+        bot_commands.append(bot_command)
+
+    # Add /stats handler and bot commands, if the history of travels is kept
+    if history is not None:
+        stats_handler_, stats_bot_command = stats_handler(history, executor)
+        dispatcher.add_handler(stats_handler_)
+        bot_commands.append(stats_bot_command)
+
+    # Add /help handler and bot commands
+    help_handler_, bot_help_command = help_handler()
+    dispatcher.add_handler(help_handler_)
+    bot_commands.append(bot_help_command)
+
+    # Add admin-only handlers, not advertised in the bot commands
+    dispatcher.add_handler(capture_handler())
+    dispatcher.add_handler(profile_handler())
+
+    # Must go very last
+    dispatcher.add_handler(unknown_command_handler())
+
+    # Set the bot commands
+    if worker == 0:
+        updater.bot.set_my_commands(bot_commands)
+
+    return executor
+
+
+def run_worker(index: int, updates: Connection) -> None:
+    """Worker process of the pre-fork mode, handling the updates of its chats
+    and polling its travels.
+    """
+    logging.basicConfig(format=LOG_FORMAT, level=logging.INFO)
+    workers = BOT_PROCESSES
+
+    def owns(origin, destination, departure_time) -> bool:
+        # Worker 0 follows the Darwin feed, for every travel
+        if DARWIN_FEED:
+            return index == 0
+        return travel_owner(origin, destination, departure_time, workers) == index
+
+    updater = create_updater(BOT_WORKERS + HANDLER_CONCURRENCY + 4)
+    executor = setup_bot(updater, worker=index, owns=owns)
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT + 1 + index, listen=METRICS_LISTEN)
+    updater.job_queue.start()
+    logger.info(f"Worker {index} is ready.")
+
+    serve_updates(updates, updater.dispatcher)
+
+    updater.job_queue.stop()
+    executor.shutdown(timeout=30)
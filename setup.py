@@ -6,6 +6,7 @@ setup(
     name="rail_bot",
     version="0.1.0.dev0",
     packages=find_packages(),
+    package_data={"rail_bot.rail_api": ["resources/*.csv"]},
     # PyPI packages required for the *installation* and usual running of the
     # tools.
     install_requires="",